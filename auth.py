@@ -1,13 +1,23 @@
 from fastapi import Depends, HTTPException, status, Request
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
 from authlib.integrations.starlette_client import OAuth
 import httpx
+import asyncio
 import logging
 import json
+from typing import Callable, List, Optional
 from urllib.parse import urljoin
 
 from config import settings
+from http_client import auth0_http
+from management_token import management_token_cache
 from models import User, TokenData
+from jwks import jwks_store
+from permissions import permission_registry, VerifiedClaims
+from session_index import session_index
+from token_cache import token_cache, rejected_token_cache, userinfo_cache
+from verifier import token_verifier
 
 # Set up logging
 logger = logging.getLogger("auth")
@@ -26,52 +36,317 @@ oauth.register(
     authorize_url=f"https://{settings.AUTH0_DOMAIN}/authorize",
     access_token_url=f"https://{settings.AUTH0_DOMAIN}/oauth/token",
     api_base_url=f"https://{settings.AUTH0_DOMAIN}",
-    jwks_uri=f"https://{settings.AUTH0_DOMAIN}/.well-known/jwks.json",
+    jwks_uri=settings.AUTH0_JWKS_URL,
     client_kwargs={
         "scope": "openid profile email",
         "response_type": "code",
+        # Token exchange and ID token key fetches on /auth/callback use the shared Auth0 pool
+        "transport": auth0_http.shared_transport("token"),
+        "timeout": settings.AUTH0_TOKEN_TIMEOUT,
     },
+    # Request an access token for our API, so it carries the RBAC permissions claim
+    authorize_params={"audience": settings.AUTH0_AUDIENCE},
 )
 
+def get_auth_type(user_id: str) -> str:
+    """
+    Determine the auth type (identity provider) from an Auth0 user ID.
+    """
+    if user_id.startswith("google-oauth2"):
+        return "google"
+    elif user_id.startswith("github"):
+        return "github"
+    return "auth0"
+
 # Session-based authentication helper function
 async def verify_session(request: Request) -> User:
     """
     Verify that the user has an active session and return user information.
     """
-    user_data = request.session.get("user")
+    session = request.session
+    # Reading the session loads it (and fills cached_session) if it is lazy
+    user_data = session.get("user")
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Session expired or not authenticated",
         )
-    
+
+    # Sessions from before the user's last revocation are dropped
+    if await session_index.is_revoked(user_data):
+        session.clear()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Session has been revoked",
+        )
+
+    # Reuse the User built for this cookie on an earlier request
+    unmodified = not getattr(session, "modified", True)
+    cached = request.scope.get("cached_session")
+    if cached is not None and cached.user is not None and unmodified:
+        return cached.user
+
     logger.debug(f"User from session: {user_data}")
     
     # Determine auth type from user ID
-    user_id = user_data.get('id', '')
-    auth_type = "auth0"
+    auth_type = get_auth_type(user_data.get('id', ''))
     
-    if user_id.startswith("google-oauth2"):
-        auth_type = "google"
-    elif user_id.startswith("github"):
-        auth_type = "github"
-    
-    return User(
+    user = User(
         id=user_data.get("id"),
         email=user_data.get("email"),
         name=user_data.get("name"),
         picture=user_data.get("picture"),
-        auth_type=auth_type
+        auth_type=auth_type,
+        permissions=user_data.get("permissions", []),
+        email_verified=user_data.get("email_verified")
+    )
+    if cached is not None and unmodified:
+        cached.user = user
+        cached.permission_bits = permission_registry.mask(user.permissions)
+    return user
+
+# Bearer token authentication for API clients
+bearer_scheme = HTTPBearer(auto_error=False)
+
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+UNKNOWN_SIGNING_KEY = "Unknown signing key"
+
+def _remember_rejection(token: str, e: HTTPException) -> None:
+    """
+    Put a 401 in the rejected-token cache, unless the key ID was unknown: that may be
+    a key rotation the JWKS refetch gate hasn't let us pick up yet, and the token
+    should verify as soon as the keys are refetched.
+    """
+    if e.status_code == status.HTTP_401_UNAUTHORIZED and e.detail != UNKNOWN_SIGNING_KEY:
+        rejected_token_cache.put(token, e.detail)
+
+def _get_token_kid(token: str) -> Optional[str]:
+    """
+    Read the signing key ID from a token's header, rejecting malformed tokens.
+    """
+    try:
+        header = jwt.get_unverified_header(token)
+    except JWTError:
+        raise _credentials_exception("Malformed token")
+
+    if header.get("alg") != "RS256":
+        raise _credentials_exception("Unsupported token algorithm")
+    return header.get("kid")
+
+async def _verify_with_key(token: str, kid: Optional[str], key) -> dict:
+    """
+    Verify a token against an already resolved signing key and cache its claims.
+    """
+    if key is None:
+        if not jwks_store.has_keys:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Authentication service unavailable",
+            )
+        raise _credentials_exception(UNKNOWN_SIGNING_KEY)
+
+    try:
+        claims = await token_verifier.verify(token, kid, key, jwks_store.get_key_data(kid))
+    except JWTError as e:
+        logger.debug(f"Access token rejected: {e}")
+        raise _credentials_exception()
+
+    claims = VerifiedClaims(claims)
+    token_cache.put(token, claims)
+    return claims
+
+async def decode_access_token(token: str) -> dict:
+    """
+    Validate an Auth0 RS256 access token locally and return its claims.
+    Checks the signature against the tenant JWKS, plus iss, aud, exp and nbf.
+    Tokens that were already verified are served from the token cache, and
+    recently rejected tokens are turned away before any parsing or crypto.
+    """
+    claims = token_cache.get(token)
+    if claims is not None:
+        return claims
+
+    reason = rejected_token_cache.get(token)
+    if reason is not None:
+        raise _credentials_exception(reason)
+
+    try:
+        kid = _get_token_kid(token)
+        key = await jwks_store.get_key(kid)
+        return await _verify_with_key(token, kid, key)
+    except HTTPException as e:
+        _remember_rejection(token, e)
+        raise
+
+async def introspect_tokens(tokens: List[str]) -> List[dict]:
+    """
+    Validate many access tokens at once, returning one result per token, in order.
+    Each signing key is resolved once per batch and cache misses are verified in
+    parallel, at most INTROSPECT_CONCURRENCY at a time. Errors other than an
+    invalid token (e.g. a 503) are raised for the whole batch.
+    """
+    results = {}
+    pending = {}
+    for token in dict.fromkeys(tokens):
+        claims = token_cache.get(token)
+        if claims is not None:
+            results[token] = {"active": True, "claims": claims}
+            continue
+        reason = rejected_token_cache.get(token)
+        if reason is not None:
+            results[token] = {"active": False, "error": reason}
+            continue
+        try:
+            pending[token] = _get_token_kid(token)
+        except HTTPException as e:
+            _remember_rejection(token, e)
+            results[token] = {"active": False, "error": e.detail}
+
+    # Resolve each signing key once for the whole batch
+    keys = {}
+    for kid in set(pending.values()):
+        keys[kid] = await jwks_store.get_key(kid)
+
+    # Leave room in the verifier's queue for concurrent bearer requests
+    limit = asyncio.Semaphore(max(min(settings.INTROSPECT_CONCURRENCY, token_verifier.max_pending // 2), 1))
+
+    async def verify(token: str, kid: Optional[str]) -> dict:
+        async with limit:
+            return await _verify_with_key(token, kid, keys[kid])
+
+    outcomes = await asyncio.gather(
+        *(verify(token, kid) for token, kid in pending.items()),
+        return_exceptions=True,
     )
+    for token, outcome in zip(pending, outcomes):
+        if isinstance(outcome, HTTPException) and outcome.status_code == status.HTTP_401_UNAUTHORIZED:
+            _remember_rejection(token, outcome)
+            results[token] = {"active": False, "error": outcome.detail}
+        elif isinstance(outcome, BaseException):
+            # A 503 (verifier over capacity, no signing keys) says nothing about the token
+            raise outcome
+        else:
+            results[token] = {"active": True, "claims": outcome}
+
+    return [results[token] for token in tokens]
+
+def get_token_data(claims: dict) -> TokenData:
+    """
+    Build TokenData from verified access token claims.
+    """
+    sub = claims.get("sub")
+    if not sub:
+        raise _credentials_exception("Token has no subject")
+    return TokenData(
+        sub=sub,
+        auth_type=get_auth_type(sub),
+        permissions=claims.get("permissions", []),
+    )
+
+def get_user_from_claims(claims: dict) -> User:
+    """
+    Build a User from verified access token claims.
+    """
+    token_data = get_token_data(claims)
+
+    return User(
+        id=token_data.sub,
+        email=claims.get("email"),
+        name=claims.get("name"),
+        picture=claims.get("picture"),
+        auth_type=token_data.auth_type,
+        permissions=token_data.permissions,
+        email_verified=claims.get("email_verified")
+    )
+
+async def verify_bearer(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> User:
+    """
+    Verify an Auth0 access token from the Authorization header and return user information.
+    The token is validated in-process, without calling Auth0.
+    """
+    if credentials is None or credentials.scheme.lower() != "bearer":
+        raise _credentials_exception("Not authenticated")
+
+    claims = await decode_access_token(credentials.credentials)
+    return get_user_from_claims(claims)
+
+async def verify_user(
+    request: Request,
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+) -> User:
+    """
+    Authenticate with a bearer token if one is presented, otherwise with the session.
+    """
+    if credentials is not None:
+        return await verify_bearer(credentials)
+    return await verify_session(request)
+
+def require(*permissions: str) -> Callable:
+    """
+    Build a dependency that authenticates the caller and checks that they hold
+    all of the given permissions, e.g. Depends(require("read:admin")).
+
+    The permissions are interned once, when the route is declared, so each check
+    is a single bitwise AND against the caller's permission bitset.
+    """
+    required = permission_registry.mask(permissions)
+
+    async def check_permissions(
+        request: Request,
+        credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer_scheme),
+    ) -> User:
+        if credentials is not None:
+            claims = await decode_access_token(credentials.credentials)
+            user = get_user_from_claims(claims)
+            granted = claims.permission_bits
+        else:
+            user = await verify_session(request)
+            # The bitset is kept with the cached User, so it is built once per session
+            cached = request.scope.get("cached_session")
+            if cached is not None and cached.user is user:
+                granted = cached.permission_bits
+            else:
+                granted = permission_registry.mask(user.permissions)
+
+        if granted & required != required:
+            missing = permission_registry.names(required & ~granted)
+            logger.info(f"Permission denied for {user.id}, missing: {missing}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Missing required permissions: {', '.join(missing)}",
+            )
+        return user
+
+    return check_permissions
 
 # Function to fetch user information from Auth0
 async def get_auth0_user_info(token: str) -> dict:
     """
     Get user information from Auth0 using a token.
+    Tokens Auth0 recently rejected are turned away without a round trip, recent
+    answers are served from a short-lived cache, and concurrent lookups of the
+    same token share one request.
     """
+    if rejected_token_cache.get(token, scope="userinfo") is not None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+        )
+
+    return await userinfo_cache.get_or_fetch(token, lambda: _fetch_auth0_user_info(token))
+
+async def _fetch_auth0_user_info(token: str) -> dict:
     try:
         headers = {"Authorization": f"Bearer {token}"}
-        async with httpx.AsyncClient(timeout=10.0) as client:
+        async with auth0_http.route("userinfo") as client:
             response = await client.get(
                 f"https://{settings.AUTH0_DOMAIN}/userinfo", 
                 headers=headers
@@ -81,6 +356,8 @@ async def get_auth0_user_info(token: str) -> dict:
                 return response.json()
             else:
                 logger.error(f"Error getting user info from Auth0: {response.text}")
+                if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                    rejected_token_cache.put(token, "Could not validate credentials", scope="userinfo")
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
                     detail="Could not validate credentials",
@@ -95,21 +372,11 @@ async def get_auth0_user_info(token: str) -> dict:
 async def get_management_api_token() -> str:
     """
     Get a management API token from Auth0.
-    This token is used to make calls to the Auth0 Management API.
+    This token is used to make calls to the Auth0 Management API. It is cached
+    and refreshed ahead of expiry, so most calls don't touch the network.
     """
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"https://{settings.AUTH0_DOMAIN}/oauth/token",
-                json={
-                    "client_id": settings.AUTH0_CLIENT_ID,
-                    "client_secret": settings.AUTH0_CLIENT_SECRET,
-                    "audience": f"https://{settings.AUTH0_DOMAIN}/api/v2/",
-                    "grant_type": "client_credentials"
-                }
-            )
-            response.raise_for_status()
-            return response.json()["access_token"]
+        return await management_token_cache.get()
     except Exception as e:
         logger.error(f"Error getting management API token: {str(e)}")
-        raise 
\ No newline at end of file
+        raise
@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, Response, status, Form
-from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from authlib.integrations.starlette_client import OAuth
@@ -8,9 +8,25 @@ from typing import Optional
 import json
 import logging
 import authlib.integrations.base_client.errors
-from models import Token, TokenRequest, User, UserProfile
-from auth import oauth, verify_session, get_auth0_user_info, get_management_api_token
+from models import (
+    Token, TokenRequest, User, UserProfile,
+    IntrospectBatchRequest, IntrospectBatchResponse, TokenIntrospection,
+)
+from auth import (
+    oauth, verify_session, require, introspect_tokens, decode_access_token,
+    get_auth0_user_info, get_management_api_token, get_auth_type,
+)
 from config import settings
+from http_client import auth0_http
+from management_token import management_token_cache
+from connections import connection_catalog
+from token_cache import token_cache, rejected_token_cache, userinfo_cache
+from verifier import token_verifier
+from policy import policy_engine
+from sessions import decoded_session_cache
+from shared_cache import shared_cache
+from session_index import session_index
+from timing_wheel import expiry_sweeper
 
 router = APIRouter(tags=["Authentication"])
 
@@ -110,69 +126,58 @@ async def login_github(request: Request):
         # Clear any existing session first to prevent state mismatch
         request.session.clear()
         
-        # Try to get management API token and check connections
+        # Check the GitHub connection in the cached connections catalog
         try:
-            token = await get_management_api_token()
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"https://{settings.AUTH0_DOMAIN}/api/v2/connections",
-                    headers={"Authorization": f"Bearer {token}"}
-                )
-                connections = response.json()
-                
-                # Find GitHub connection
-                github_connection = next(
-                    (conn for conn in connections if conn["strategy"] == "github"),
-                    None
+            # Find GitHub connection
+            github_connection = await connection_catalog.first("github")
+            
+            if not github_connection:
+                logger.error("GitHub connection not found in Auth0")
+                return JSONResponse(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    content={
+                        "detail": "GitHub connection not found in Auth0. Please set up the GitHub connection in your Auth0 dashboard.",
+                        "available_connections": await connection_catalog.names(),
+                        "setup_instructions": [
+                            "1. Go to Auth0 Dashboard → Authentication → Social",
+                            "2. Click 'Create Connection' and select GitHub",
+                            "3. Create a GitHub OAuth App at https://github.com/settings/developers",
+                            "4. Set the Authorization callback URL to: https://YOUR_AUTH0_DOMAIN/login/callback",
+                            "5. Copy the Client ID and Client Secret to Auth0",
+                            "6. Enable the connection for your application"
+                        ]
+                    }
                 )
-                
-                if not github_connection:
-                    logger.error("GitHub connection not found in Auth0")
-                    return JSONResponse(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        content={
-                            "detail": "GitHub connection not found in Auth0. Please set up the GitHub connection in your Auth0 dashboard.",
-                            "available_connections": [conn["name"] for conn in connections],
-                            "setup_instructions": [
-                                "1. Go to Auth0 Dashboard → Authentication → Social",
-                                "2. Click 'Create Connection' and select GitHub",
-                                "3. Create a GitHub OAuth App at https://github.com/settings/developers",
-                                "4. Set the Authorization callback URL to: https://YOUR_AUTH0_DOMAIN/login/callback",
-                                "5. Copy the Client ID and Client Secret to Auth0",
-                                "6. Enable the connection for your application"
-                            ]
-                        }
-                    )
-                
-                # Check if our client is enabled
-                if settings.AUTH0_CLIENT_ID not in github_connection.get("enabled_clients", []):
-                    logger.error(f"GitHub connection not enabled for client {settings.AUTH0_CLIENT_ID}")
-                    return JSONResponse(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        content={
-                            "detail": "GitHub connection is not enabled for this application. Please enable it in your Auth0 dashboard.",
-                            "connection_name": github_connection["name"],
-                            "enabled_clients": github_connection.get("enabled_clients", []),
-                            "setup_instructions": [
-                                "1. Go to Auth0 Dashboard → Authentication → Social",
-                                "2. Find your GitHub connection",
-                                "3. Click on it to edit",
-                                "4. Go to the 'Applications' tab",
-                                "5. Enable your application",
-                                "6. Save the changes"
-                            ]
-                        }
-                    )
-                
-                # Use the actual connection name from Auth0
-                connection_name = github_connection["name"]
-                logger.info(f"Using GitHub connection name: {connection_name}")
-                
-                return await oauth.auth0.authorize_redirect(
-                    request, 
-                    redirect_uri,
-                    connection=connection_name
+            
+            # Check if our client is enabled
+            if settings.AUTH0_CLIENT_ID not in github_connection.get("enabled_clients", []):
+                logger.error(f"GitHub connection not enabled for client {settings.AUTH0_CLIENT_ID}")
+                return JSONResponse(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    content={
+                        "detail": "GitHub connection is not enabled for this application. Please enable it in your Auth0 dashboard.",
+                        "connection_name": github_connection["name"],
+                        "enabled_clients": github_connection.get("enabled_clients", []),
+                        "setup_instructions": [
+                            "1. Go to Auth0 Dashboard → Authentication → Social",
+                            "2. Find your GitHub connection",
+                            "3. Click on it to edit",
+                            "4. Go to the 'Applications' tab",
+                            "5. Enable your application",
+                            "6. Save the changes"
+                        ]
+                    }
                 )
+            
+            # Use the actual connection name from Auth0
+            connection_name = github_connection["name"]
+            logger.info(f"Using GitHub connection name: {connection_name}")
+            
+            return await oauth.auth0.authorize_redirect(
+                request, 
+                redirect_uri,
+                connection=connection_name
+            )
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 403:
                 logger.warning("Management API access not available, trying default GitHub connection")
@@ -287,9 +292,24 @@ async def auth_callback(request: Request):
                 'id': user_info.get('sub'),
                 'name': user_info.get('name'),
                 'email': user_info.get('email'),
+                'email_verified': user_info.get('email_verified'),
                 'picture': user_info.get('picture')
             }
 
+            # Keep the RBAC permissions from the access token, if it is a JWT for our API
+            try:
+                access_claims = await decode_access_token(token.get('access_token', ''))
+                request.session['user']['permissions'] = access_claims.get('permissions', [])
+            except HTTPException as e:
+                logger.info(f"Access token carries no verifiable permissions: {e.detail}")
+
+            # Index the session so it can be listed and revoked with the user's other sessions
+            request.session['user'].update(await session_index.register(user_info.get('sub'), {
+                'auth_type': get_auth_type(user_info.get('sub')),
+                'user_agent': request.headers.get('user-agent'),
+                'ip': request.client.host if request.client else None,
+            }))
+
             # If this is a GitHub login, store the GitHub token
             if user_info.get('sub', '').startswith('github|'):
                 try:
@@ -338,12 +358,48 @@ async def get_user_profile(current_user: User = Depends(verify_session)):
         auth_type=current_user.auth_type
     )
 
+# Batch token introspection route for internal services
+@router.post("/introspect/batch", response_model=IntrospectBatchResponse)
+async def introspect_batch(
+    body: IntrospectBatchRequest,
+    caller: User = Depends(require("introspect:tokens")),
+):
+    """
+    Validate many access tokens in one request.
+    Returns validity and claims for each token, in request order.
+    Only callers granted the introspect:tokens permission may use it.
+    """
+    if len(body.tokens) > settings.INTROSPECT_MAX_BATCH:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.INTROSPECT_MAX_BATCH} tokens can be introspected per request",
+        )
+
+    logger.info(f"Introspecting {len(body.tokens)} tokens for {caller.id}")
+    results = await introspect_tokens(body.tokens)
+
+    return IntrospectBatchResponse(
+        results=[
+            TokenIntrospection(
+                active=result["active"],
+                sub=result.get("claims", {}).get("sub"),
+                claims=result.get("claims"),
+                error=result.get("error"),
+            )
+            for result in results
+        ]
+    )
+
 # Logout route
 @router.get("/logout")
 async def logout(request: Request):
     """
     Log the user out
     """
+    user_data = request.session.get('user') or {}
+    if user_data.get('id'):
+        await session_index.unregister(user_data['id'], user_data.get('sid'))
+
     # Clear session data
     request.session.clear()
     
@@ -359,6 +415,16 @@ async def logout(request: Request):
     # Redirect to Auth0 logout page, which will clear the Auth0 session
     return RedirectResponse(url=logout_url)
 
+# Log out of every session, on every device
+@router.post("/logout/all")
+async def logout_all(request: Request, current_user: User = Depends(verify_session)):
+    """
+    Revoke all of the user's sessions, including this one
+    """
+    revoked = await session_index.revoke_user(current_user.id)
+    request.session.clear()
+    return {"status": "success", "revoked_sessions": revoked}
+
 # Debug route for checking Auth0 configuration - DISABLE IN PRODUCTION
 @router.get("/debug")
 async def debug_auth0():
@@ -371,7 +437,7 @@ async def debug_auth0():
         
         # Check Auth0 domain
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with auth0_http.route("metadata") as client:
                 openid_config_url = f"https://{settings.AUTH0_DOMAIN}/.well-known/openid-configuration"
                 logger.info(f"Checking Auth0 OpenID configuration: {openid_config_url}")
                 
@@ -431,39 +497,93 @@ async def debug_auth0():
             "message": f"Unexpected error: {str(e)}"
         }
 
+# Debug route for verified-token cache metrics - DISABLE IN PRODUCTION
+@router.get("/debug/token-cache")
+async def debug_token_cache():
+    """Debug endpoint to check verified-token, rejected-token and userinfo cache counters"""
+    return {
+        "status": "success",
+        "token_cache": token_cache.get_stats(),
+        "rejected_token_cache": rejected_token_cache.get_stats(),
+        "userinfo_cache": userinfo_cache.get_stats(),
+    }
+
+# Debug route for decoded-session cache metrics - DISABLE IN PRODUCTION
+@router.get("/debug/session-cache")
+async def debug_session_cache():
+    """Debug endpoint to check decoded-session cache hit/miss/invalidation counters"""
+    return {"status": "success", "session_cache": decoded_session_cache.get_stats()}
+
+# Debug route for cross-process shared cache metrics - DISABLE IN PRODUCTION
+@router.get("/debug/shared-cache")
+async def debug_shared_cache():
+    """Debug endpoint to check this worker's shared cache hit/miss and lock contention counters"""
+    return {"status": "success", "shared_cache": shared_cache.get_stats()}
+
+# Debug route for session revocation metrics - DISABLE IN PRODUCTION
+@router.get("/debug/session-index")
+async def debug_session_index():
+    """Debug endpoint to check session revocation checks and generation refresh counters"""
+    return {"status": "success", "session_index": session_index.get_stats()}
+
+# Debug route for expiry sweeper metrics - DISABLE IN PRODUCTION
+@router.get("/debug/expiry")
+async def debug_expiry():
+    """Debug endpoint to check how many expired entries the sweeper reclaimed from each cache"""
+    return {"status": "success", "expiry": expiry_sweeper.get_stats()}
+
+# Debug route for Auth0 connection pool metrics - DISABLE IN PRODUCTION
+@router.get("/debug/http-pool")
+async def debug_http_pool():
+    """Debug endpoint to check Auth0 connection pool occupancy and per-route latency"""
+    return {"status": "success", "auth0_http": auth0_http.get_stats()}
+
+# Debug route for Management API token cache metrics - DISABLE IN PRODUCTION
+@router.get("/debug/management-token")
+async def debug_management_token():
+    """Debug endpoint to check Management API token cache hits and refreshes"""
+    return {"status": "success", "management_token": management_token_cache.get_stats()}
+
+# Debug route for connections catalog metrics - DISABLE IN PRODUCTION
+@router.get("/debug/connections-catalog")
+async def debug_connections_catalog():
+    """Debug endpoint to check the cached connections catalog"""
+    return {"status": "success", "connections_catalog": connection_catalog.get_stats()}
+
+# Debug route for token verification executor metrics - DISABLE IN PRODUCTION
+@router.get("/debug/verifier")
+async def debug_verifier():
+    """Debug endpoint to check token verification executor queue metrics"""
+    return {"status": "success", "verifier": token_verifier.get_stats()}
+
+# Debug route for authorization policy metrics - DISABLE IN PRODUCTION
+@router.get("/debug/policies")
+async def debug_policies():
+    """Debug endpoint to check policy decision cache and latency metrics"""
+    return {"status": "success", "policies": policy_engine.get_stats()}
+
 # Debug route to check available connections
 @router.get("/debug/connections")
 async def debug_connections():
     """Debug endpoint to check available connections"""
     try:
-        # Get management API token
-        token = await get_management_api_token()
-        
-        # Get all connections
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/connections",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            connections = response.json()
-            
-            # Filter for social connections
-            social_connections = [
-                {
-                    "name": conn["name"],
-                    "strategy": conn["strategy"],
-                    "enabled_clients": conn.get("enabled_clients", []),
-                    "status": "Enabled" if conn.get("enabled_clients") else "Disabled"
-                }
-                for conn in connections
-                if conn["strategy"] in ["github", "google-oauth2"]
-            ]
-            
-            return {
-                "status": "success",
-                "connections": social_connections,
-                "client_id": settings.AUTH0_CLIENT_ID
+        # Filter for social connections
+        social_connections = [
+            {
+                "name": conn["name"],
+                "strategy": conn["strategy"],
+                "enabled_clients": conn.get("enabled_clients", []),
+                "status": "Enabled" if conn.get("enabled_clients") else "Disabled"
             }
+            for strategy in ["github", "google-oauth2"]
+            for conn in await connection_catalog.by_strategy(strategy)
+        ]
+        
+        return {
+            "status": "success",
+            "connections": social_connections,
+            "client_id": settings.AUTH0_CLIENT_ID
+        }
     except Exception as e:
         logger.error(f"Error checking connections: {str(e)}")
         return {"status": "error", "message": str(e)}
@@ -473,41 +593,27 @@ async def debug_connections():
 async def debug_github():
     """Debug endpoint to check GitHub connection specifically"""
     try:
-        # Get management API token
-        token = await get_management_api_token()
-        
         # Get GitHub connection specifically
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/connections",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            connections = response.json()
-            
-            # Find GitHub connection
-            github_connection = next(
-                (conn for conn in connections if conn["strategy"] == "github"),
-                None
-            )
-            
-            if not github_connection:
-                return {
-                    "status": "error",
-                    "message": "GitHub connection not found in Auth0"
-                }
-            
-            # Check if our client is enabled
-            is_enabled = settings.AUTH0_CLIENT_ID in github_connection.get("enabled_clients", [])
-            
+        github_connection = await connection_catalog.first("github")
+        
+        if not github_connection:
             return {
-                "status": "success",
-                "connection": {
-                    "name": github_connection["name"],
-                    "strategy": github_connection["strategy"],
-                    "enabled_clients": github_connection.get("enabled_clients", []),
-                    "is_enabled_for_this_app": is_enabled
-                }
+                "status": "error",
+                "message": "GitHub connection not found in Auth0"
             }
+        
+        # Check if our client is enabled
+        is_enabled = settings.AUTH0_CLIENT_ID in github_connection.get("enabled_clients", [])
+        
+        return {
+            "status": "success",
+            "connection": {
+                "name": github_connection["name"],
+                "strategy": github_connection["strategy"],
+                "enabled_clients": github_connection.get("enabled_clients", []),
+                "is_enabled_for_this_app": is_enabled
+            }
+        }
     except Exception as e:
         logger.error(f"Error checking GitHub connection: {str(e)}")
         return {"status": "error", "message": str(e)}
@@ -517,31 +623,20 @@ async def debug_github():
 async def debug_github_detailed():
     """Detailed debug endpoint to check GitHub connection configuration"""
     try:
-        # Get management API token
-        token = await get_management_api_token()
+        # Find GitHub connection
+        github_connection = await connection_catalog.first("github")
+        available_connections = await connection_catalog.names()
         
-        # Get all connections
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/connections",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            connections = response.json()
-            
-            # Find GitHub connection
-            github_connection = next(
-                (conn for conn in connections if conn["strategy"] == "github"),
-                None
-            )
-            
-            if not github_connection:
-                return {
-                    "status": "error",
-                    "message": "GitHub connection not found in Auth0",
-                    "available_connections": [conn["name"] for conn in connections]
-                }
-            
-            # Get connection details
+        if not github_connection:
+            return {
+                "status": "error",
+                "message": "GitHub connection not found in Auth0",
+                "available_connections": available_connections
+            }
+        
+        # Get connection details
+        token = await get_management_api_token()
+        async with auth0_http.route("management") as client:
             connection_id = github_connection["id"]
             connection_details = await client.get(
                 f"https://{settings.AUTH0_DOMAIN}/api/v2/connections/{connection_id}",
@@ -561,7 +656,7 @@ async def debug_github_detailed():
                     "is_enabled_for_this_app": is_enabled,
                     "display_name": connection_data.get("display_name"),
                     "options": connection_data.get("options", {}),
-                    "available_connections": [conn["name"] for conn in connections]
+                    "available_connections": available_connections
                 },
                 "your_client_id": settings.AUTH0_CLIENT_ID
             }
@@ -574,33 +669,42 @@ async def debug_github_detailed():
 async def debug_connection_names():
     """Debug endpoint to list all available connection names"""
     try:
-        # Get management API token
-        token = await get_management_api_token()
-        
-        # Get all connections
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"https://{settings.AUTH0_DOMAIN}/api/v2/connections",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            connections = response.json()
-            
-            # Extract connection names and strategies
-            connection_info = [
-                {
-                    "name": conn["name"],
-                    "strategy": conn["strategy"],
-                    "enabled_clients": conn.get("enabled_clients", []),
-                    "is_enabled_for_this_app": settings.AUTH0_CLIENT_ID in conn.get("enabled_clients", [])
-                }
-                for conn in connections
-            ]
-            
-            return {
-                "status": "success",
-                "connections": connection_info,
-                "your_client_id": settings.AUTH0_CLIENT_ID
+        # Extract connection names and strategies
+        connection_info = [
+            {
+                "name": conn["name"],
+                "strategy": conn["strategy"],
+                "enabled_clients": conn.get("enabled_clients", []),
+                "is_enabled_for_this_app": settings.AUTH0_CLIENT_ID in conn.get("enabled_clients", [])
             }
+            for conn in await connection_catalog.all()
+        ]
+        
+        return {
+            "status": "success",
+            "connections": connection_info,
+            "your_client_id": settings.AUTH0_CLIENT_ID
+        }
     except Exception as e:
         logger.error(f"Error checking connection names: {str(e)}")
-        return {"status": "error", "message": str(e)} 
\ No newline at end of file
+        return {"status": "error", "message": str(e)} 
+
+# Debug route to stream every connection straight from Auth0 as NDJSON - DISABLE IN PRODUCTION
+@router.get("/debug/connections/stream")
+async def debug_connections_stream():
+    """Debug endpoint to list every connection page by page, one JSON object per line"""
+    async def lines():
+        try:
+            async for page in connection_catalog.iter_pages():
+                for conn in page:
+                    yield json.dumps({
+                        "name": conn["name"],
+                        "strategy": conn["strategy"],
+                        "enabled_clients": conn.get("enabled_clients", []),
+                        "is_enabled_for_this_app": settings.AUTH0_CLIENT_ID in conn.get("enabled_clients", [])
+                    }) + "\n"
+        except Exception as e:
+            logger.error(f"Error streaming connections: {str(e)}")
+            yield json.dumps({"status": "error", "message": str(e)}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
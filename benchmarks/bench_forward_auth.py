@@ -0,0 +1,127 @@
+"""
+Benchmark for the /auth/verify forward-auth endpoint.
+
+Drives the ASGI app directly (no network, no uvicorn) on a single event loop,
+so the numbers are requests/sec per worker for the authorizer itself.
+Signing keys are generated locally; no Auth0 tenant is needed.
+
+Usage: python benchmarks/bench_forward_auth.py [requests]
+"""
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from base64 import b64encode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itsdangerous
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from config import settings
+from jwks import jwks_store
+from main import app
+
+
+def make_keys():
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    public_jwk = {
+        k: v.decode() if isinstance(v, bytes) else v
+        for k, v in jwk.construct(public_pem, "RS256").to_dict().items()
+    }
+    public_jwk["kid"] = "bench"
+    return private_pem, {"keys": [public_jwk]}
+
+
+def make_token(private_pem) -> str:
+    now = int(time.time())
+    claims = {
+        "sub": "github|bench",
+        "iss": settings.AUTH0_ISSUER,
+        "aud": settings.AUTH0_AUDIENCE,
+        "iat": now,
+        "exp": now + 3600,
+    }
+    return jwt.encode(claims, private_pem, algorithm="RS256", headers={"kid": "bench"})
+
+
+def make_session_cookie() -> str:
+    signer = itsdangerous.TimestampSigner(str(settings.SECRET_KEY))
+    session = {"user": {"id": "google-oauth2|bench", "name": "Bench", "email": "bench@example.com"}}
+    return signer.sign(b64encode(json.dumps(session).encode())).decode()
+
+
+async def call(path: str, headers: list) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": headers,
+        "client": ("127.0.0.1", 12345),
+        "server": ("testserver", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def run(name: str, path: str, headers: list, requests: int) -> None:
+    expected = await call(path, headers)  # warm up caches
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        t0 = time.perf_counter()
+        status = await call(path, headers)
+        latencies.append(time.perf_counter() - t0)
+        assert status == expected, f"{name}: got {status}, expected {expected}"
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1e6
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e6
+    print(f"{name:<32} status={expected}  {requests / elapsed:>9.0f} req/s  p50={p50:7.1f}us  p99={p99:7.1f}us")
+
+
+async def main(requests: int) -> None:
+    private_pem, jwks = make_keys()
+    jwks_store.load(jwks)
+    token = make_token(private_pem)
+    cookie = make_session_cookie()
+
+    print(f"{requests} sequential requests per scenario, single worker\n")
+    await run("bearer (token cache hit)", "/auth/verify", [(b"authorization", f"Bearer {token}".encode())], requests)
+    await run("session cookie", "/auth/verify", [(b"cookie", f"session={cookie}".encode())], requests)
+    await run("unauthenticated", "/auth/verify", [], requests)
+    await run("/health (full stack, reference)", "/health", [], requests)
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
@@ -0,0 +1,129 @@
+"""
+Benchmark for the compact session cookie codec.
+
+Compares cookie size and encode/decode time of SessionCodec against the
+base64 JSON encoding used by Starlette's SessionMiddleware, for a session
+shaped like the one auth_callback writes after a GitHub login.
+
+Usage: python benchmarks/bench_session_codec.py [iterations]
+"""
+import base64
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import itsdangerous
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+from config import settings
+from session_codec import SessionCodec
+
+
+def make_session() -> dict:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    now = int(time.time())
+    userinfo = {
+        "nickname": "octocat",
+        "name": "The Octocat",
+        "picture": "https://avatars.githubusercontent.com/u/583231?v=4",
+        "updated_at": "2024-01-01T00:00:00.000Z",
+        "email": "octocat@example.com",
+        "email_verified": True,
+        "iss": settings.AUTH0_ISSUER,
+        "aud": settings.AUTH0_CLIENT_ID,
+        "iat": now,
+        "exp": now + 36000,
+        "sub": "github|583231",
+        "sid": "b0Xn3tVqL7dR3a9pQ1fK2mZ8wY6uT4sJ",
+        "nonce": "Hk3jT7pL9qR2sV5wX8yZ1aB4cD6eF0gI",
+    }
+    headers = {"kid": "bench"}
+    access_token = jwt.encode(
+        {
+            "iss": settings.AUTH0_ISSUER,
+            "sub": "github|583231",
+            "aud": [settings.AUTH0_AUDIENCE, f"https://{settings.AUTH0_DOMAIN}/userinfo"],
+            "iat": now,
+            "exp": now + 86400,
+            "scope": "openid profile email",
+            "azp": settings.AUTH0_CLIENT_ID,
+            "permissions": ["read:admin", "read:reports", "write:reports"],
+        },
+        private_pem,
+        algorithm="RS256",
+        headers=headers,
+    )
+    id_token = jwt.encode(userinfo, private_pem, algorithm="RS256", headers=headers)
+    return {
+        "token": {
+            "access_token": access_token,
+            "id_token": id_token,
+            "scope": "openid profile email",
+            "expires_in": 86400,
+            "token_type": "Bearer",
+            "expires_at": now + 86400,
+            "userinfo": userinfo,
+        },
+        "user": {
+            "id": "github|583231",
+            "name": "The Octocat",
+            "email": "octocat@example.com",
+            "email_verified": True,
+            "picture": "https://avatars.githubusercontent.com/u/583231?v=4",
+            "permissions": ["read:admin", "read:reports", "write:reports"],
+            "github_token": access_token,
+        },
+    }
+
+
+class StarletteCodec:
+    """The encoding SessionMiddleware uses: signed base64 JSON."""
+
+    def __init__(self, secret_key: str):
+        self.signer = itsdangerous.TimestampSigner(str(secret_key))
+
+    def encode(self, session: dict) -> str:
+        return self.signer.sign(base64.b64encode(json.dumps(session).encode("utf-8"))).decode("utf-8")
+
+    def decode(self, value: str) -> dict:
+        return json.loads(base64.b64decode(self.signer.unsign(value.encode("utf-8"))))
+
+
+def measure(codec, session: dict, iterations: int):
+    cookie = codec.encode(session)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        codec.encode(session)
+    encode_us = (time.perf_counter() - started) / iterations * 1e6
+    started = time.perf_counter()
+    for _ in range(iterations):
+        codec.decode(cookie)
+    decode_us = (time.perf_counter() - started) / iterations * 1e6
+    return len(cookie), encode_us, decode_us
+
+
+def main(iterations: int) -> None:
+    session = make_session()
+    compact = SessionCodec(settings.SECRET_KEY, compress_threshold=settings.SESSION_COMPRESS_THRESHOLD)
+    assert compact.decode(compact.encode(session))["user"] == session["user"]
+
+    print(f"{iterations} iterations, session with access token, ID token and userinfo\n")
+    print(f"{'codec':<22}{'cookie bytes':>14}{'encode us':>12}{'decode us':>12}")
+    for name, codec in (("starlette (json)", StarletteCodec(settings.SECRET_KEY)), ("compact (binary)", compact)):
+        size, encode_us, decode_us = measure(codec, session, iterations)
+        flag = "  over 4 KB cookie limit" if size > 4096 else ""
+        print(f"{name:<22}{size:>14}{encode_us:>12.1f}{decode_us:>12.1f}{flag}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,100 @@
+"""
+Benchmark for the cross-process shared cache.
+
+Starts 4, 8 and 16 worker processes against one SharedCache directory. Each
+worker does a mix of reads of existing keys (90%) and writes (10%) shaped like
+session entries, and reports read-hit and write latency and how often it had
+to wait for another process's write lock on a stripe.
+
+Usage: python benchmarks/bench_shared_cache.py [operations per worker]
+"""
+import multiprocessing
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared_cache import SharedCache
+
+KEYS = 10000
+STRIPES = 8
+SESSION = {
+    "user": {
+        "id": "github|583231",
+        "name": "The Octocat",
+        "email": "octocat@example.com",
+        "email_verified": True,
+        "permissions": ["read:admin", "read:reports"],
+    },
+    "token": {"access_token": "x" * 800, "expires_at": 1700000000},
+}
+
+
+def worker(directory: str, operations: int, seed: int, results) -> None:
+    cache = SharedCache(directory, stripes=STRIPES, max_entries=KEYS * 2)
+    rng = random.Random(seed)
+    reads, writes = [], []
+    started = time.perf_counter()
+    for _ in range(operations):
+        key = f"session:{rng.randrange(KEYS)}"
+        op_started = time.perf_counter()
+        if rng.random() < 0.9:
+            cache.get(key)
+            reads.append(time.perf_counter() - op_started)
+        else:
+            cache.set(key, SESSION, 3600)
+            writes.append(time.perf_counter() - op_started)
+    elapsed = time.perf_counter() - started
+    cache.close()
+    results.put((reads, writes, elapsed, cache.stats["lock_contention"], cache.stats["hits"]))
+
+
+def percentile(samples, fraction: float) -> float:
+    return sorted(samples)[int(len(samples) * fraction)] if samples else 0.0
+
+
+def run(workers: int, operations: int) -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        cache = SharedCache(directory, stripes=STRIPES, max_entries=KEYS * 2)
+        for index in range(KEYS):
+            cache.set(f"session:{index}", SESSION, 3600)
+        cache.close()
+
+        results = multiprocessing.Queue()
+        processes = [
+            multiprocessing.Process(target=worker, args=(directory, operations, seed, results))
+            for seed in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        collected = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    reads = [sample for result in collected for sample in result[0]]
+    writes = [sample for result in collected for sample in result[1]]
+    throughput = sum(len(r[0]) + len(r[1]) for r in collected) / max(r[2] for r in collected)
+    contention = sum(result[3] for result in collected)
+    hit_rate = sum(result[4] for result in collected) / len(reads)
+    print(
+        f"{workers:>7}{throughput:>12.0f}{hit_rate:>8.0%}"
+        f"{statistics.median(reads) * 1e6:>11.1f}{percentile(reads, 0.99) * 1e6:>11.1f}"
+        f"{statistics.median(writes) * 1e6:>11.1f}{percentile(writes, 0.99) * 1e6:>11.1f}"
+        f"{contention:>12}"
+    )
+
+
+def main(operations: int) -> None:
+    print(f"{operations} operations per worker, 90% reads / 10% writes, {KEYS} keys, {STRIPES} stripes\n")
+    print(f"{'workers':>7}{'ops/s':>12}{'hits':>8}{'read p50':>11}{'read p99':>11}"
+          f"{'write p50':>11}{'write p99':>11}{'lock waits':>12}   (latencies in us)")
+    for workers in (4, 8, 16):
+        run(workers, operations)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -0,0 +1,162 @@
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+
+import httpx
+
+# Set up logging
+logger = logging.getLogger("circuit_breaker")
+
+
+class CircuitOpenError(httpx.TransportError):
+    """
+    Raised instead of calling an upstream whose breaker is open. It is an
+    httpx.RequestError, so callers handle it like an unreachable upstream
+    (stale keys, cached tokens, 503) without waiting for a timeout.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one kind of upstream call, with an adaptive timeout.
+
+    The outcomes and latencies of the last `window` calls are kept. Once at
+    least `min_requests` have been seen, the breaker opens when the error rate
+    reaches `error_rate` or the p99 latency reaches `latency_p99`. While open,
+    calls fail at once with CircuitOpenError. After `open_seconds` it lets
+    `probes` calls through (half-open): if they all succeed it closes, and if
+    one fails it opens again.
+
+    The timeout for each call follows observed latency: `timeout_multiplier`
+    times the p99 of recent successful calls, between `min_timeout` and the
+    caller's own timeout, so a slow upstream can't hold coroutines for the full
+    configured timeout.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 100,
+        min_requests: int = 20,
+        error_rate: float = 0.5,
+        latency_p99: float = 3.0,
+        open_seconds: float = 15.0,
+        probes: int = 1,
+        timeout_multiplier: float = 3.0,
+        min_timeout: float = 0.5,
+    ):
+        self.name = name
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.latency_p99 = latency_p99
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # (succeeded, latency) of recent calls
+        self._outcomes: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self._p99: Optional[float] = None
+        self._success_p99: Optional[float] = None
+        self.success_p95: Optional[float] = None
+        self._recorded = 0
+        self.stats = {"trips": 0, "rejected": 0, "probes": 0, "failures": 0}
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError if the call may not go through now."""
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened_at < self.open_seconds:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"Circuit breaker for {self.name} is open")
+            self.state = self.HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            logger.info(f"Circuit breaker for {self.name} is half-open, probing")
+        if self.state == self.HALF_OPEN:
+            if self._probes_in_flight >= self.probes:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(f"Circuit breaker for {self.name} is half-open")
+            self._probes_in_flight += 1
+            self.stats["probes"] += 1
+
+    def record(self, succeeded: bool, latency: float) -> None:
+        """Record the outcome of a call that before_call() let through."""
+        if not succeeded:
+            self.stats["failures"] += 1
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+            if not succeeded:
+                self._open("probe failed")
+                return
+            self._probe_successes += 1
+            if self._probe_successes >= self.probes:
+                self.state = self.CLOSED
+                self._outcomes.clear()
+                self._p99 = self._success_p99 = self.success_p95 = None
+                logger.info(f"Circuit breaker for {self.name} closed")
+            return
+        if self.state == self.OPEN:
+            # A call that started before the breaker opened
+            return
+
+        self._outcomes.append((succeeded, latency))
+        self._recorded += 1
+        if len(self._outcomes) < self.min_requests:
+            return
+        if self._recorded % 10 == 0 or self._p99 is None:
+            self._update_percentiles()
+        failures = sum(1 for ok, _ in self._outcomes if not ok)
+        if failures / len(self._outcomes) >= self.error_rate:
+            self._open(f"error rate {failures / len(self._outcomes):.0%}")
+        elif self._p99 >= self.latency_p99:
+            self._open(f"p99 latency {self._p99:.2f}s")
+
+    def cancelled(self) -> None:
+        """Release a call that before_call() let through but that was cancelled before it finished."""
+        if self.state == self.HALF_OPEN:
+            self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+
+    def _update_percentiles(self) -> None:
+        latencies = sorted(latency for _, latency in self._outcomes)
+        self._p99 = latencies[int(len(latencies) * 0.99)]
+        successes = sorted(latency for ok, latency in self._outcomes if ok)
+        if len(successes) >= self.min_requests:
+            self._success_p99 = successes[int(len(successes) * 0.99)]
+            self.success_p95 = successes[int(len(successes) * 0.95)]
+        else:
+            self._success_p99 = self.success_p95 = None
+
+    def _open(self, reason: str) -> None:
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self._p99 = None
+        self.stats["trips"] += 1
+        logger.warning(f"Circuit breaker for {self.name} opened: {reason}")
+
+    def timeout(self, configured: float) -> float:
+        """The timeout to use for a call whose caller asked for `configured` seconds."""
+        if self._success_p99 is None:
+            return configured
+        return min(max(self._success_p99 * self.timeout_multiplier, self.min_timeout), configured)
+
+    def get_stats(self) -> dict:
+        failures = sum(1 for ok, _ in self._outcomes if not ok)
+        return {
+            **self.stats,
+            "state": self.state,
+            "window": len(self._outcomes),
+            "error_rate": failures / len(self._outcomes) if self._outcomes else 0.0,
+            "p99": self._p99,
+            "success_p95": self.success_p95,
+            "adaptive_timeout": self.timeout(math.inf) if self._success_p99 is not None else None,
+        }
@@ -24,10 +24,120 @@ class Settings(BaseSettings):
     def OAUTH_USERINFO_URL(self) -> str:
         return f"https://{self.AUTH0_DOMAIN}/userinfo"
 
+    @property
+    def AUTH0_ISSUER(self) -> str:
+        return f"https://{self.AUTH0_DOMAIN}/"
+
+    @property
+    def AUTH0_JWKS_URL(self) -> str:
+        return f"https://{self.AUTH0_DOMAIN}/.well-known/jwks.json"
+
+    # JWT verification settings
+    JWKS_CACHE_TTL: int = Field(3600, env="JWKS_CACHE_TTL")
+    JWKS_REFRESH_MARGIN: int = Field(300, env="JWKS_REFRESH_MARGIN")
+    JWKS_MIN_REFETCH_INTERVAL: int = Field(30, env="JWKS_MIN_REFETCH_INTERVAL")
+
+    # Verified-token cache settings (per worker)
+    TOKEN_CACHE_MAX_ENTRIES: int = Field(10000, env="TOKEN_CACHE_MAX_ENTRIES")
+    TOKEN_CACHE_MAX_BYTES: int = Field(16 * 1024 * 1024, env="TOKEN_CACHE_MAX_BYTES")
+    TOKEN_CACHE_MAX_TTL: int = Field(300, env="TOKEN_CACHE_MAX_TTL")
+    REJECTED_TOKEN_CACHE_MAX_ENTRIES: int = Field(50000, env="REJECTED_TOKEN_CACHE_MAX_ENTRIES")
+    REJECTED_TOKEN_CACHE_TTL: int = Field(30, env="REJECTED_TOKEN_CACHE_TTL")
+    # Auth0 /userinfo responses, per worker; concurrent lookups of one token share a request
+    USERINFO_CACHE_MAX_ENTRIES: int = Field(10000, env="USERINFO_CACHE_MAX_ENTRIES")
+    USERINFO_CACHE_TTL: int = Field(60, env="USERINFO_CACHE_TTL")
+
+    # Where JWT signature verification runs: "inline", "thread" or "process"
+    VERIFY_EXECUTOR: str = Field("inline", env="VERIFY_EXECUTOR")
+    VERIFY_WORKERS: int = Field(4, env="VERIFY_WORKERS")
+    VERIFY_QUEUE_SIZE: int = Field(1000, env="VERIFY_QUEUE_SIZE")
+
+    # Maximum number of tokens accepted by /auth/introspect/batch
+    INTROSPECT_MAX_BATCH: int = Field(100, env="INTROSPECT_MAX_BATCH")
+    # Tokens of one batch verified at once (capped at half the verifier's pending limit)
+    INTROSPECT_CONCURRENCY: int = Field(16, env="INTROSPECT_CONCURRENCY")
+
+    # Authorization policy settings
+    POLICY_CACHE_TTL: int = Field(60, env="POLICY_CACHE_TTL")
+    POLICY_CACHE_MAX_ENTRIES: int = Field(10000, env="POLICY_CACHE_MAX_ENTRIES")
+    # Comma-separated GitHub orgs/users the GitHub bot may push to (empty allows all)
+    GITHUB_ALLOWED_ORGS: str = Field("", env="GITHUB_ALLOWED_ORGS")
+
     # API settings
     API_URL: str = Field("http://localhost:8000", env="API_URL")
     SECRET_KEY: str = Field("your-secret-key-for-sessions", env="SECRET_KEY")
 
+    # Session settings: "cookie" or "compact" (signed cookie), "memory", "sqlite" or "shared" (server-side)
+    SESSION_BACKEND: str = Field("cookie", env="SESSION_BACKEND")
+    SESSION_MAX_AGE: int = Field(14 * 24 * 60 * 60, env="SESSION_MAX_AGE")
+    SESSION_MEMORY_MAX_ENTRIES: int = Field(100000, env="SESSION_MEMORY_MAX_ENTRIES")
+    SESSION_SQLITE_PATH: str = Field("sessions.db", env="SESSION_SQLITE_PATH")
+    SESSION_COMPRESS_THRESHOLD: int = Field(256, env="SESSION_COMPRESS_THRESHOLD")
+    # Per-worker cache of decoded signed-cookie sessions
+    SESSION_CACHE_MAX_ENTRIES: int = Field(10000, env="SESSION_CACHE_MAX_ENTRIES")
+    SESSION_CACHE_TTL: int = Field(300, env="SESSION_CACHE_TTL")
+    # Comma-separated exact paths that never load or write the session
+    SESSION_EXCLUDED_PATHS: str = Field(
+        "/,/health,/docs,/docs/oauth2-redirect,/redoc,/openapi.json,/auth/login",
+        env="SESSION_EXCLUDED_PATHS",
+    )
+
+    # Per-user session revocation ("log out everywhere")
+    SESSION_REVOCATION_CHECK_INTERVAL: float = Field(1.0, env="SESSION_REVOCATION_CHECK_INTERVAL")
+    SESSION_REVOCATION_TTL: int = Field(365 * 24 * 60 * 60, env="SESSION_REVOCATION_TTL")
+    SESSION_INDEX_MAX_PER_USER: int = Field(50, env="SESSION_INDEX_MAX_PER_USER")
+
+    # Shared connection pool for calls to the Auth0 domain; timeouts are in seconds
+    AUTH0_HTTP_MAX_CONNECTIONS: int = Field(100, env="AUTH0_HTTP_MAX_CONNECTIONS")
+    AUTH0_HTTP_MAX_KEEPALIVE: int = Field(20, env="AUTH0_HTTP_MAX_KEEPALIVE")
+    AUTH0_HTTP_KEEPALIVE_EXPIRY: float = Field(60.0, env="AUTH0_HTTP_KEEPALIVE_EXPIRY")
+    AUTH0_HTTP2: bool = Field(False, env="AUTH0_HTTP2")
+    AUTH0_HTTP_TIMEOUT: float = Field(10.0, env="AUTH0_HTTP_TIMEOUT")
+    AUTH0_USERINFO_TIMEOUT: float = Field(5.0, env="AUTH0_USERINFO_TIMEOUT")
+    AUTH0_TOKEN_TIMEOUT: float = Field(10.0, env="AUTH0_TOKEN_TIMEOUT")
+    AUTH0_MANAGEMENT_TIMEOUT: float = Field(10.0, env="AUTH0_MANAGEMENT_TIMEOUT")
+    AUTH0_JWKS_TIMEOUT: float = Field(5.0, env="AUTH0_JWKS_TIMEOUT")
+    # Per-route circuit breakers: open on error rate or p99 latency (seconds) over the last
+    # AUTH0_BREAKER_WINDOW calls, then probe after AUTH0_BREAKER_OPEN_SECONDS
+    AUTH0_BREAKER_WINDOW: int = Field(100, env="AUTH0_BREAKER_WINDOW")
+    AUTH0_BREAKER_MIN_REQUESTS: int = Field(20, env="AUTH0_BREAKER_MIN_REQUESTS")
+    AUTH0_BREAKER_ERROR_RATE: float = Field(0.5, env="AUTH0_BREAKER_ERROR_RATE")
+    AUTH0_BREAKER_LATENCY_P99: float = Field(3.0, env="AUTH0_BREAKER_LATENCY_P99")
+    AUTH0_BREAKER_OPEN_SECONDS: float = Field(15.0, env="AUTH0_BREAKER_OPEN_SECONDS")
+    AUTH0_BREAKER_PROBES: int = Field(1, env="AUTH0_BREAKER_PROBES")
+    # Timeouts follow observed latency: this multiple of the p99, never below the minimum
+    AUTH0_ADAPTIVE_TIMEOUT_MULTIPLIER: float = Field(3.0, env="AUTH0_ADAPTIVE_TIMEOUT_MULTIPLIER")
+    AUTH0_ADAPTIVE_TIMEOUT_MIN: float = Field(0.5, env="AUTH0_ADAPTIVE_TIMEOUT_MIN")
+    # Hedged GETs: comma-separated routes, and the most extra load (fraction of requests) hedges may add
+    AUTH0_HEDGE_ROUTES: str = Field("userinfo,jwks", env="AUTH0_HEDGE_ROUTES")
+    AUTH0_HEDGE_BUDGET: float = Field(0.05, env="AUTH0_HEDGE_BUDGET")
+    AUTH0_HEDGE_MIN_DELAY: float = Field(0.05, env="AUTH0_HEDGE_MIN_DELAY")
+
+    # Management API token cache: refresh this many seconds before expiry, retry failed refreshes
+    # after MANAGEMENT_TOKEN_RETRY_INTERVAL, and share the token with other workers via the shared cache
+    MANAGEMENT_TOKEN_REFRESH_MARGIN: int = Field(300, env="MANAGEMENT_TOKEN_REFRESH_MARGIN")
+    MANAGEMENT_TOKEN_RETRY_INTERVAL: int = Field(30, env="MANAGEMENT_TOKEN_RETRY_INTERVAL")
+    MANAGEMENT_TOKEN_SHARED: bool = Field(True, env="MANAGEMENT_TOKEN_SHARED")
+
+    # Connections catalog from the Management API: refresh interval, and how long a failed load is not retried
+    CONNECTIONS_CACHE_TTL: int = Field(300, env="CONNECTIONS_CACHE_TTL")
+    CONNECTIONS_RETRY_INTERVAL: int = Field(30, env="CONNECTIONS_RETRY_INTERVAL")
+    # Connections are listed page by page: "offset" (pages fetched concurrently) or "checkpoint" (cursor)
+    CONNECTIONS_PAGINATION: str = Field("offset", env="CONNECTIONS_PAGINATION")
+    CONNECTIONS_PAGE_SIZE: int = Field(100, env="CONNECTIONS_PAGE_SIZE")
+    CONNECTIONS_PAGE_CONCURRENCY: int = Field(4, env="CONNECTIONS_PAGE_CONCURRENCY")
+
+    # Seconds between timing-wheel sweeps of expired cache and session entries
+    EXPIRY_SWEEP_INTERVAL: float = Field(1.0, env="EXPIRY_SWEEP_INTERVAL")
+    # Seconds between purges of expired rows from the sqlite session store and the shared cache
+    EXPIRY_PURGE_INTERVAL: float = Field(60.0, env="EXPIRY_PURGE_INTERVAL")
+
+    # Cross-process cache shared by all workers on the host (SQLite files, one per lock stripe)
+    SHARED_CACHE_DIR: str = Field("shared_cache", env="SHARED_CACHE_DIR")
+    SHARED_CACHE_STRIPES: int = Field(8, env="SHARED_CACHE_STRIPES")
+    SHARED_CACHE_MAX_ENTRIES: int = Field(100000, env="SHARED_CACHE_MAX_ENTRIES")
+    SHARED_CACHE_MMAP_SIZE: int = Field(64 * 1024 * 1024, env="SHARED_CACHE_MMAP_SIZE")
+
     # Determines if we're running in debug mode
     DEBUG: bool = Field(True, env="DEBUG")
     
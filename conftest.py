@@ -0,0 +1,62 @@
+"""
+Shared fixtures: an RSA signing key loaded into the JWKS store, and access tokens signed with it.
+"""
+import os
+import tempfile
+import time
+
+# Keep the cross-process cache out of the working tree while tests run
+os.environ.setdefault("SHARED_CACHE_DIR", tempfile.mkdtemp(prefix="shared_cache_"))
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+from config import settings
+from jwks import jwks_store
+from token_cache import rejected_token_cache, token_cache
+
+_private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+PRIVATE_PEM = _private_key.private_bytes(
+    serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+).decode()
+PUBLIC_PEM = _private_key.public_key().public_bytes(
+    serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+).decode()
+
+
+def public_jwk(kid: str = "test-key") -> dict:
+    key_data = {
+        name: value.decode() if isinstance(value, bytes) else value
+        for name, value in jwk.construct(PUBLIC_PEM, "RS256").to_dict().items()
+    }
+    return {**key_data, "kid": kid, "use": "sig"}
+
+
+@pytest.fixture
+def signing_key():
+    """Load the test key into the JWKS store and start from empty token caches."""
+    jwks_store.load({"keys": [public_jwk()]})
+    token_cache.clear()
+    rejected_token_cache.clear()
+    yield
+
+
+@pytest.fixture
+def make_token():
+    """Build a signed access token; passing a claim as None drops it."""
+    def make(kid: str = "test-key", **overrides) -> str:
+        now = int(time.time())
+        claims = {
+            "sub": "github|583231",
+            "iss": settings.AUTH0_ISSUER,
+            "aud": settings.AUTH0_AUDIENCE,
+            "iat": now,
+            "exp": now + 3600,
+        }
+        claims.update(overrides)
+        claims = {name: value for name, value in claims.items() if value is not None}
+        return jwt.encode(claims, PRIVATE_PEM, algorithm="RS256", headers={"kid": kid})
+
+    return make
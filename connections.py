@@ -0,0 +1,237 @@
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from fastapi import HTTPException, status
+
+from config import settings
+from http_client import auth0_http
+from management_token import management_token_cache
+
+# Set up logging
+logger = logging.getLogger("connections")
+
+
+class ConnectionCatalog:
+    """
+    Cache of the tenant's connections from the Management API, indexed by
+    strategy and by name.
+
+    The catalog is loaded at startup and refreshed in the background every
+    `ttl` seconds, so GitHub logins and the connection debug routes read it
+    without calling Auth0. A stale catalog keeps being served while Auth0 is
+    unreachable. If it could never be loaded (e.g. the app has no Management
+    API access), the error is remembered and re-raised for `retry_interval`
+    seconds rather than retried on every request.
+
+    Connections are read page by page. With "offset" pagination the first page
+    reports the total and the remaining pages are fetched `concurrency` at a
+    time; "checkpoint" pagination follows the `next` cursor one page at a time.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        ttl: float,
+        retry_interval: float,
+        page_size: int = 100,
+        concurrency: int = 4,
+        pagination: str = "offset",
+    ):
+        if pagination not in ("offset", "checkpoint"):
+            raise ValueError(f"Unknown connections pagination: {pagination}")
+        self.connections_url = f"https://{domain}/api/v2/connections"
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self.page_size = page_size
+        self.concurrency = max(concurrency, 1)
+        self.pagination = pagination
+        self._connections: List[dict] = []
+        self._by_strategy: Dict[str, List[dict]] = {}
+        self._by_name: Dict[str, dict] = {}
+        self._loaded = False
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._last_error: Optional[Exception] = None
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.stats = {"hits": 0, "fetches": 0, "fetch_errors": 0, "pages": 0}
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    async def all(self) -> List[dict]:
+        await self._ensure_loaded()
+        return self._connections
+
+    async def by_strategy(self, strategy: str) -> List[dict]:
+        await self._ensure_loaded()
+        return self._by_strategy.get(strategy, [])
+
+    async def by_name(self, name: str) -> Optional[dict]:
+        await self._ensure_loaded()
+        return self._by_name.get(name)
+
+    async def first(self, strategy: str) -> Optional[dict]:
+        """The first connection using `strategy`, e.g. "github", or None."""
+        connections = await self.by_strategy(strategy)
+        return connections[0] if connections else None
+
+    async def names(self) -> List[str]:
+        await self._ensure_loaded()
+        return list(self._by_name)
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            self.stats["hits"] += 1
+            if self.age >= self.ttl and time.monotonic() - self._last_attempt >= self.retry_interval:
+                # Serve the stale catalog and revalidate in the background
+                self._start_fetch()
+            return
+        if self._last_error is not None and time.monotonic() - self._last_attempt < self.retry_interval:
+            raise self._last_error
+        await self.refresh()
+        if not self._loaded:
+            if self._last_error is not None:
+                raise self._last_error
+            # e.g. the load was cancelled before it could fail or succeed
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Connections catalog unavailable",
+            )
+
+    async def refresh(self) -> None:
+        """Fetch the connections now, joining a fetch that is already in flight."""
+        await asyncio.shield(self._start_fetch())
+
+    def _start_fetch(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._last_attempt = time.monotonic()
+            self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    async def _get_page(self, client, token: str, params: dict):
+        response = await client.get(
+            self.connections_url,
+            params=params,
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        response.raise_for_status()
+        self.stats["pages"] += 1
+        return response.json()
+
+    async def iter_pages(self) -> AsyncIterator[List[dict]]:
+        """Fetch every page of connections from Auth0, yielding the pages in order."""
+        token = await management_token_cache.get()
+        async with auth0_http.route("management") as client:
+            if self.pagination == "checkpoint":
+                params = {"take": self.page_size}
+                while True:
+                    body = await self._get_page(client, token, params)
+                    connections = body.get("connections", [])
+                    if connections:
+                        yield connections
+                    if not connections or not body.get("next"):
+                        return
+                    params = {"take": self.page_size, "from": body["next"]}
+
+            first = await self._get_page(client, token, {"per_page": self.page_size, "page": 0, "include_totals": "true"})
+            if isinstance(first, list):
+                # Not paginated by the server
+                yield first
+                return
+            yield first.get("connections", [])
+
+            pages = math.ceil(first.get("total", 0) / self.page_size)
+            pending: Deque[asyncio.Task] = deque()
+            next_page = 1
+            try:
+                while next_page < pages or pending:
+                    # Keep up to `concurrency` pages in flight, and hand them out in order
+                    while next_page < pages and len(pending) < self.concurrency:
+                        params = {"per_page": self.page_size, "page": next_page, "include_totals": "true"}
+                        pending.append(asyncio.create_task(self._get_page(client, token, params)))
+                        next_page += 1
+                    body = await pending.popleft()
+                    yield body.get("connections", [])
+            finally:
+                for task in pending:
+                    task.cancel()
+
+    async def _fetch(self) -> None:
+        self.stats["fetches"] += 1
+        try:
+            self.load([connection async for page in self.iter_pages() for connection in page])
+        except Exception as e:
+            self.stats["fetch_errors"] += 1
+            self._last_error = e
+            logger.error(f"Error fetching connections from Auth0: {e}")
+            if self._loaded:
+                logger.warning(f"Serving stale connections catalog ({int(self.age)}s old)")
+
+    def load(self, connections: List[dict]) -> None:
+        """Replace the catalog with a list of connection objects."""
+        by_strategy: Dict[str, List[dict]] = {}
+        for connection in connections:
+            by_strategy.setdefault(connection["strategy"], []).append(connection)
+        self._connections = connections
+        self._by_strategy = by_strategy
+        self._by_name = {connection["name"]: connection for connection in connections}
+        self._loaded = True
+        self._last_error = None
+        self._fetched_at = time.monotonic()
+        logger.info(f"Loaded {len(connections)} connections")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            # Jitter so workers don't fetch in lockstep
+            delay = self.ttl - self.age if self._loaded else self.retry_interval
+            await asyncio.sleep(max(delay, self.retry_interval) + random.uniform(0, self.ttl / 10))
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background connections refresh failed: {e}")
+
+    async def start(self) -> None:
+        """Load the catalog and start the background refresh task."""
+        await self.refresh()
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        for task in (self._refresher, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresher = None
+        self._inflight = None
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "loaded": self._loaded,
+            "connections": len(self._connections),
+            "strategies": sorted(self._by_strategy),
+            "age": int(self.age) if self._loaded else None,
+            "last_error": str(self._last_error) if self._last_error is not None else None,
+        }
+
+
+connection_catalog = ConnectionCatalog(
+    settings.AUTH0_DOMAIN,
+    ttl=settings.CONNECTIONS_CACHE_TTL,
+    retry_interval=settings.CONNECTIONS_RETRY_INTERVAL,
+    page_size=settings.CONNECTIONS_PAGE_SIZE,
+    concurrency=settings.CONNECTIONS_PAGE_CONCURRENCY,
+    pagination=settings.CONNECTIONS_PAGINATION,
+)
@@ -0,0 +1,120 @@
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from starlette.requests import cookie_parser
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from auth import decode_access_token, get_auth_type
+from config import settings
+from session_index import session_index
+from sessions import SessionBackend, decoded_session_cache
+from session_codec import session_codec
+
+
+class ForwardAuthMiddleware:
+    """
+    External authorizer endpoint for reverse proxies (nginx auth_request, Envoy ext_authz).
+
+    Requests to `path` are answered here, before the CORS and session middleware
+    and without routing, templates or Pydantic models. A valid session cookie or
+    bearer token gets a 204 with X-User-Id, X-Auth-Type and X-Auth-Method
+    headers; anything else gets a 401. All other requests pass through untouched.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        path: str = "/auth/verify",
+        session_backend: Optional[SessionBackend] = None,
+        session_cookie: str = "session",
+        max_age: Optional[int] = settings.SESSION_MAX_AGE,
+    ) -> None:
+        self.app = app
+        self.path = path
+        self.session_backend = session_backend
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            identity = await self.authenticate(scope)
+        except HTTPException as e:
+            # Auth0 unavailable or verification queue full
+            await self._respond(send, e.status_code, [])
+            return
+
+        if identity is None:
+            await self._respond(send, 401, [(b"www-authenticate", b"Bearer")])
+            return
+
+        user_id, method = identity
+        await self._respond(send, 204, [
+            (b"x-user-id", user_id.encode()),
+            (b"x-auth-type", get_auth_type(user_id).encode()),
+            (b"x-auth-method", method.encode()),
+        ])
+
+    async def authenticate(self, scope: Scope) -> Optional[Tuple[str, str]]:
+        """Return (user ID, auth method) for the request, or None if unauthenticated."""
+        authorization = None
+        cookie = None
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                authorization = value
+            elif name == b"cookie":
+                cookie = value
+
+        if authorization is not None and authorization[:7].lower() == b"bearer ":
+            return await self._authenticate_bearer(authorization[7:].strip().decode("latin-1"))
+        if cookie is not None:
+            return await self._authenticate_session(cookie.decode("latin-1"))
+        return None
+
+    async def _authenticate_bearer(self, token: str) -> Optional[Tuple[str, str]]:
+        try:
+            claims = await decode_access_token(token)
+        except HTTPException as e:
+            if e.status_code != 401:
+                raise
+            return None
+        sub = claims.get("sub")
+        return (sub, "bearer") if sub else None
+
+    async def _authenticate_session(self, cookie_header: str) -> Optional[Tuple[str, str]]:
+        data = cookie_parser(cookie_header).get(self.session_cookie)
+        if not data:
+            return None
+        if self.session_backend is not None:
+            session = await self.session_backend.get(data)
+            if session is None:
+                return None
+        else:
+            cached = decoded_session_cache.get(data)
+            if cached is not None:
+                session = cached.data
+            else:
+                # Reads both compact and Starlette signed-cookie sessions
+                decoded = session_codec.decode_with_timestamp(data, max_age=self.max_age)
+                if decoded is None:
+                    return None
+                session, signed_at = decoded
+                expires_at = signed_at + self.max_age if self.max_age else None
+                decoded_session_cache.put(data, session, expires_at, signed_at)
+        user_data = session.get("user") or {}
+        user_id = user_data.get("id")
+        if not user_id or await session_index.is_revoked(user_data):
+            return None
+        return user_id, "session"
+
+    @staticmethod
+    async def _respond(send: Send, status_code: int, headers: list) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-length", b"0"), *headers],
+        })
+        await send({"type": "http.response.body", "body": b""})
@@ -7,6 +7,8 @@ import base64
 import logging
 from typing import Optional
 from auth import verify_session
+from models import User
+from policy import policy_engine
 
 # Set up logging
 logger = logging.getLogger("github_bot")
@@ -37,14 +39,18 @@ async def github_bot_page(request: Request, current_user: dict = Depends(verify_
 @router.post("/api/github/push")
 async def push_to_github(
     request: GitHubPushRequest,
-    current_user: dict = Depends(verify_session)
+    http_request: Request,
+    current_user: User = Depends(verify_session)
 ):
     """
     Push content to a GitHub repository
     """
+    # Only GitHub users may push, and only to repos under the allowed orgs
+    policy_engine.authorize("github:push", current_user, request.repoName)
+
     try:
-        # Get GitHub token from user's session
-        github_token = current_user.get("github_token")
+        # Get GitHub token from user's session (stored at login, not part of User)
+        github_token = (http_request.session.get("user") or {}).get("github_token")
         if not github_token:
             raise HTTPException(
                 status_code=401,
@@ -106,6 +112,8 @@ async def push_to_github(
                     detail=f"Failed to push to GitHub: {error_message}"
                 )
 
+    except HTTPException:
+        raise
     except httpx.RequestError as e:
         logger.error(f"Error connecting to GitHub: {str(e)}")
         raise HTTPException(
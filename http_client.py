@@ -0,0 +1,323 @@
+import asyncio
+import contextlib
+import importlib.util
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+import httpx
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from config import settings
+
+# Set up logging
+logger = logging.getLogger("http_client")
+
+
+class RouteClient:
+    """
+    View of the shared client for one kind of Auth0 call ("userinfo", "token",
+    "management", "jwks", ...), applying that route's timeout and recording its
+    metrics. Usable as `async with auth0_http.route("userinfo") as client:`;
+    leaving the block does not close the shared connections.
+    """
+
+    def __init__(self, pool: "PooledHTTPClient", route: str):
+        self._pool = pool
+        self.route = route
+
+    async def __aenter__(self) -> "RouteClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        pass
+
+    async def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        return await self._pool.request(method, url, route=self.route, **kwargs)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """
+    Transport for httpx clients that other libraries create and close on their
+    own (e.g. authlib's OAuth client): requests go through the shared pool, and
+    closing the client leaves the pooled connections open.
+
+    Every call goes through its route's circuit breaker; idempotent calls also
+    get the breaker's adaptive timeout.
+    """
+
+    ADAPTIVE_TIMEOUT_METHODS = frozenset({"GET", "HEAD"})
+
+    def __init__(self, pool: "PooledHTTPClient", route: str):
+        self._pool = pool
+        self.route = route
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        route = request.extensions.get("route", self.route)
+        breaker = self._pool.breaker(route)
+        try:
+            breaker.before_call()
+        except CircuitOpenError as e:
+            e.request = request
+            raise
+        timeout = request.extensions.get("timeout")
+        if timeout and request.method in self.ADAPTIVE_TIMEOUT_METHODS:
+            # Cap the time spent waiting on the upstream at what recent latency warrants.
+            # Only for idempotent calls: a token exchange cut short can't be retried,
+            # its authorization code is single-use
+            request.extensions["timeout"] = {
+                phase: breaker.timeout(value) if value is not None and phase in ("read", "write") else value
+                for phase, value in timeout.items()
+            }
+
+        started = time.perf_counter()
+        try:
+            with self._pool.track(route):
+                response = await self._pool.transport.handle_async_request(request)
+        except httpx.RequestError:
+            breaker.record(False, time.perf_counter() - started)
+            raise
+        except BaseException:
+            # Cancelled, or failed on our side: says nothing about the upstream
+            breaker.cancelled()
+            raise
+        breaker.record(response.status_code < 500 and response.status_code != 429, time.perf_counter() - started)
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+
+class PooledHTTPClient:
+    """
+    One httpx.AsyncClient shared by every call to an upstream, so requests reuse
+    warm keep-alive connections instead of paying a TCP and TLS handshake each.
+
+    The client is opened at startup and closed at shutdown; if it is used
+    before startup (e.g. from a script) it is opened on first use. HTTP/2 is
+    used when requested and the optional `h2` package is installed.
+
+    GETs on `hedge_routes` are hedged: if the first attempt hasn't answered
+    within the route's observed p95 latency, a second attempt is sent on
+    another pooled connection and whichever answers first wins. Hedges are
+    paid for from a token bucket that earns `hedge_budget` tokens per eligible
+    request, so they add at most that fraction of extra load.
+    """
+
+    # Most hedges that can be saved up while traffic is fast
+    HEDGE_BURST = 10.0
+
+    def __init__(
+        self,
+        name: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        http2: bool,
+        timeout: float,
+        route_timeouts: Optional[Dict[str, float]] = None,
+        breaker_options: Optional[dict] = None,
+        hedge_routes: Iterable[str] = (),
+        hedge_budget: float = 0.05,
+        hedge_min_delay: float = 0.05,
+    ):
+        self.name = name
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self.timeout = timeout
+        self.route_timeouts = route_timeouts or {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._in_flight = 0
+        self.stats = {"requests": 0, "errors": 0, "in_flight_max": 0}
+        self.route_stats: Dict[str, dict] = {}
+        self.breaker_options = breaker_options or {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.hedge_routes = frozenset(hedge_routes)
+        self.hedge_budget = hedge_budget
+        self.hedge_min_delay = hedge_min_delay
+        self._hedge_tokens = 0.0
+        self.hedge_stats = {"eligible": 0, "fired": 0, "won": 0, "budget_exhausted": 0}
+
+    @property
+    def transport(self) -> httpx.AsyncHTTPTransport:
+        if self._transport is None:
+            http2 = self.http2
+            if http2 and importlib.util.find_spec("h2") is None:
+                logger.warning(f"HTTP/2 requested for {self.name} but the h2 package is not installed; using HTTP/1.1")
+                http2 = False
+            self._transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=http2)
+        return self._transport
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(transport=SharedTransport(self, "default"), timeout=self.timeout)
+        return self._client
+
+    def route(self, route: str) -> RouteClient:
+        return RouteClient(self, route)
+
+    def breaker(self, route: str) -> CircuitBreaker:
+        """The circuit breaker guarding calls on `route`."""
+        breaker = self._breakers.get(route)
+        if breaker is None:
+            breaker = self._breakers[route] = CircuitBreaker(f"{self.name}:{route}", **self.breaker_options)
+        return breaker
+
+    def shared_transport(self, route: str) -> SharedTransport:
+        """A transport to hand to httpx clients created elsewhere, so they use this pool too."""
+        return SharedTransport(self, route)
+
+    async def request(self, method: str, url: str, route: str = "default", **kwargs) -> httpx.Response:
+        kwargs.setdefault("timeout", self.route_timeouts.get(route, self.timeout))
+        kwargs.setdefault("extensions", {})["route"] = route
+        if method == "GET" and route in self.hedge_routes:
+            return await self._hedged_request(method, url, route, kwargs)
+        return await self.client.request(method, url, **kwargs)
+
+    async def _hedged_request(self, method: str, url: str, route: str, kwargs: dict) -> httpx.Response:
+        self.hedge_stats["eligible"] += 1
+        self._hedge_tokens = min(self._hedge_tokens + self.hedge_budget, self.HEDGE_BURST)
+        delay = self.breaker(route).success_p95
+        first = asyncio.ensure_future(self.client.request(method, url, **kwargs))
+        attempts = {first}
+        try:
+            if delay is None:
+                # Not enough latency samples yet to know what "slow" is
+                return await first
+            done, _ = await asyncio.wait(attempts, timeout=max(delay, self.hedge_min_delay))
+            if done:
+                return first.result()
+            if self._hedge_tokens < 1:
+                self.hedge_stats["budget_exhausted"] += 1
+                return await first
+
+            self._hedge_tokens -= 1
+            self.hedge_stats["fired"] += 1
+            self._route_stats(route)["hedges_fired"] += 1
+            hedge = asyncio.ensure_future(self.client.request(method, url, **kwargs))
+            attempts.add(hedge)
+            pending = set(attempts)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        if attempt is hedge:
+                            self.hedge_stats["won"] += 1
+                            self._route_stats(route)["hedges_won"] += 1
+                        return attempt.result()
+            # Both attempts failed
+            return first.result()
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+
+    def _route_stats(self, route: str) -> dict:
+        stats = self.route_stats.get(route)
+        if stats is None:
+            stats = self.route_stats[route] = {
+                "requests": 0, "errors": 0, "latency_total": 0.0, "latency_max": 0.0, "hedges_fired": 0, "hedges_won": 0,
+            }
+        return stats
+
+    @contextlib.contextmanager
+    def track(self, route: str):
+        """Record one request on `route` in the pool metrics."""
+        stats = self._route_stats(route)
+
+        self._in_flight += 1
+        self.stats["in_flight_max"] = max(self.stats["in_flight_max"], self._in_flight)
+        started = time.perf_counter()
+        try:
+            yield
+        except httpx.RequestError:
+            self.stats["errors"] += 1
+            stats["errors"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            elapsed = time.perf_counter() - started
+            self.stats["requests"] += 1
+            stats["requests"] += 1
+            stats["latency_total"] += elapsed
+            stats["latency_max"] = max(stats["latency_max"], elapsed)
+
+    async def start(self) -> None:
+        self.client
+
+    async def stop(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        if self._transport is not None:
+            await self._transport.aclose()
+            self._transport = None
+
+    def _pool_stats(self) -> dict:
+        # httpx doesn't expose its connection pool; read httpcore's, if it is there
+        pool = getattr(self._transport, "_pool", None)
+        connections = getattr(pool, "connections", None)
+        if connections is None:
+            return {"connections": 0, "idle": 0, "active": 0}
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {"connections": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def get_stats(self) -> dict:
+        routes = {
+            route: {**stats, "latency_avg": stats["latency_total"] / stats["requests"] if stats["requests"] else 0.0}
+            for route, stats in self.route_stats.items()
+        }
+        return {
+            **self.stats,
+            "in_flight": self._in_flight,
+            "pool": {
+                **self._pool_stats(),
+                "max_connections": self.limits.max_connections,
+                "max_keepalive_connections": self.limits.max_keepalive_connections,
+            },
+            "routes": routes,
+            "breakers": {route: breaker.get_stats() for route, breaker in self._breakers.items()},
+            "hedging": {**self.hedge_stats, "routes": sorted(self.hedge_routes), "budget": self.hedge_budget},
+        }
+
+
+# Shared client for every call to the Auth0 domain
+auth0_http = PooledHTTPClient(
+    "auth0",
+    max_connections=settings.AUTH0_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.AUTH0_HTTP_MAX_KEEPALIVE,
+    keepalive_expiry=settings.AUTH0_HTTP_KEEPALIVE_EXPIRY,
+    http2=settings.AUTH0_HTTP2,
+    timeout=settings.AUTH0_HTTP_TIMEOUT,
+    route_timeouts={
+        "userinfo": settings.AUTH0_USERINFO_TIMEOUT,
+        "token": settings.AUTH0_TOKEN_TIMEOUT,
+        "management": settings.AUTH0_MANAGEMENT_TIMEOUT,
+        "jwks": settings.AUTH0_JWKS_TIMEOUT,
+    },
+    breaker_options={
+        "window": settings.AUTH0_BREAKER_WINDOW,
+        "min_requests": settings.AUTH0_BREAKER_MIN_REQUESTS,
+        "error_rate": settings.AUTH0_BREAKER_ERROR_RATE,
+        "latency_p99": settings.AUTH0_BREAKER_LATENCY_P99,
+        "open_seconds": settings.AUTH0_BREAKER_OPEN_SECONDS,
+        "probes": settings.AUTH0_BREAKER_PROBES,
+        "timeout_multiplier": settings.AUTH0_ADAPTIVE_TIMEOUT_MULTIPLIER,
+        "min_timeout": settings.AUTH0_ADAPTIVE_TIMEOUT_MIN,
+    },
+    hedge_routes=[route.strip() for route in settings.AUTH0_HEDGE_ROUTES.split(",") if route.strip()],
+    hedge_budget=settings.AUTH0_HEDGE_BUDGET,
+    hedge_min_delay=settings.AUTH0_HEDGE_MIN_DELAY,
+)
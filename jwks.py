@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Dict, Optional
+
+import httpx
+from jose import jwk
+from jose.backends.base import Key
+
+from config import settings
+from http_client import auth0_http
+
+# Set up logging
+logger = logging.getLogger("jwks")
+
+
+class JWKSKeyStore:
+    """
+    Cache of the tenant's JWKS signing keys, indexed by key ID.
+
+    Each JWK is parsed into a public key object once, when it is fetched.
+    Keys are refreshed in the background before the TTL runs out, and stale
+    keys keep being served while Auth0 is unreachable. A token with an unknown
+    key ID, or any token while no keys could be loaded yet, triggers at most one
+    refetch per JWKS_MIN_REFETCH_INTERVAL seconds, shared by every request
+    waiting on it.
+    """
+
+    def __init__(
+        self,
+        jwks_url: str,
+        ttl: float,
+        refresh_margin: float,
+        min_refetch_interval: float,
+    ):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.refresh_margin = refresh_margin
+        self.min_refetch_interval = min_refetch_interval
+        self._keys: Dict[str, Key] = {}
+        self._key_data: Dict[str, dict] = {}
+        self._fetched_at = 0.0
+        self._last_attempt = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self.stats = {"fetches": 0, "fetch_errors": 0, "unknown_kid": 0}
+
+    @property
+    def has_keys(self) -> bool:
+        return bool(self._keys)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self._fetched_at
+
+    @property
+    def key_data(self) -> Dict[str, dict]:
+        """The raw JWKs behind the cached keys, e.g. for pre-loading worker processes."""
+        return dict(self._key_data)
+
+    def get_key_data(self, kid: Optional[str]) -> Optional[dict]:
+        return self._key_data.get(kid)
+
+    def get_cached_key(self, kid: Optional[str]) -> Optional[Key]:
+        """Return a key without ever touching the network."""
+        return self._keys.get(kid)
+
+    async def get_key(self, kid: Optional[str]) -> Optional[Key]:
+        """
+        Return the public key for a key ID.
+        Only blocks on the network on a cold start or for an unknown key ID.
+        """
+        key = self._keys.get(kid)
+        if key is not None:
+            if self.age >= self.ttl and self._may_refetch():
+                # Serve the stale key and revalidate in the background
+                self._start_fetch()
+            return key
+
+        if self._keys:
+            # Unknown key ID: the tenant may have rotated its signing keys
+            self.stats["unknown_kid"] += 1
+        # With no keys at all (Auth0 unreachable since startup), the same gate keeps
+        # every request from refetching; callers answer 503 in the meantime
+        if self._may_refetch():
+            await self.refresh()
+        elif self._inflight is not None:
+            await asyncio.shield(self._inflight)
+        return self._keys.get(kid)
+
+    async def refresh(self) -> Dict[str, Key]:
+        """Fetch the JWKS now, joining a fetch that is already in flight."""
+        await asyncio.shield(self._start_fetch())
+        return self._keys
+
+    def _may_refetch(self) -> bool:
+        return time.monotonic() - self._last_attempt >= self.min_refetch_interval
+
+    def _start_fetch(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._last_attempt = time.monotonic()
+            self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    async def _fetch(self) -> None:
+        self.stats["fetches"] += 1
+        try:
+            async with auth0_http.route("jwks") as client:
+                response = await client.get(self.jwks_url)
+                response.raise_for_status()
+                jwks = response.json()
+        except (httpx.RequestError, httpx.HTTPStatusError, ValueError) as e:
+            self.stats["fetch_errors"] += 1
+            logger.error(f"Error fetching JWKS from Auth0: {e}")
+            if self._keys:
+                logger.warning(f"Serving stale JWKS keys ({int(self.age)}s old)")
+            return
+
+        self.load(jwks)
+
+    def load(self, jwks: dict) -> int:
+        """
+        Parse a JWKS document and replace the cached keys with its signing keys.
+        Returns the number of keys loaded; an empty document leaves the cache as is.
+        """
+        keys = {}
+        key_data_by_kid = {}
+        for key_data in jwks.get("keys", []):
+            if key_data.get("kty") != "RSA" or not key_data.get("kid"):
+                continue
+            if key_data.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[key_data["kid"]] = jwk.construct(key_data, algorithm="RS256")
+                key_data_by_kid[key_data["kid"]] = key_data
+            except Exception as e:
+                logger.warning(f"Skipping unusable JWK {key_data.get('kid')}: {e}")
+
+        if not keys:
+            logger.error("JWKS response contained no usable signing keys")
+            return 0
+
+        self._keys = keys
+        self._key_data = key_data_by_kid
+        self._fetched_at = time.monotonic()
+        logger.info(f"Loaded {len(keys)} signing keys from JWKS")
+        return len(keys)
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            # Refresh ahead of expiry, with jitter so workers don't fetch in lockstep
+            delay = max(self.ttl - self.refresh_margin - self.age, self.min_refetch_interval)
+            delay += random.uniform(0, self.refresh_margin / 2)
+            await asyncio.sleep(delay)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background JWKS refresh failed: {e}")
+
+    async def start(self) -> None:
+        """Load the keys and start the background refresh task."""
+        await self.refresh()
+        if self._refresher is None or self._refresher.done():
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        """Stop the background refresh task."""
+        for task in (self._refresher, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresher = None
+        self._inflight = None
+
+
+jwks_store = JWKSKeyStore(
+    settings.AUTH0_JWKS_URL,
+    ttl=settings.JWKS_CACHE_TTL,
+    refresh_margin=settings.JWKS_REFRESH_MARGIN,
+    min_refetch_interval=settings.JWKS_MIN_REFETCH_INTERVAL,
+)
@@ -1,12 +1,23 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.responses import JSONResponse
-from starlette.middleware.sessions import SessionMiddleware
 from starlette.middleware.cors import CORSMiddleware
 import uvicorn
 import logging
 import sys
 
 from auth import oauth
+from jwks import jwks_store
+from verifier import token_verifier
+from forward_auth import ForwardAuthMiddleware
+from policy import policy_engine
+from sessions import ServerSessionMiddleware, SQLiteSessionBackend, create_session_backend, decoded_session_cache, parse_excluded_paths
+from session_codec import CookieSessionMiddleware, session_codec
+from shared_cache import shared_cache
+from http_client import auth0_http
+from management_token import management_token_cache
+from connections import connection_catalog
+from timing_wheel import expiry_sweeper
+from token_cache import token_cache, rejected_token_cache, userinfo_cache
 from config import settings
 import auth_routes
 import protected_routes
@@ -37,7 +48,28 @@ app.add_middleware(
 )
 
 # Add session middleware for OAuth authentication
-app.add_middleware(SessionMiddleware, secret_key=settings.SECRET_KEY)
+session_backend = create_session_backend()
+session_excluded_paths = parse_excluded_paths(settings.SESSION_EXCLUDED_PATHS)
+if session_backend is None:
+    # Stateless sessions in a signed cookie (JSON or compact binary encoding), decoded on first use
+    app.add_middleware(
+        CookieSessionMiddleware,
+        codec=session_codec,
+        cache=decoded_session_cache,
+        max_age=settings.SESSION_MAX_AGE,
+        excluded_paths=session_excluded_paths,
+    )
+else:
+    # Server-side sessions: the cookie only carries an opaque session ID
+    app.add_middleware(
+        ServerSessionMiddleware,
+        backend=session_backend,
+        max_age=settings.SESSION_MAX_AGE,
+        excluded_paths=session_excluded_paths,
+    )
+
+# Forward-auth endpoint for reverse proxies, answered ahead of all other middleware
+app.add_middleware(ForwardAuthMiddleware, path="/auth/verify", session_backend=session_backend)
 
 # Global exception handler for better error messages
 @app.exception_handler(Exception)
@@ -91,6 +123,50 @@ async def startup_event():
     logger.info(f"API URL configured as: {settings.API_URL}")
     # Don't log secrets or credentials
 
+    # Compile authorization policies before serving requests
+    policy_engine.compile()
+
+    # One pooled client for every call to Auth0, so round trips reuse warm connections
+    await auth0_http.start()
+
+    # Warm the JWKS cache so token verification never waits on Auth0
+    await jwks_store.start()
+    token_verifier.start(jwks_store.key_data)
+
+    # Keep the Management API token fresh in the background once it has been fetched
+    management_token_cache.start()
+
+    # Load the connections catalog so GitHub logins don't call the Management API
+    await connection_catalog.start()
+
+    # Reclaim expired cache and session entries in the background
+    expiry_sweeper.register("token_cache", token_cache.sweep)
+    expiry_sweeper.register("rejected_token_cache", rejected_token_cache.sweep)
+    expiry_sweeper.register("userinfo_cache", userinfo_cache.sweep)
+    expiry_sweeper.register("session_cache", decoded_session_cache.sweep)
+    if isinstance(session_backend, SQLiteSessionBackend):
+        expiry_sweeper.register(
+            "session_store", session_backend.sweep, interval=settings.EXPIRY_PURGE_INTERVAL, blocking=True
+        )
+    elif session_backend is not None:
+        expiry_sweeper.register("session_store", session_backend.sweep)
+    expiry_sweeper.register(
+        "shared_cache", shared_cache.purge_expired, interval=settings.EXPIRY_PURGE_INTERVAL, blocking=True
+    )
+    expiry_sweeper.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await expiry_sweeper.stop()
+    await connection_catalog.stop()
+    await management_token_cache.stop()
+    token_verifier.stop()
+    await jwks_store.stop()
+    await auth0_http.stop()
+    if session_backend is not None:
+        await session_backend.close()
+    shared_cache.close()
+
 if __name__ == "__main__":
     logger.info(f"Starting server on 0.0.0.0:{8000}")
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=settings.DEBUG)
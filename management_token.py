@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+from config import settings
+from http_client import auth0_http
+from shared_cache import SharedCache, shared_cache
+
+# Set up logging
+logger = logging.getLogger("management_token")
+
+
+class ManagementTokenCache:
+    """
+    Cache of the Auth0 Management API access token.
+
+    The token from the client_credentials grant is kept until `refresh_margin`
+    seconds (at most half its lifetime) before it expires and is refreshed in
+    the background ahead of that, so callers almost never wait on Auth0.
+    Concurrent refreshes share one request. With a shared cache, workers publish the token there and check it
+    before requesting their own, so a fleet of workers normally makes one grant
+    per token lifetime instead of one per worker. If a refresh fails, the
+    current token keeps being served until it actually expires.
+    """
+
+    def __init__(
+        self,
+        domain: str,
+        client_id: str,
+        client_secret: str,
+        refresh_margin: float,
+        retry_interval: float,
+        cache: Optional[SharedCache] = None,
+    ):
+        self.token_url = f"https://{domain}/oauth/token"
+        self.audience = f"https://{domain}/api/v2/"
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.refresh_margin = refresh_margin
+        self.retry_interval = retry_interval
+        self.cache = cache
+        self._cache_key = f"management-token:{client_id}"
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh_at = 0.0
+        self._inflight: Optional[asyncio.Task] = None
+        self._refresher: Optional[asyncio.Task] = None
+        self._obtained = asyncio.Event()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "shared_hits": 0, "fetches": 0, "fetch_errors": 0}
+
+    def _remaining(self) -> float:
+        return self._expires_at - time.time()
+
+    async def get(self) -> str:
+        """Return a valid token, fetching one only if none is cached or it is about to expire."""
+        now = time.time()
+        if self._token and now < self._refresh_at:
+            self.stats["hits"] += 1
+            return self._token
+        if self._token and now < self._expires_at:
+            # Inside the refresh margin but still valid: serve it and refresh in the background
+            self.stats["hits"] += 1
+            self._start_fetch()
+            return self._token
+
+        self.stats["misses"] += 1
+        await self.refresh()
+        return self._token
+
+    async def refresh(self) -> None:
+        """Obtain a new token, joining a refresh that is already in flight."""
+        if self._inflight is not None and not self._inflight.done():
+            self.stats["coalesced"] += 1
+        await asyncio.shield(self._start_fetch())
+
+    def _start_fetch(self) -> asyncio.Task:
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.create_task(self._fetch())
+        return self._inflight
+
+    def _store(self, token: str, expires_at: float, refresh_at: float) -> None:
+        self._token = token
+        self._expires_at = expires_at
+        self._refresh_at = refresh_at
+        self._obtained.set()
+
+    async def _fetch(self) -> None:
+        if self.cache is not None:
+            # Another worker may already have refreshed it
+            entry = await asyncio.to_thread(self.cache.get, self._cache_key)
+            if entry and entry["expires_at"] > self._expires_at and time.time() < entry["refresh_at"]:
+                self.stats["shared_hits"] += 1
+                self._store(entry["access_token"], entry["expires_at"], entry["refresh_at"])
+                return
+
+        self.stats["fetches"] += 1
+        try:
+            async with auth0_http.route("token") as client:
+                response = await client.post(
+                    self.token_url,
+                    json={
+                        "client_id": self.client_id,
+                        "client_secret": self.client_secret,
+                        "audience": self.audience,
+                        "grant_type": "client_credentials"
+                    }
+                )
+                response.raise_for_status()
+                data = response.json()
+        except Exception as e:
+            self.stats["fetch_errors"] += 1
+            if self._token and self._remaining() > 0:
+                logger.warning(f"Refreshing the management API token failed, using the current one: {e}")
+                return
+            raise
+
+        lifetime = data.get("expires_in", 86400)
+        expires_at = time.time() + lifetime
+        self._store(data["access_token"], expires_at, expires_at - min(self.refresh_margin, lifetime / 2))
+        if self.cache is not None:
+            entry = {"access_token": self._token, "expires_at": expires_at, "refresh_at": self._refresh_at}
+            await asyncio.to_thread(self.cache.set, self._cache_key, entry, lifetime)
+        logger.info(f"Obtained a management API token valid for {lifetime}s")
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            if self._token is None:
+                # Nothing to keep fresh until the first token is requested
+                await self._obtained.wait()
+            # Refresh a little ahead of the refresh point, with jitter so workers don't fetch in lockstep
+            delay = self._refresh_at - time.time() - random.uniform(0, (self._expires_at - self._refresh_at) / 2)
+            await asyncio.sleep(max(delay, 0))
+            expires_at = self._expires_at
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Background management API token refresh failed: {e}")
+            if self._expires_at == expires_at:
+                # The refresh failed; try again later while the current token lasts
+                await asyncio.sleep(self.retry_interval)
+
+    def start(self) -> None:
+        """Start the background refresh task; the first token is fetched on first use."""
+        if self._refresher is None or self._refresher.done():
+            self._obtained = asyncio.Event()
+            if self._token is not None:
+                self._obtained.set()
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def stop(self) -> None:
+        for task in (self._refresher, self._inflight):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, Exception):
+                    pass
+        self._refresher = None
+        self._inflight = None
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "cached": self._token is not None,
+            "expires_in": max(int(self._remaining()), 0) if self._token else 0,
+            "shared": self.cache is not None,
+        }
+
+
+management_token_cache = ManagementTokenCache(
+    settings.AUTH0_DOMAIN,
+    settings.AUTH0_CLIENT_ID,
+    settings.AUTH0_CLIENT_SECRET,
+    refresh_margin=settings.MANAGEMENT_TOKEN_REFRESH_MARGIN,
+    retry_interval=settings.MANAGEMENT_TOKEN_RETRY_INTERVAL,
+    cache=shared_cache if settings.MANAGEMENT_TOKEN_SHARED else None,
+)
@@ -1,11 +1,12 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 
 
 class TokenData(BaseModel):
     """Data extracted from a JWT token"""
     sub: str
     auth_type: str = "regular"  # Can be "regular" or "google"
+    permissions: List[str] = []
 
 
 class User(BaseModel):
@@ -15,6 +16,8 @@ class User(BaseModel):
     name: Optional[str] = None
     picture: Optional[str] = None
     auth_type: str = "regular"  # Can be "regular" or "google"
+    permissions: List[str] = []
+    email_verified: Optional[bool] = None
 
 
 class Token(BaseModel):
@@ -41,4 +44,22 @@ class UserProfile(BaseModel):
     given_name: Optional[str] = None
     family_name: Optional[str] = None
     locale: Optional[str] = None
-    verified: Optional[bool] = None 
\ No newline at end of file
+    verified: Optional[bool] = None
+
+
+class IntrospectBatchRequest(BaseModel):
+    """Request model for batch token introspection"""
+    tokens: List[str] = Field(..., min_length=1)
+
+
+class TokenIntrospection(BaseModel):
+    """Validity and claims of a single introspected token"""
+    active: bool
+    sub: Optional[str] = None
+    claims: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+
+class IntrospectBatchResponse(BaseModel):
+    """Response model for batch token introspection, in request order"""
+    results: List[TokenIntrospection]
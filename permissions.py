@@ -0,0 +1,59 @@
+import threading
+from typing import Dict, Iterable, List
+
+
+class PermissionRegistry:
+    """
+    Interns permission strings (e.g. "read:admin") into bit positions.
+
+    Bit positions are assigned per process, in first-seen order, so bitsets must
+    never be persisted or shared between workers; store permission strings instead.
+    """
+
+    def __init__(self):
+        self._bits: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._bits)
+
+    def intern(self, permission: str) -> int:
+        """Return the bit for a permission, assigning a new one if it is unseen."""
+        bit = self._bits.get(permission)
+        if bit is None:
+            with self._lock:
+                bit = self._bits.get(permission)
+                if bit is None:
+                    bit = 1 << len(self._bits)
+                    self._bits[permission] = bit
+        return bit
+
+    def mask(self, permissions: Iterable[str]) -> int:
+        """Encode permission strings into a single integer bitset."""
+        bits = 0
+        for permission in permissions:
+            bits |= self.intern(permission)
+        return bits
+
+    def names(self, bits: int) -> List[str]:
+        """Decode a bitset back into permission strings, e.g. for error messages."""
+        return [permission for permission, bit in self._bits.items() if bits & bit]
+
+
+permission_registry = PermissionRegistry()
+
+
+class VerifiedClaims(dict):
+    """
+    Verified access token claims, with the permissions claim decoded into a bitset.
+
+    Instances are what the verified-token cache holds, so the bitset is computed
+    once per token and every authorization check is a single bitwise AND.
+    """
+
+    __slots__ = ("permission_bits",)
+
+    def __init__(self, claims: dict):
+        super().__init__(claims)
+        permissions = claims.get("permissions") or []
+        self.permission_bits = permission_registry.mask(permissions)
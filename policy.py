@@ -0,0 +1,232 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple, Optional
+
+from fastapi import Depends, HTTPException, status
+
+from auth import verify_user
+from config import settings
+from models import User
+from permissions import permission_registry
+
+# Set up logging
+logger = logging.getLogger("policy")
+
+
+class Subject(NamedTuple):
+    """The caller a policy is evaluated for."""
+    user: User
+    permission_bits: int
+
+
+# A compiled rule: (subject, resource) -> allowed
+Rule = Callable[[Subject, Optional[str]], bool]
+
+
+class Condition:
+    """
+    A node of the policy DSL. Conditions combine with &, | and ~ and are
+    compiled into plain closures once, at startup.
+    """
+
+    def __and__(self, other: "Condition") -> "Condition":
+        return AllOf(self, other)
+
+    def __or__(self, other: "Condition") -> "Condition":
+        return AnyOf(self, other)
+
+    def __invert__(self) -> "Condition":
+        return Not(self)
+
+    def compile(self) -> Rule:
+        raise NotImplementedError
+
+
+class AllOf(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def compile(self) -> Rule:
+        rules = tuple(condition.compile() for condition in self.conditions)
+        return lambda subject, resource: all(rule(subject, resource) for rule in rules)
+
+
+class AnyOf(Condition):
+    def __init__(self, *conditions: Condition):
+        self.conditions = conditions
+
+    def compile(self) -> Rule:
+        rules = tuple(condition.compile() for condition in self.conditions)
+        return lambda subject, resource: any(rule(subject, resource) for rule in rules)
+
+
+class Not(Condition):
+    def __init__(self, condition: Condition):
+        self.condition = condition
+
+    def compile(self) -> Rule:
+        rule = self.condition.compile()
+        return lambda subject, resource: not rule(subject, resource)
+
+
+class Predicate(Condition):
+    """A leaf condition; `build` is called at compile time and returns the rule."""
+
+    def __init__(self, build: Callable[[], Rule]):
+        self.build = build
+
+    def compile(self) -> Rule:
+        return self.build()
+
+
+def always() -> Condition:
+    return Predicate(lambda: lambda subject, resource: True)
+
+
+def has_permission(*permissions: str) -> Condition:
+    """The subject holds all of the given permissions."""
+    def build() -> Rule:
+        required = permission_registry.mask(permissions)
+        return lambda subject, resource: subject.permission_bits & required == required
+    return Predicate(build)
+
+
+def auth_type_is(*auth_types: str) -> Condition:
+    """The subject logged in through one of the given connections (google, github, auth0)."""
+    def build() -> Rule:
+        allowed = frozenset(auth_types)
+        return lambda subject, resource: subject.user.auth_type in allowed
+    return Predicate(build)
+
+
+def email_verified() -> Condition:
+    """The subject's email address has been verified."""
+    return Predicate(lambda: lambda subject, resource: subject.user.email_verified is True)
+
+
+def resource_owner_in(*owners: str) -> Condition:
+    """The resource is an "owner/name" path whose owner is one of the given owners."""
+    def build() -> Rule:
+        allowed = frozenset(owner.lower() for owner in owners)
+        def rule(subject: Subject, resource: Optional[str]) -> bool:
+            return resource is not None and resource.split("/", 1)[0].lower() in allowed
+        return rule
+    return Predicate(build)
+
+
+def github_push_policy(allowed_orgs: str) -> Condition:
+    """GitHub logins only, pushing to repos under the comma-separated orgs (any repo if empty)."""
+    orgs = [org.strip() for org in allowed_orgs.split(",") if org.strip()]
+    return auth_type_is("github") & (resource_owner_in(*orgs) if orgs else always())
+
+
+class PolicyEngine:
+    """
+    Named authorization policies, compiled into closures at startup.
+
+    Decisions are cached per (subject, policy, resource) for `ttl` seconds, so
+    repeat checks are a dictionary lookup however many rules a policy has.
+    """
+
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._definitions: Dict[str, Condition] = {}
+        self._rules: Dict[str, Rule] = {}
+        self._decisions: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self.stats = {
+            "decisions": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "denied": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0,
+        }
+
+    def define(self, name: str, condition: Condition) -> None:
+        self._definitions[name] = condition
+        self._rules.pop(name, None)
+
+    def compile(self) -> None:
+        """Compile every defined policy into a closure and drop cached decisions."""
+        self._rules = {name: condition.compile() for name, condition in self._definitions.items()}
+        self._decisions.clear()
+        logger.info(f"Compiled {len(self._rules)} authorization policies")
+
+    def evaluate(self, name: str, user: User, resource: Optional[str] = None) -> bool:
+        started = time.perf_counter()
+        # Key on the attributes rules can see, so a changed login or token isn't served a stale decision
+        key = (user.id, user.email_verified, tuple(user.permissions), name, resource)
+        now = time.monotonic()
+
+        cached = self._decisions.get(key)
+        if cached is not None and cached[1] > now:
+            self._decisions.move_to_end(key)
+            self.stats["cache_hits"] += 1
+            allowed = cached[0]
+        else:
+            self.stats["cache_misses"] += 1
+            rule = self._rules.get(name)
+            if rule is None:
+                if name not in self._definitions:
+                    raise KeyError(f"Unknown policy {name!r}")
+                rule = self._rules[name] = self._definitions[name].compile()
+            subject = Subject(user, permission_registry.mask(user.permissions))
+            allowed = rule(subject, resource)
+            self._decisions[key] = (allowed, now + self.ttl)
+            self._decisions.move_to_end(key)
+            while len(self._decisions) > self.max_entries:
+                self._decisions.popitem(last=False)
+
+        elapsed = time.perf_counter() - started
+        self.stats["decisions"] += 1
+        self.stats["latency_total"] += elapsed
+        self.stats["latency_max"] = max(self.stats["latency_max"], elapsed)
+        if not allowed:
+            self.stats["denied"] += 1
+        return allowed
+
+    def authorize(self, name: str, user: User, resource: Optional[str] = None) -> None:
+        """Raise a 403 unless the policy allows the user access to the resource."""
+        if not self.evaluate(name, user, resource):
+            logger.info(f"Policy {name} denied {user.id} access to {resource or 'route'}")
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail=f"Access denied by policy {name}",
+            )
+
+    def get_stats(self) -> dict:
+        decisions = self.stats["decisions"]
+        return {
+            **self.stats,
+            "policies": sorted(self._definitions),
+            "cached_decisions": len(self._decisions),
+            "latency_avg": self.stats["latency_total"] / decisions if decisions else 0.0,
+        }
+
+
+def enforce(name: str) -> Callable:
+    """
+    Build a dependency that authenticates the caller and applies a named policy,
+    e.g. Depends(enforce("admin")).
+    """
+    async def check_policy(current_user: User = Depends(verify_user)) -> User:
+        policy_engine.authorize(name, current_user)
+        return current_user
+
+    return check_policy
+
+
+policy_engine = PolicyEngine(
+    ttl=settings.POLICY_CACHE_TTL,
+    max_entries=settings.POLICY_CACHE_MAX_ENTRIES,
+)
+
+# Application policies
+policy_engine.define(
+    "admin",
+    has_permission("read:admin") & auth_type_is("google") & email_verified(),
+)
+
+policy_engine.define("github:push", github_push_policy(settings.GITHUB_ALLOWED_ORGS))
@@ -2,15 +2,18 @@ from fastapi import APIRouter, Depends, Request, HTTPException, status
 from typing import List, Dict, Any
 
 from models import User
-from auth import verify_session
+from auth import verify_user
+from policy import enforce
+from session_index import session_index
 from config import settings
 
 router = APIRouter(tags=["Protected"], prefix="/protected")
 
 @router.get("/data")
-async def get_protected_data(current_user: User = Depends(verify_session)):
+async def get_protected_data(current_user: User = Depends(verify_user)):
     """
     A protected endpoint that requires authentication.
+    Accepts either a session or an Auth0 access token as a bearer token.
     Returns some data along with the user's ID.
     """
     return {
@@ -25,14 +28,30 @@ async def get_protected_data(current_user: User = Depends(verify_session)):
     }
 
 @router.get("/admin-only")
-async def admin_only(current_user: User = Depends(verify_session)):
+async def admin_only(current_user: User = Depends(enforce("admin"))):
     """
-    An endpoint that could check for admin permissions.
-    In a real application, you would check if the user has admin permissions.
+    An endpoint guarded by the "admin" policy: the read:admin permission,
+    a Google login and a verified email address.
     """
-    # You could check permissions here, e.g., by examining roles assigned in Auth0
     return {
         "message": "You have access to admin area",
         "user_id": current_user.id,
         "user_name": current_user.name
-    } 
\ No newline at end of file
+    } 
+
+@router.get("/admin/users/{user_id}/sessions")
+async def list_user_sessions(user_id: str, current_user: User = Depends(enforce("admin"))):
+    """
+    List the sessions a user has logged in with since their last revocation.
+    """
+    sessions = await session_index.list_sessions(user_id)
+    return {"user_id": user_id, "sessions": sessions, "count": len(sessions)}
+
+@router.delete("/admin/users/{user_id}/sessions")
+async def revoke_user_sessions(user_id: str, current_user: User = Depends(enforce("admin"))):
+    """
+    Log a user out everywhere: every session they hold stops working,
+    in every worker, within SESSION_REVOCATION_CHECK_INTERVAL seconds.
+    """
+    revoked = await session_index.revoke_user(user_id)
+    return {"user_id": user_id, "revoked_sessions": revoked}
@@ -0,0 +1,389 @@
+import base64
+import binascii
+import json
+import re
+import struct
+import time
+import zlib
+from typing import Any, FrozenSet, Optional, Tuple
+
+import itsdangerous
+from itsdangerous.exc import BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from sessions import DecodedSessionCache, LazySession
+
+# Format version 1: version byte, flags byte, then the (optionally zlib-compressed)
+# binary payload. Legacy Starlette cookies (base64 JSON) have no version byte and
+# start with "{", so both formats can be told apart after unsigning.
+VERSION = 1
+FLAG_COMPRESSED = 0x01
+FLAG_SLIMMED = 0x02
+
+# Value type tags
+T_NONE, T_TRUE, T_FALSE, T_INT, T_FLOAT, T_STR, T_LIST, T_DICT, T_B64 = range(9)
+
+# Short tags for common session keys. Append-only: reordering or removing an
+# entry changes the meaning of existing cookies and needs a new VERSION.
+KEY_TABLE = (
+    "user", "token", "id", "name", "email", "email_verified", "picture",
+    "permissions", "github_token", "access_token", "id_token", "refresh_token",
+    "token_type", "expires_in", "expires_at", "scope", "userinfo",
+    "sub", "nickname", "updated_at", "iss", "aud", "iat", "exp", "sid", "nonce",
+)
+KEY_TAGS = {key: tag for tag, key in enumerate(KEY_TABLE)}
+KEY_LITERAL = 0xFF
+
+# Base64url text (JWTs, opaque tokens) is stored as raw bytes, a quarter smaller
+_B64_TEXT = re.compile(r"^[A-Za-z0-9_\-]+(\.[A-Za-z0-9_\-]+)*$")
+_B64_MIN_LENGTH = 32
+
+
+def _write_varint(out: bytearray, value: int) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data: bytes, pos: int):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _b64_segments(value: str) -> Optional[list]:
+    """Decode base64url text segment by segment, if it round-trips exactly."""
+    if len(value) < _B64_MIN_LENGTH or not _B64_TEXT.match(value):
+        return None
+    segments = []
+    for segment in value.split("."):
+        if len(segment) % 4 == 1:
+            # No base64 encoding has this length; stored as plain text
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+        except (binascii.Error, ValueError):
+            return None
+        if base64.urlsafe_b64encode(raw).rstrip(b"=").decode() != segment:
+            return None
+        segments.append(raw)
+    return segments
+
+
+def _encode(out: bytearray, value: Any) -> None:
+    if value is None:
+        out.append(T_NONE)
+    elif value is True:
+        out.append(T_TRUE)
+    elif value is False:
+        out.append(T_FALSE)
+    elif isinstance(value, int):
+        out.append(T_INT)
+        # Zigzag, so small negative numbers stay short
+        _write_varint(out, value << 1 if value >= 0 else ((-value) << 1) - 1)
+    elif isinstance(value, float):
+        out.append(T_FLOAT)
+        out += struct.pack(">d", value)
+    elif isinstance(value, str):
+        segments = _b64_segments(value)
+        if segments is not None:
+            out.append(T_B64)
+            _write_varint(out, len(segments))
+            for raw in segments:
+                _write_varint(out, len(raw))
+                out += raw
+        else:
+            raw = value.encode("utf-8")
+            out.append(T_STR)
+            _write_varint(out, len(raw))
+            out += raw
+    elif isinstance(value, (list, tuple)):
+        out.append(T_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(out, item)
+    elif isinstance(value, dict):
+        out.append(T_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            tag = KEY_TAGS.get(key)
+            if tag is not None:
+                out.append(tag)
+            else:
+                raw = str(key).encode("utf-8")
+                out.append(KEY_LITERAL)
+                _write_varint(out, len(raw))
+                out += raw
+            _encode(out, item)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} in a session")
+
+
+def _decode(data: bytes, pos: int):
+    kind = data[pos]
+    pos += 1
+    if kind == T_NONE:
+        return None, pos
+    if kind == T_TRUE:
+        return True, pos
+    if kind == T_FALSE:
+        return False, pos
+    if kind == T_INT:
+        zigzag, pos = _read_varint(data, pos)
+        return (zigzag >> 1) ^ -(zigzag & 1), pos
+    if kind == T_FLOAT:
+        return struct.unpack_from(">d", data, pos)[0], pos + 8
+    if kind == T_STR:
+        length, pos = _read_varint(data, pos)
+        return data[pos:pos + length].decode("utf-8"), pos + length
+    if kind == T_B64:
+        count, pos = _read_varint(data, pos)
+        segments = []
+        for _ in range(count):
+            length, pos = _read_varint(data, pos)
+            segments.append(base64.urlsafe_b64encode(data[pos:pos + length]).rstrip(b"=").decode())
+            pos += length
+        return ".".join(segments), pos
+    if kind == T_LIST:
+        count, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos)
+            items.append(item)
+        return items, pos
+    if kind == T_DICT:
+        count, pos = _read_varint(data, pos)
+        result = {}
+        for _ in range(count):
+            tag = data[pos]
+            pos += 1
+            if tag == KEY_LITERAL:
+                length, pos = _read_varint(data, pos)
+                key = data[pos:pos + length].decode("utf-8")
+                pos += length
+            else:
+                key = KEY_TABLE[tag]
+            result[key], pos = _decode(data, pos)
+        return result, pos
+    raise ValueError(f"Unknown session value tag {kind}")
+
+
+def _slim(session: dict) -> dict:
+    """Drop token fields that can be re-derived from the rest of the session."""
+    token = session.get("token")
+    if not isinstance(token, dict):
+        return session
+    token = dict(token)
+    if "id_token" in token:
+        token.pop("userinfo", None)
+    if "expires_at" in token:
+        token.pop("expires_in", None)
+    if token.get("token_type") == "Bearer":
+        del token["token_type"]
+    return {**session, "token": token}
+
+
+def _restore(session: dict) -> dict:
+    """Re-derive the token fields dropped by _slim."""
+    token = session.get("token")
+    if not isinstance(token, dict):
+        return session
+    token.setdefault("token_type", "Bearer")
+    if "expires_at" in token and "expires_in" not in token:
+        token["expires_in"] = max(int(token["expires_at"] - time.time()), 0)
+    if "id_token" in token and "userinfo" not in token:
+        try:
+            # The ID token was verified at login; this only re-reads its claims
+            payload = token["id_token"].split(".")[1]
+            token["userinfo"] = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            pass
+    return session
+
+
+class SessionCodec:
+    """
+    Compact, signed cookie encoding for stateless sessions.
+
+    Sessions are stored as tagged binary with short key tags, base64url tokens
+    kept as raw bytes, re-derivable token fields stripped, and zlib compression
+    above `compress_threshold` bytes. Legacy Starlette (JSON) cookies still decode.
+    """
+
+    def __init__(self, secret_key: str, compress_threshold: int = 256):
+        self.signer = itsdangerous.TimestampSigner(str(secret_key))
+        self.compress_threshold = compress_threshold
+
+    def dumps(self, session: dict) -> bytes:
+        out = bytearray()
+        _encode(out, _slim(session))
+        flags = FLAG_SLIMMED
+        payload = bytes(out)
+        if len(payload) > self.compress_threshold:
+            compressed = zlib.compress(payload, 6)
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= FLAG_COMPRESSED
+        return bytes((VERSION, flags)) + payload
+
+    def loads(self, data: bytes) -> dict:
+        if data[:1] == b"{":
+            # Legacy Starlette session cookie
+            return json.loads(data)
+        if data[0] != VERSION:
+            raise ValueError(f"Unsupported session format version {data[0]}")
+        flags = data[1]
+        payload = data[2:]
+        if flags & FLAG_COMPRESSED:
+            payload = zlib.decompress(payload)
+        session, _ = _decode(payload, 0)
+        if flags & FLAG_SLIMMED:
+            session = _restore(session)
+        return session
+
+    def encode(self, session: dict) -> str:
+        """Encode and sign a session into a cookie value."""
+        data = base64.urlsafe_b64encode(self.dumps(session)).rstrip(b"=")
+        return self.signer.sign(data).decode("utf-8")
+
+    def decode(self, value: str, max_age: Optional[int] = None) -> Optional[dict]:
+        """Verify and decode a cookie value; None if it is invalid or expired."""
+        decoded = self.decode_with_timestamp(value, max_age)
+        return decoded[0] if decoded is not None else None
+
+    def decode_with_timestamp(self, value: str, max_age: Optional[int] = None) -> Optional[Tuple[dict, int]]:
+        """Like decode, but also returns the time the cookie was signed."""
+        try:
+            data, timestamp = self.signer.unsign(value.encode("utf-8"), max_age=max_age, return_timestamp=True)
+            session = self.loads(base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4)))
+        except (BadSignature, ValueError, IndexError, zlib.error):
+            return None
+        return session, int(timestamp.timestamp())
+
+
+class JSONSessionCodec(SessionCodec):
+    """
+    The encoding Starlette's SessionMiddleware uses (signed base64 JSON).
+    Decodes compact cookies too, so deployments can switch back and forth.
+    """
+
+    def encode(self, session: dict) -> str:
+        data = base64.b64encode(json.dumps(session).encode("utf-8"))
+        return self.signer.sign(data).decode("utf-8")
+
+
+class CookieSessionMiddleware:
+    """
+    Stateless session middleware with a pluggable codec, in place of Starlette's
+    SessionMiddleware. Decoded sessions are kept in a per-worker cache keyed by
+    a digest of the cookie, so repeat requests skip signature checks and decoding.
+
+    The cookie is only verified and decoded when a handler or dependency first
+    touches request.session, and requests to `excluded_paths` (health checks,
+    docs) get no session at all, so they never do HMAC work or send Set-Cookie.
+
+    The cookie is re-signed only when the session changed, or for sliding expiry
+    once it is older than `refresh_after` seconds (half of max_age by default).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        codec: SessionCodec,
+        cache: Optional[DecodedSessionCache] = None,
+        session_cookie: str = "session",
+        max_age: Optional[int] = 14 * 24 * 60 * 60,  # 14 days, in seconds
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+        excluded_paths: FrozenSet[str] = frozenset(),
+        refresh_after: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.codec = codec
+        self.excluded_paths = excluded_paths
+        self.cache = cache
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.refresh_after = refresh_after if refresh_after is not None else (max_age // 2 if max_age else None)
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:  # Secure flag can be used with HTTPS only
+            self.security_flags += "; secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket") or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        cookie = connection.cookies.get(self.session_cookie)
+        signed_at = None
+
+        def load() -> Optional[dict]:
+            nonlocal signed_at
+            cached = self.cache.get(cookie) if self.cache is not None else None
+            if cached is not None:
+                scope["cached_session"] = cached
+                signed_at = cached.signed_at
+                return cached.copy_data()
+            decoded = self.codec.decode_with_timestamp(cookie, max_age=self.max_age)
+            if decoded is None:
+                return None
+            data, signed_at = decoded
+            if self.cache is None:
+                return data
+            expires_at = signed_at + self.max_age if self.max_age else None
+            scope["cached_session"] = self.cache.put(cookie, data, expires_at, signed_at)
+            return scope["cached_session"].copy_data()
+
+        scope["session"] = session = LazySession(load if cookie else None)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and session.loaded:
+                if session:
+                    dirty = session.modified or session.cleared
+                    if dirty and self.cache is not None and cookie:
+                        self.cache.invalidate(cookie)
+                    # Unchanged sessions are only re-signed once past the sliding-expiry half-life
+                    if dirty or self._needs_refresh(signed_at):
+                        self._set_cookie(
+                            message,
+                            self.codec.encode(session.data),
+                            f"Max-Age={self.max_age}; " if self.max_age else "",
+                        )
+                elif not session.initial_empty:
+                    # The session has been cleared.
+                    if self.cache is not None:
+                        self.cache.invalidate(cookie)
+                    self._set_cookie(message, "null", "expires=Thu, 01 Jan 1970 00:00:00 GMT; ")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _needs_refresh(self, signed_at: Optional[float]) -> bool:
+        if signed_at is None:
+            return True
+        return self.refresh_after is not None and time.time() - signed_at >= self.refresh_after
+
+    def _set_cookie(self, message: Message, value: str, expiry: str) -> None:
+        headers = MutableHeaders(scope=message)
+        headers.append(
+            "Set-Cookie",
+            f"{self.session_cookie}={value}; path={self.path}; {expiry}{self.security_flags}",
+        )
+
+
+if settings.SESSION_BACKEND == "compact":
+    session_codec = SessionCodec(settings.SECRET_KEY, compress_threshold=settings.SESSION_COMPRESS_THRESHOLD)
+else:
+    session_codec = JSONSessionCodec(settings.SECRET_KEY)
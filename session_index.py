@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import secrets
+import sqlite3
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from fastapi import HTTPException, status
+
+from config import settings
+from shared_cache import SharedCache, shared_cache
+
+# Set up logging
+logger = logging.getLogger("session_index")
+
+
+class SessionIndex:
+    """
+    Index of live sessions per user, and per-user revocation.
+
+    Each login gets an index ID (`sid`) and the user's current generation, both
+    stored in the session. Revoking a user bumps their generation in the shared
+    cache, which invalidates every session they hold in every mode and worker.
+    Workers keep generations in a local LRU for up to `check_interval` seconds,
+    so the hot-path check is a dictionary lookup and revocations reach other
+    workers within that interval.
+
+    The index of sessions is what lists a user's sessions; revocation itself
+    only relies on the generation, so sessions missing from the index (e.g.
+    evicted) are revoked all the same.
+
+    If the shared cache can't be read, session checks fail open: they use the
+    last generation this worker saw (0 if none) and try again after
+    `check_interval`, so a disk problem doesn't turn every session request
+    into an error. Logins still succeed without being indexed. Listing and
+    revoking sessions answer 503.
+    """
+
+    def __init__(
+        self,
+        cache: SharedCache,
+        check_interval: float,
+        max_sessions_per_user: int,
+        index_ttl: int,
+        generation_ttl: int,
+        max_local_entries: int = 10000,
+    ):
+        self.cache = cache
+        self.check_interval = check_interval
+        self.max_sessions_per_user = max_sessions_per_user
+        self.index_ttl = index_ttl
+        self.generation_ttl = generation_ttl
+        self.max_local_entries = max_local_entries
+        self._generations: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"checks": 0, "refreshes": 0, "revoked_rejections": 0, "registered": 0, "revocations": 0, "cache_errors": 0}
+
+    @staticmethod
+    def _index_key(user_id: str) -> str:
+        return f"session-index:{user_id}"
+
+    @staticmethod
+    def _generation_key(user_id: str) -> str:
+        return f"session-gen:{user_id}"
+
+    def _remember(self, user_id: str, generation: int) -> None:
+        self._generations[user_id] = (generation, time.monotonic() + self.check_interval)
+        self._generations.move_to_end(user_id)
+        while len(self._generations) > self.max_local_entries:
+            self._generations.popitem(last=False)
+
+    async def generation(self, user_id: str) -> int:
+        """The user's current generation, from the local cache while it is fresh."""
+        entry = self._generations.get(user_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        self.stats["refreshes"] += 1
+        try:
+            generation = await asyncio.to_thread(self.cache.get, self._generation_key(user_id)) or 0
+        except sqlite3.Error as e:
+            self.stats["cache_errors"] += 1
+            generation = entry[0] if entry is not None else 0
+            logger.error(f"Could not read the revocation generation of {user_id}, using {generation}: {e}")
+        self._remember(user_id, generation)
+        return generation
+
+    async def is_revoked(self, user_data: dict) -> bool:
+        """Check a session's user entry against the user's current generation."""
+        self.stats["checks"] += 1
+        user_id = user_data.get("id")
+        if not user_id:
+            return False
+        if user_data.get("gen", 0) < await self.generation(user_id):
+            self.stats["revoked_rejections"] += 1
+            return True
+        return False
+
+    async def register(self, user_id: str, info: dict) -> dict:
+        """
+        Record a new login and return the {"sid", "gen"} fields to keep in its session.
+        Concurrent logins by one user in different workers may drop each other
+        from the index; they are still covered by revocation.
+        """
+        sid = secrets.token_urlsafe(16)
+        # Read through, so a fresh login isn't tagged with a stale local generation
+        self._generations.pop(user_id, None)
+        generation = await self.generation(user_id)
+
+        def update() -> None:
+            sessions = self.cache.get(self._index_key(user_id)) or {}
+            sessions[sid] = {**info, "created_at": time.time()}
+            if len(sessions) > self.max_sessions_per_user:
+                oldest = sorted(sessions, key=lambda key: sessions[key]["created_at"])
+                for key in oldest[:len(sessions) - self.max_sessions_per_user]:
+                    del sessions[key]
+            self.cache.set(self._index_key(user_id), sessions, self.index_ttl)
+
+        try:
+            await asyncio.to_thread(update)
+        except sqlite3.Error as e:
+            self.stats["cache_errors"] += 1
+            logger.error(f"Could not index a new session of {user_id}: {e}")
+        self.stats["registered"] += 1
+        return {"sid": sid, "gen": generation}
+
+    async def unregister(self, user_id: str, sid: Optional[str]) -> None:
+        """Drop a session from the index, e.g. at logout."""
+        if not sid:
+            return
+
+        def update() -> None:
+            sessions = self.cache.get(self._index_key(user_id)) or {}
+            if sessions.pop(sid, None) is not None:
+                self.cache.set(self._index_key(user_id), sessions, self.index_ttl)
+
+        try:
+            await asyncio.to_thread(update)
+        except sqlite3.Error as e:
+            self.stats["cache_errors"] += 1
+            logger.error(f"Could not drop session {sid} of {user_id} from the index: {e}")
+
+    def _unavailable(self, e: sqlite3.Error) -> HTTPException:
+        self.stats["cache_errors"] += 1
+        logger.error(f"Session index unavailable: {e}")
+        return HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Session index unavailable",
+        )
+
+    async def list_sessions(self, user_id: str) -> List[dict]:
+        try:
+            sessions = await asyncio.to_thread(self.cache.get, self._index_key(user_id)) or {}
+        except sqlite3.Error as e:
+            raise self._unavailable(e)
+        return sorted(
+            ({"sid": sid, **info} for sid, info in sessions.items()),
+            key=lambda session: session["created_at"],
+        )
+
+    async def revoke_user(self, user_id: str) -> int:
+        """Invalidate every session of the user; returns how many were in the index."""
+        def revoke() -> tuple:
+            generation = (self.cache.get(self._generation_key(user_id)) or 0) + 1
+            self.cache.set(self._generation_key(user_id), generation, self.generation_ttl)
+            sessions = self.cache.get(self._index_key(user_id)) or {}
+            self.cache.delete(self._index_key(user_id))
+            return generation, len(sessions)
+
+        try:
+            generation, revoked = await asyncio.to_thread(revoke)
+        except sqlite3.Error as e:
+            raise self._unavailable(e)
+        self._remember(user_id, generation)
+        self.stats["revocations"] += 1
+        logger.info(f"Revoked {revoked} indexed sessions of {user_id} (generation {generation})")
+        return revoked
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "cached_generations": len(self._generations)}
+
+
+session_index = SessionIndex(
+    cache=shared_cache,
+    check_interval=settings.SESSION_REVOCATION_CHECK_INTERVAL,
+    max_sessions_per_user=settings.SESSION_INDEX_MAX_PER_USER,
+    index_ttl=settings.SESSION_MAX_AGE,
+    generation_ttl=settings.SESSION_REVOCATION_TTL,
+)
@@ -0,0 +1,512 @@
+import asyncio
+import hashlib
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Iterator, MutableMapping
+from typing import Any, Callable, FrozenSet, Optional, Tuple
+
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+from shared_cache import SharedCache, shared_cache
+from timing_wheel import TimingWheel
+
+# Set up logging
+logger = logging.getLogger("sessions")
+
+
+class Session(dict):
+    """
+    Session data for one request; tracks whether it was modified or cleared.
+    Changes made inside nested values (e.g. session["user"]["name"] = ...) are
+    not seen, so reassign the top-level key after changing a nested value.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.modified = False
+        self.cleared = False
+
+    def __setitem__(self, key, value) -> None:
+        super().__setitem__(key, value)
+        self.modified = True
+
+    def __delitem__(self, key) -> None:
+        super().__delitem__(key)
+        self.modified = True
+
+    def pop(self, key, *default):
+        if key in self:
+            self.modified = True
+        return super().pop(key, *default)
+
+    def popitem(self):
+        self.modified = True
+        return super().popitem()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self.modified = True
+        return super().setdefault(key, default)
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self.modified = True
+
+    def clear(self) -> None:
+        super().clear()
+        self.modified = True
+        self.cleared = True
+
+
+class LazySession(MutableMapping):
+    """
+    Session that is only loaded the first time a handler or dependency reads or
+    writes it, so routes that never touch request.session skip decoding entirely.
+    `loader` returns the stored session data, or None if there is none; pass no
+    loader when the request carries no session cookie.
+    """
+
+    def __init__(self, loader: Optional[Callable[[], Optional[dict]]] = None):
+        self._loader = loader
+        self._session: Optional[Session] = None
+        self.initial_empty = True
+
+    @property
+    def loaded(self) -> bool:
+        return self._session is not None
+
+    @property
+    def modified(self) -> bool:
+        return self._session is not None and self._session.modified
+
+    @property
+    def cleared(self) -> bool:
+        return self._session is not None and self._session.cleared
+
+    @property
+    def data(self) -> Session:
+        return self._load()
+
+    def _load(self) -> Session:
+        if self._session is None:
+            data = self._loader() if self._loader is not None else None
+            self._session = Session(data or {})
+            self.initial_empty = not data
+        return self._session
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __setitem__(self, key, value) -> None:
+        self._load()[key] = value
+
+    def __delitem__(self, key) -> None:
+        del self._load()[key]
+
+    def __iter__(self) -> Iterator:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+    def __contains__(self, key) -> bool:
+        return key in self._load()
+
+    def __repr__(self) -> str:
+        return repr(self._session) if self._session is not None else "LazySession(<not loaded>)"
+
+    def get(self, key, default=None):
+        return self._load().get(key, default)
+
+    def pop(self, key, *default):
+        return self._load().pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        return self._load().setdefault(key, default)
+
+    def update(self, *args, **kwargs) -> None:
+        self._load().update(*args, **kwargs)
+
+    def clear(self) -> None:
+        # Clearing doesn't need the old contents; the cookie is expired or replaced either way
+        if self._session is None:
+            self._session = Session()
+            self.initial_empty = self._loader is None
+        self._session.clear()
+
+
+def parse_excluded_paths(value: str) -> FrozenSet[str]:
+    """Parse a comma-separated SESSION_EXCLUDED_PATHS value into a set of exact paths."""
+    return frozenset(path.strip() for path in value.split(",") if path.strip())
+
+
+def _copy(value: Any) -> Any:
+    """Copy the dicts and lists of a JSON-like value, sharing the scalars."""
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+class CachedSession:
+    """
+    A decoded session, when its cookie was signed and, once built, the User for
+    it along with the bitset of the user's permissions.
+    """
+
+    __slots__ = ("data", "user", "permission_bits", "expires_at", "signed_at")
+
+    def __init__(self, data: dict, expires_at: float, signed_at: Optional[float] = None):
+        self.data = data
+        self.user = None
+        self.permission_bits = 0
+        self.expires_at = expires_at
+        self.signed_at = signed_at
+
+    def copy_data(self) -> dict:
+        # Handlers get their own copy, so nested changes can't leak into the cache
+        return _copy(self.data)
+
+
+class DecodedSessionCache:
+    """
+    Per-worker LRU from a digest of the session cookie to the already validated
+    session, and the User built from it. Entries expire after `ttl` seconds or
+    when the cookie itself expires, whichever is sooner, and are reclaimed by
+    sweep() even if they are never looked up again.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, CachedSession]" = OrderedDict()
+        self._wheel = TimingWheel(time.time())
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _key(cookie: str) -> bytes:
+        return hashlib.sha256(cookie.encode("utf-8")).digest()
+
+    def get(self, cookie: str) -> Optional[CachedSession]:
+        key = self._key(cookie)
+        entry = self._entries.get(key)
+        if entry is None or time.time() >= entry.expires_at:
+            if entry is not None:
+                del self._entries[key]
+                self._wheel.cancel(key)
+                self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def put(
+        self,
+        cookie: str,
+        data: dict,
+        expires_at: Optional[float] = None,
+        signed_at: Optional[float] = None,
+    ) -> CachedSession:
+        ttl_expiry = time.time() + self.ttl
+        entry = CachedSession(data, min(ttl_expiry, expires_at) if expires_at else ttl_expiry, signed_at)
+        if self.max_entries > 0:
+            key = self._key(cookie)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._wheel.schedule(key, entry.expires_at)
+            while len(self._entries) > self.max_entries:
+                evicted, _ = self._entries.popitem(last=False)
+                self._wheel.cancel(evicted)
+                self.stats["evictions"] += 1
+        return entry
+
+    def invalidate(self, cookie: str) -> None:
+        key = self._key(cookie)
+        if self._entries.pop(key, None) is not None:
+            self._wheel.cancel(key)
+            self.stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._wheel = TimingWheel(time.time())
+
+    def sweep(self) -> int:
+        """Remove entries whose expiry has passed; returns how many were removed."""
+        expired = self._wheel.advance(time.time())
+        for key in expired:
+            del self._entries[key]
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "entries": len(self._entries), "max_entries": self.max_entries}
+
+
+decoded_session_cache = DecodedSessionCache(
+    max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+    ttl=settings.SESSION_CACHE_TTL,
+)
+
+
+class SessionBackend:
+    """
+    Server-side session storage. Implementations map an opaque session ID to the
+    session dict and must drop entries once they expire.
+    """
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        entry = await self.get_with_expiry(session_id)
+        return entry[0] if entry is not None else None
+
+    async def get_with_expiry(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        """Return the session data and the time it expires at, or None."""
+        raise NotImplementedError
+
+    async def set(self, session_id: str, data: dict, max_age: int) -> None:
+        raise NotImplementedError
+
+    async def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+    def sweep(self) -> int:
+        """Reclaim expired sessions; returns how many. Stores that expire entries themselves return 0."""
+        return 0
+
+
+class MemorySessionBackend(SessionBackend):
+    """Per-process LRU session store. Sessions are lost on restart and not shared between workers."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._wheel = TimingWheel(time.time())
+
+    async def get_with_expiry(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        data, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[session_id]
+            self._wheel.cancel(session_id)
+            return None
+        self._entries.move_to_end(session_id)
+        return dict(data), expires_at
+
+    async def set(self, session_id: str, data: dict, max_age: int) -> None:
+        expires_at = time.time() + max_age
+        self._entries[session_id] = (dict(data), expires_at)
+        self._entries.move_to_end(session_id)
+        self._wheel.schedule(session_id, expires_at)
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._wheel.cancel(evicted)
+
+    async def delete(self, session_id: str) -> None:
+        self._entries.pop(session_id, None)
+        self._wheel.cancel(session_id)
+
+    def sweep(self) -> int:
+        expired = self._wheel.advance(time.time())
+        for session_id in expired:
+            del self._entries[session_id]
+        return len(expired)
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Session store in a SQLite database in WAL mode, so sessions survive restarts
+    and are shared by every worker on the host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_expires_at ON sessions (expires_at)")
+
+    def _get(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, expires_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        data, expires_at = row
+        if time.time() >= expires_at:
+            self._delete(session_id)
+            return None
+        return json.loads(data), expires_at
+
+    def _set(self, session_id: str, data: dict, max_age: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data), time.time() + max_age),
+            )
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    async def get_with_expiry(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        return await asyncio.to_thread(self._get, session_id)
+
+    async def set(self, session_id: str, data: dict, max_age: int) -> None:
+        await asyncio.to_thread(self._set, session_id, data, max_age)
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self._delete, session_id)
+
+    def sweep(self) -> int:
+        with self._lock:
+            return self._conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    async def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class SharedSessionBackend(SessionBackend):
+    """
+    Sessions in the cross-process shared cache, so every worker on the host sees
+    the same sessions without a separate database.
+    """
+
+    def __init__(self, cache: SharedCache, prefix: str = "session:"):
+        self.cache = cache
+        self.prefix = prefix
+
+    async def get_with_expiry(self, session_id: str) -> Optional[Tuple[dict, float]]:
+        return await asyncio.to_thread(self.cache.get_with_expiry, self.prefix + session_id)
+
+    async def set(self, session_id: str, data: dict, max_age: int) -> None:
+        await asyncio.to_thread(self.cache.set, self.prefix + session_id, data, max_age)
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self.cache.delete, self.prefix + session_id)
+
+
+def create_session_backend() -> Optional[SessionBackend]:
+    """Build the backend selected by SESSION_BACKEND, or None for signed-cookie sessions."""
+    if settings.SESSION_BACKEND in ("cookie", "compact"):
+        return None
+    if settings.SESSION_BACKEND == "memory":
+        return MemorySessionBackend(max_entries=settings.SESSION_MEMORY_MAX_ENTRIES)
+    if settings.SESSION_BACKEND == "sqlite":
+        return SQLiteSessionBackend(settings.SESSION_SQLITE_PATH)
+    if settings.SESSION_BACKEND == "shared":
+        return SharedSessionBackend(shared_cache)
+    raise ValueError(
+        f"Unknown SESSION_BACKEND {settings.SESSION_BACKEND!r}, expected cookie, compact, memory, sqlite or shared"
+    )
+
+
+class ServerSessionMiddleware:
+    """
+    Drop-in replacement for Starlette's SessionMiddleware that keeps session data
+    server-side. The cookie only carries a random opaque session ID, so requests
+    stay small and sessions can be revoked by deleting them from the backend.
+    Requests to `excluded_paths` get no session at all and never reach the backend.
+
+    Sessions are written back only when they changed, or for sliding expiry once
+    less than `max_age - refresh_after` seconds remain (half of max_age by default).
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        backend: SessionBackend,
+        session_cookie: str = "session",
+        max_age: int = 14 * 24 * 60 * 60,  # 14 days, in seconds
+        path: str = "/",
+        same_site: str = "lax",
+        https_only: bool = False,
+        excluded_paths: FrozenSet[str] = frozenset(),
+        refresh_after: Optional[int] = None,
+    ) -> None:
+        self.app = app
+        self.backend = backend
+        self.excluded_paths = excluded_paths
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.refresh_after = refresh_after if refresh_after is not None else max_age // 2
+        self.path = path
+        self.security_flags = "httponly; samesite=" + same_site
+        if https_only:  # Secure flag can be used with HTTPS only
+            self.security_flags += "; secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] not in ("http", "websocket") or scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+
+        connection = HTTPConnection(scope)
+        session_id = connection.cookies.get(self.session_cookie)
+        entry = await self.backend.get_with_expiry(session_id) if session_id else None
+        if entry is None:
+            session_id = None
+            data, expires_at = None, None
+        else:
+            data, expires_at = entry
+        scope["session"] = session = Session(data or {})
+        initial_session_was_empty = not data
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                if session:
+                    if session.cleared and session_id:
+                        # The session was reset (e.g. at login): move it to a new ID
+                        await self.backend.delete(session_id)
+                        session_id = None
+                    new_session = session_id is None
+                    if new_session:
+                        session_id = secrets.token_urlsafe(32)
+                    # Unchanged sessions are only rewritten once past the sliding-expiry half-life.
+                    # Any write past it extends the stored expiry, so the cookie is re-sent to match
+                    refresh = self._needs_refresh(expires_at)
+                    if new_session or session.modified or refresh:
+                        await self.backend.set(session_id, dict(session), self.max_age)
+                    if new_session or refresh:
+                        self._set_cookie(message, session_id, f"Max-Age={self.max_age}; ")
+                elif not initial_session_was_empty:
+                    # The session has been cleared.
+                    await self.backend.delete(session_id)
+                    self._set_cookie(message, "null", "expires=Thu, 01 Jan 1970 00:00:00 GMT; ")
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _needs_refresh(self, expires_at: Optional[float]) -> bool:
+        if expires_at is None:
+            return True
+        return expires_at - time.time() <= self.max_age - self.refresh_after
+
+    def _set_cookie(self, message: Message, value: str, expiry: str) -> None:
+        headers = MutableHeaders(scope=message)
+        headers.append(
+            "Set-Cookie",
+            f"{self.session_cookie}={value}; path={self.path}; {expiry}{self.security_flags}",
+        )
@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Optional, Tuple
+
+from config import settings
+
+# Set up logging
+logger = logging.getLogger("shared_cache")
+
+
+class _Stripe:
+    """One SQLite file of the shared cache, with its own connection and lock."""
+
+    def __init__(self, path: str, mmap_size: int):
+        self.path = path
+        self.mmap_size = mmap_size
+        self.lock = threading.Lock()
+        self.conn: Optional[sqlite3.Connection] = None
+        self.writes = 0
+
+    def connect(self) -> sqlite3.Connection:
+        # Opened on first use, so importing the module never touches the disk
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=0)
+            try:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+                conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " expires_at REAL NOT NULL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS entries_expires_at ON entries (expires_at)")
+            except sqlite3.Error:
+                # Another worker is creating the file; the caller retries
+                conn.close()
+                raise
+            self.conn = conn
+        return self.conn
+
+
+class SharedCache:
+    """
+    Key/value cache shared by every worker process on the host.
+
+    Entries live in `stripes` SQLite files in WAL mode with memory-mapped reads.
+    A key's hash picks its stripe, and each stripe has its own write lock, so
+    workers writing different keys rarely wait on each other and readers never
+    wait on writers. Values are JSON. Expired entries are ignored on read and
+    purged, together with the entries closest to expiry once a stripe holds more
+    than its share of `max_entries`, every `trim_interval` writes.
+
+    Calls block on SQLite; from async code run writes with asyncio.to_thread.
+    """
+
+    BUSY_TIMEOUT = 5.0
+
+    def __init__(
+        self,
+        directory: str,
+        stripes: int = 8,
+        max_entries: int = 100000,
+        mmap_size: int = 64 * 1024 * 1024,
+        trim_interval: int = 256,
+    ):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.trim_interval = trim_interval
+        self._stripes = [
+            _Stripe(os.path.join(directory, f"stripe-{index}.db"), mmap_size)
+            for index in range(stripes)
+        ]
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "sets": 0,
+            "deletes": 0,
+            "expirations": 0,
+            "evictions": 0,
+            "lock_contention": 0,
+            "lock_wait_total": 0.0,
+        }
+
+    def _stripe(self, key: str) -> _Stripe:
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return self._stripes[int.from_bytes(digest, "big") % len(self._stripes)]
+
+    def _run(self, stripe: _Stripe, operation: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run `operation` on the stripe, retrying while another process holds its write lock."""
+        if stripe.conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+        deadline = None
+        delay = 0.0002
+        while True:
+            try:
+                with stripe.lock:
+                    return operation(stripe.connect())
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                now = time.monotonic()
+                if deadline is None:
+                    deadline = now + self.BUSY_TIMEOUT
+                elif now >= deadline:
+                    logger.warning(f"Gave up waiting for the lock on {stripe.path}")
+                    raise
+                self.stats["lock_contention"] += 1
+                self.stats["lock_wait_total"] += delay
+                time.sleep(delay)
+                delay = min(delay * 2, 0.005)
+
+    def get_with_expiry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """Return the value and the time it expires at, or None."""
+        stripe = self._stripe(key)
+        row = self._run(
+            stripe,
+            lambda conn: conn.execute("SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone(),
+        )
+        if row is None or row[1] <= time.time():
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        value, expires_at = row
+        return json.loads(value), expires_at
+
+    def get(self, key: str) -> Any:
+        entry = self.get_with_expiry(key)
+        return entry[0] if entry is not None else None
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        stripe = self._stripe(key)
+        params = (key, json.dumps(value, separators=(",", ":")), time.time() + ttl)
+        self._run(
+            stripe,
+            lambda conn: conn.execute("INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)", params),
+        )
+        self.stats["sets"] += 1
+        stripe.writes += 1
+        if stripe.writes % self.trim_interval == 0:
+            self._trim(stripe)
+
+    def delete(self, key: str) -> None:
+        self._run(self._stripe(key), lambda conn: conn.execute("DELETE FROM entries WHERE key = ?", (key,)))
+        self.stats["deletes"] += 1
+
+    def _trim(self, stripe: _Stripe) -> int:
+        """Purge expired entries, then evict down to the stripe's share of max_entries. Returns the number expired."""
+        now = time.time()
+        expired = self._run(
+            stripe, lambda conn: conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,)).rowcount
+        )
+        self.stats["expirations"] += expired
+        limit = max(self.max_entries // len(self._stripes), 1)
+        count = self._run(stripe, lambda conn: conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0])
+        if count > limit:
+            self.stats["evictions"] += self._run(
+                stripe,
+                lambda conn: conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY expires_at LIMIT ?)",
+                    (count - limit,),
+                ).rowcount,
+            )
+        return expired
+
+    def purge_expired(self) -> int:
+        """Purge expired entries from every stripe and return how many were removed."""
+        return sum(self._trim(stripe) for stripe in self._stripes if os.path.exists(stripe.path))
+
+    def close(self) -> None:
+        for stripe in self._stripes:
+            with stripe.lock:
+                if stripe.conn is not None:
+                    stripe.conn.close()
+                    stripe.conn = None
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "stripes": len(self._stripes), "max_entries": self.max_entries}
+
+
+shared_cache = SharedCache(
+    directory=settings.SHARED_CACHE_DIR,
+    stripes=settings.SHARED_CACHE_STRIPES,
+    max_entries=settings.SHARED_CACHE_MAX_ENTRIES,
+    mmap_size=settings.SHARED_CACHE_MMAP_SIZE,
+)
@@ -0,0 +1,142 @@
+"""
+Tests for the per-route circuit breaker and adaptive timeouts.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from http_client import PooledHTTPClient
+
+
+def make_breaker(**options) -> CircuitBreaker:
+    defaults = {"window": 20, "min_requests": 10, "error_rate": 0.5, "latency_p99": 1.0, "open_seconds": 60}
+    return CircuitBreaker("test", **{**defaults, **options})
+
+
+def call(breaker: CircuitBreaker, succeeded: bool = True, latency: float = 0.01) -> None:
+    breaker.before_call()
+    breaker.record(succeeded, latency)
+
+
+def test_stays_closed_below_min_requests():
+    breaker = make_breaker()
+    for _ in range(9):
+        call(breaker, succeeded=False)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_trips_on_error_rate():
+    breaker = make_breaker()
+    for n in range(10):
+        call(breaker, succeeded=n % 2 == 0)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats["trips"] == 1
+    assert breaker.stats["rejected"] == 1
+
+
+def test_trips_on_p99_latency():
+    breaker = make_breaker()
+    for _ in range(9):
+        call(breaker, latency=0.01)
+    call(breaker, latency=2.0)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_open_breaker_rejects_calls_as_transport_errors():
+    assert issubclass(CircuitOpenError, httpx.RequestError)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(10):
+        call(breaker, succeeded=False)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_probe_success_closes(monkeypatch):
+    breaker = make_breaker(probes=1)
+    trip(breaker)
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - 61)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Only `probes` calls may be in flight while half-open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record(True, 0.01)
+    assert breaker.state == CircuitBreaker.CLOSED
+    call(breaker)
+
+
+def test_half_open_probe_failure_reopens(monkeypatch):
+    breaker = make_breaker(probes=1)
+    trip(breaker)
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - 61)
+
+    breaker.before_call()
+    breaker.record(False, 0.01)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats["trips"] == 2
+
+
+def test_cancelled_probe_frees_its_slot(monkeypatch):
+    breaker = make_breaker(probes=1)
+    trip(breaker)
+    monkeypatch.setattr(breaker, "_opened_at", breaker._opened_at - 61)
+
+    breaker.before_call()
+    breaker.cancelled()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_timeout_is_configured_until_latency_is_known():
+    assert make_breaker().timeout(5.0) == 5.0
+
+
+@pytest.mark.parametrize("latency, expected", [(0.01, 0.5), (0.4, 1.2), (3.0, 5.0)])
+def test_timeout_is_clamped(latency, expected):
+    breaker = make_breaker(latency_p99=100, timeout_multiplier=3.0, min_timeout=0.5)
+    for _ in range(10):
+        call(breaker, latency=latency)
+    assert breaker.timeout(5.0) == pytest.approx(expected)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Answers every request with 200 and remembers the timeouts it was given."""
+
+    def __init__(self):
+        self.timeouts = []
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.timeouts.append(request.extensions["timeout"]["read"])
+        return httpx.Response(200, request=request)
+
+
+def make_pool() -> PooledHTTPClient:
+    pool = PooledHTTPClient(
+        "test", max_connections=10, max_keepalive_connections=10, keepalive_expiry=5, http2=False, timeout=10.0,
+        breaker_options={"min_requests": 10, "min_timeout": 0.5},
+    )
+    pool._transport = RecordingTransport()
+    return pool
+
+
+def test_adaptive_timeout_applies_to_gets_only():
+    pool = make_pool()
+    transport = pool._transport
+    for _ in range(10):
+        pool.breaker("token").record(True, 0.01)
+
+    async def scenario():
+        await pool.request("GET", "https://tenant.example.com/.well-known/jwks.json", route="token")
+        await pool.request("POST", "https://tenant.example.com/oauth/token", route="token")
+        await pool.stop()
+
+    asyncio.run(scenario())
+    get_timeout, post_timeout = transport.timeouts
+    assert get_timeout == 0.5
+    assert post_timeout == 10.0
@@ -0,0 +1,180 @@
+"""
+Tests for the connections catalog and Management API pagination.
+"""
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+import connections
+from auth_routes import router
+from connections import ConnectionCatalog
+from http_client import auth0_http
+
+URL = "https://tenant.example.com/api/v2/connections"
+
+
+def make_connections(count: int) -> list:
+    strategies = ["github", "google-oauth2", "auth0", "samlp"]
+    return [{"name": f"conn-{n}", "strategy": strategies[n % 4]} for n in range(count)]
+
+
+class ManagementAPI:
+    """Mock Management API listing `connections`, tracking how many page requests overlap."""
+
+    def __init__(self, connections: list, delay: float = 0.01):
+        self.connections = connections
+        self.delay = delay
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.fail = False
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(dict(request.url.params))
+        if self.fail:
+            return httpx.Response(503, request=request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        params = request.url.params
+        if "take" in params:
+            take, start = int(params["take"]), int(params.get("from", 0))
+            page = self.connections[start:start + take]
+            body = {"connections": page}
+            if start + take < len(self.connections):
+                body["next"] = str(start + take)
+            return httpx.Response(200, json=body, request=request)
+        if "per_page" not in params:
+            return httpx.Response(200, json=self.connections, request=request)
+        per_page, page = int(params["per_page"]), int(params["page"])
+        body = {
+            "connections": self.connections[page * per_page:(page + 1) * per_page],
+            "total": len(self.connections),
+            "start": page * per_page,
+            "limit": per_page,
+        }
+        return httpx.Response(200, json=body, request=request)
+
+
+@pytest.fixture
+def api(monkeypatch):
+    api = ManagementAPI(make_connections(437))
+    monkeypatch.setattr(auth0_http, "_transport", httpx.MockTransport(api))
+    monkeypatch.setattr(auth0_http, "_client", None)
+
+    async def token():
+        return "management-token"
+
+    monkeypatch.setattr(connections.management_token_cache, "get", token)
+    yield api
+    asyncio.run(auth0_http.stop())
+
+
+def make_catalog(**options) -> ConnectionCatalog:
+    catalog = ConnectionCatalog("tenant.example.com", ttl=300, retry_interval=30, **options)
+    assert catalog.connections_url == URL
+    return catalog
+
+
+def collect(catalog: ConnectionCatalog) -> list:
+    async def pages():
+        return [page async for page in catalog.iter_pages()]
+    return asyncio.run(pages())
+
+
+def test_offset_pages_are_fetched_concurrently_in_order(api):
+    pages = collect(make_catalog(page_size=100, concurrency=3))
+    assert [len(page) for page in pages] == [100, 100, 100, 100, 37]
+    assert [c for page in pages for c in page] == api.connections
+    assert [int(params["page"]) for params in api.requests] == [0, 1, 2, 3, 4]
+    assert api.max_in_flight == 3
+
+
+def test_single_offset_page(api):
+    api.connections = make_connections(20)
+    pages = collect(make_catalog(page_size=100))
+    assert pages == [api.connections]
+    assert len(api.requests) == 1
+
+
+def test_checkpoint_pages_follow_the_cursor(api):
+    pages = collect(make_catalog(page_size=200, pagination="checkpoint"))
+    assert [len(page) for page in pages] == [200, 200, 37]
+    assert [params.get("from") for params in api.requests] == [None, "200", "400"]
+    assert api.max_in_flight == 1
+
+
+def test_unknown_pagination_is_rejected():
+    with pytest.raises(ValueError):
+        make_catalog(pagination="cursor")
+
+
+def test_catalog_indexes_connections(api):
+    catalog = make_catalog()
+
+    async def lookups():
+        await catalog.refresh()
+        return (
+            await catalog.first("github"),
+            len(await catalog.by_strategy("samlp")),
+            await catalog.by_name("conn-5"),
+            len(await catalog.names()),
+        )
+
+    github, saml_count, by_name, name_count = asyncio.run(lookups())
+    assert github == {"name": "conn-0", "strategy": "github"}
+    assert saml_count == 109
+    assert by_name == {"name": "conn-5", "strategy": "google-oauth2"}
+    assert name_count == 437
+    assert catalog.stats["fetches"] == 1
+
+
+def test_failed_load_is_not_retried_within_the_retry_interval(api):
+    api.fail = True
+    catalog = make_catalog()
+
+    async def lookups():
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                await catalog.all()
+
+    asyncio.run(lookups())
+    assert catalog.stats["fetches"] == 1
+
+
+def test_stale_catalog_is_served_while_auth0_fails(api):
+    catalog = make_catalog()
+    asyncio.run(catalog.refresh())
+    api.fail = True
+    asyncio.run(catalog.refresh())
+    assert len(asyncio.run(catalog.all())) == 437
+    assert catalog.stats["fetch_errors"] == 1
+
+
+def test_load_that_neither_failed_nor_succeeded_answers_503(monkeypatch):
+    catalog = make_catalog()
+
+    async def fetch_nothing():
+        pass
+
+    monkeypatch.setattr(catalog, "_fetch", fetch_nothing)
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(catalog.all())
+    assert excinfo.value.status_code == 503
+
+
+def test_stream_route_writes_one_connection_per_line(api):
+    app = FastAPI()
+    app.include_router(router)
+    response = TestClient(app).get("/debug/connections/stream")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["name"] for line in lines] == [c["name"] for c in api.connections]
+    assert lines[0] == {"name": "conn-0", "strategy": "github", "enabled_clients": [], "is_enabled_for_this_app": False}
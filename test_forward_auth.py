@@ -0,0 +1,96 @@
+"""
+Tests for the forward-auth endpoint answered by ForwardAuthMiddleware.
+"""
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from forward_auth import ForwardAuthMiddleware
+from session_codec import session_codec
+from session_index import session_index
+from sessions import MemorySessionBackend, decoded_session_cache
+
+
+def make_client(session_backend=None):
+    app = FastAPI()
+
+    @app.get("/other")
+    async def other():
+        return {"routed": True}
+
+    app.add_middleware(ForwardAuthMiddleware, path="/auth/verify", session_backend=session_backend)
+    return TestClient(app)
+
+
+@pytest.fixture(autouse=True)
+def clear_session_cache():
+    decoded_session_cache.clear()
+    yield
+    decoded_session_cache.clear()
+
+
+@pytest.mark.usefixtures("signing_key")
+def test_valid_bearer_token_gets_identity_headers(make_token):
+    response = make_client().get("/auth/verify", headers={"Authorization": f"Bearer {make_token()}"})
+    assert response.status_code == 204
+    assert response.headers["x-user-id"] == "github|583231"
+    assert response.headers["x-auth-type"] == "github"
+    assert response.headers["x-auth-method"] == "bearer"
+
+
+@pytest.mark.usefixtures("signing_key")
+def test_invalid_bearer_token_is_unauthorized(make_token):
+    response = make_client().get("/auth/verify", headers={"Authorization": f"Bearer {make_token(aud='other')}"})
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+    assert "x-user-id" not in response.headers
+
+
+def test_missing_credentials_are_unauthorized():
+    response = make_client().get("/auth/verify")
+    assert response.status_code == 401
+
+
+def test_other_paths_pass_through():
+    response = make_client().get("/other")
+    assert response.status_code == 200
+    assert response.json() == {"routed": True}
+
+
+def test_signed_session_cookie_gets_identity_headers():
+    cookie = session_codec.encode({"user": {"id": "google-oauth2|forward-1", "gen": 0}})
+    response = make_client().get("/auth/verify", headers={"Cookie": f"session={cookie}"})
+    assert response.status_code == 204
+    assert response.headers["x-user-id"] == "google-oauth2|forward-1"
+    assert response.headers["x-auth-type"] == "google"
+    assert response.headers["x-auth-method"] == "session"
+
+
+def test_tampered_session_cookie_is_unauthorized():
+    cookie = session_codec.encode({"user": {"id": "github|forward-2", "gen": 0}})
+    response = make_client().get("/auth/verify", headers={"Cookie": f"session={cookie[:-2]}xx"})
+    assert response.status_code == 401
+
+
+def test_revoked_session_is_unauthorized():
+    cookie = session_codec.encode({"user": {"id": "github|forward-3", "gen": 0}})
+    client = make_client()
+    assert client.get("/auth/verify", headers={"Cookie": f"session={cookie}"}).status_code == 204
+
+    asyncio.run(session_index.revoke_user("github|forward-3"))
+    assert client.get("/auth/verify", headers={"Cookie": f"session={cookie}"}).status_code == 401
+
+
+def test_server_side_session_is_looked_up_in_the_backend():
+    backend = MemorySessionBackend(max_entries=10)
+    asyncio.run(backend.set("sid-1", {"user": {"id": "auth0|forward-4", "gen": 0}}, max_age=60))
+    client = make_client(session_backend=backend)
+
+    response = client.get("/auth/verify", headers={"Cookie": "session=sid-1"})
+    assert response.status_code == 204
+    assert response.headers["x-user-id"] == "auth0|forward-4"
+    assert response.headers["x-auth-type"] == "auth0"
+
+    assert client.get("/auth/verify", headers={"Cookie": "session=sid-unknown"}).status_code == 401
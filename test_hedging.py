@@ -0,0 +1,103 @@
+"""
+Tests for hedged GETs on the pooled Auth0 client.
+"""
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+
+from http_client import PooledHTTPClient
+
+
+class SlowFirstTransport(httpx.AsyncBaseTransport):
+    """The first attempt at each URL answers after `slow` seconds, later attempts at once."""
+
+    def __init__(self, slow: float):
+        self.slow = slow
+        self.attempts = Counter()
+        self.started = []
+        self.cancelled = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url)
+        self.attempts[url] += 1
+        self.started.append(time.perf_counter())
+        if self.attempts[url] == 1:
+            try:
+                await asyncio.sleep(self.slow)
+            except asyncio.CancelledError:
+                self.cancelled += 1
+                raise
+        return httpx.Response(200, json={"attempt": self.attempts[url]}, request=request)
+
+
+def make_pool(transport: httpx.AsyncBaseTransport, budget: float, p95: float = 0.01) -> PooledHTTPClient:
+    pool = PooledHTTPClient(
+        "test", max_connections=10, max_keepalive_connections=10, keepalive_expiry=5, http2=False, timeout=5.0,
+        hedge_routes=["userinfo"], hedge_budget=budget, hedge_min_delay=0.05,
+    )
+    pool._transport = transport
+    # Pin the route's observed latency so the hedge delay doesn't move during the test
+    breaker = pool.breaker("userinfo")
+    breaker.success_p95 = breaker._p99 = breaker._success_p99 = p95
+    breaker._update_percentiles = lambda: None
+    return pool
+
+
+def test_hedge_fires_after_the_delay_and_wins():
+    transport = SlowFirstTransport(slow=1.0)
+    pool = make_pool(transport, budget=1.0)
+
+    async def scenario():
+        started = time.perf_counter()
+        response = await pool.request("GET", "https://tenant.example.com/userinfo", route="userinfo")
+        return response, time.perf_counter() - started
+
+    response, elapsed = asyncio.run(scenario())
+    assert response.json() == {"attempt": 2}
+    # The hedge waits for max(p95, AUTH0_HEDGE_MIN_DELAY)
+    assert transport.started[1] - transport.started[0] >= 0.05
+    assert elapsed < 0.5
+    assert pool.hedge_stats["fired"] == 1
+    assert pool.hedge_stats["won"] == 1
+
+
+def test_no_hedge_before_latency_is_known():
+    transport = SlowFirstTransport(slow=0.1)
+    pool = make_pool(transport, budget=1.0, p95=None)
+    response = asyncio.run(pool.request("GET", "https://tenant.example.com/userinfo", route="userinfo"))
+    assert response.json() == {"attempt": 1}
+    assert pool.hedge_stats["fired"] == 0
+
+
+def test_hedges_stay_within_budget():
+    transport = SlowFirstTransport(slow=0.1)
+    pool = make_pool(transport, budget=0.25)
+
+    async def scenario():
+        for n in range(20):
+            await pool.request("GET", f"https://tenant.example.com/userinfo?n={n}", route="userinfo")
+
+    asyncio.run(scenario())
+    # Each request earns a quarter of a hedge: every fourth slow request may hedge
+    assert pool.hedge_stats["eligible"] == 20
+    assert pool.hedge_stats["fired"] == 5
+    assert pool.hedge_stats["budget_exhausted"] == 15
+
+
+def test_cancelled_loser_is_not_a_breaker_failure():
+    transport = SlowFirstTransport(slow=1.0)
+    pool = make_pool(transport, budget=1.0)
+    breaker = pool.breaker("userinfo")
+
+    async def scenario():
+        await pool.request("GET", "https://tenant.example.com/userinfo", route="userinfo")
+        # Let the cancelled loser unwind
+        await asyncio.sleep(0.01)
+
+    asyncio.run(scenario())
+    assert transport.cancelled == 1
+    assert breaker.stats["failures"] == 0
+    assert [ok for ok, _ in breaker._outcomes] == [True]
+    assert pool.stats["errors"] == 0
@@ -0,0 +1,160 @@
+"""
+Tests for the pooled Auth0 HTTP client.
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from auth import oauth
+from http_client import PooledHTTPClient, auth0_http
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Answers requests by path and remembers them; /fail raises a connection error."""
+
+    def __init__(self):
+        self.requests = []
+        self.closed = False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path == "/fail":
+            raise httpx.ConnectError("connection refused", request=request)
+        return httpx.Response(200, json={"path": request.url.path}, request=request)
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+def make_pool(**options) -> PooledHTTPClient:
+    pool = PooledHTTPClient(
+        "test", max_connections=10, max_keepalive_connections=5, keepalive_expiry=5, http2=False, timeout=10.0,
+        **options,
+    )
+    pool._transport = RecordingTransport()
+    return pool
+
+
+def test_requests_share_one_client():
+    pool = make_pool()
+    transport = pool._transport
+
+    async def scenario():
+        async with pool.route("userinfo") as client:
+            await client.get("https://tenant.example.com/userinfo")
+        shared = pool.client
+        async with pool.route("management") as client:
+            await client.get("https://tenant.example.com/api/v2/connections")
+        assert pool.client is shared
+        assert not shared.is_closed
+        await pool.stop()
+        assert shared.is_closed
+
+    asyncio.run(scenario())
+    assert len(transport.requests) == 2
+    assert transport.closed
+
+
+def test_client_reopens_after_stop():
+    pool = make_pool()
+
+    async def scenario():
+        await pool.start()
+        first = pool.client
+        await pool.stop()
+        pool._transport = RecordingTransport()
+        response = await pool.request("GET", "https://tenant.example.com/jwks")
+        assert pool.client is not first
+        await pool.stop()
+        return response
+
+    assert asyncio.run(scenario()).json() == {"path": "/jwks"}
+
+
+def test_route_timeouts():
+    pool = make_pool(route_timeouts={"userinfo": 2.0})
+    transport = pool._transport
+
+    async def scenario():
+        await pool.request("POST", "https://tenant.example.com/userinfo", route="userinfo")
+        await pool.request("POST", "https://tenant.example.com/other")
+        await pool.request("POST", "https://tenant.example.com/other", timeout=1.0)
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert [request.extensions["timeout"]["read"] for request in transport.requests] == [2.0, 10.0, 1.0]
+
+
+def test_stats_per_route():
+    pool = make_pool()
+
+    async def scenario():
+        await pool.request("GET", "https://tenant.example.com/userinfo", route="userinfo")
+        await pool.request("GET", "https://tenant.example.com/userinfo", route="userinfo")
+        with pytest.raises(httpx.ConnectError):
+            await pool.request("GET", "https://tenant.example.com/fail", route="management")
+        await pool.stop()
+
+    asyncio.run(scenario())
+    stats = pool.get_stats()
+    assert stats["requests"] == 3
+    assert stats["errors"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["in_flight_max"] == 1
+    assert stats["routes"]["userinfo"]["requests"] == 2
+    assert stats["routes"]["userinfo"]["errors"] == 0
+    assert stats["routes"]["management"]["errors"] == 1
+    assert stats["routes"]["userinfo"]["latency_avg"] >= 0
+    assert stats["pool"]["max_connections"] == 10
+
+
+def test_http2_falls_back_without_h2(monkeypatch, caplog):
+    monkeypatch.setattr("importlib.util.find_spec", lambda name: None)
+    pool = PooledHTTPClient(
+        "test", max_connections=10, max_keepalive_connections=5, keepalive_expiry=5, http2=True, timeout=10.0,
+    )
+    assert isinstance(pool.transport, httpx.AsyncHTTPTransport)
+    assert "h2 package is not installed" in caplog.text
+    asyncio.run(pool.stop())
+
+
+@pytest.fixture
+def auth0_transport(monkeypatch):
+    transport = RecordingTransport()
+    monkeypatch.setattr(auth0_http, "_transport", transport)
+    monkeypatch.setattr(auth0_http, "_client", None)
+    yield transport
+    asyncio.run(auth0_http.stop())
+
+
+def test_authlib_token_exchange_uses_the_pool(auth0_transport):
+    requests_before = auth0_http.get_stats()["routes"].get("token", {}).get("requests", 0)
+
+    async def scenario():
+        first = await oauth.auth0.fetch_access_token(redirect_uri="https://app.example.com/auth/callback", code="a")
+        # authlib closes its own client after each exchange; the pooled connections stay open
+        second = await oauth.auth0.fetch_access_token(redirect_uri="https://app.example.com/auth/callback", code="b")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first == second == {"path": "/oauth/token"}
+    assert [request.url.path for request in auth0_transport.requests] == ["/oauth/token", "/oauth/token"]
+    assert not auth0_transport.closed
+    assert auth0_http.get_stats()["routes"]["token"]["requests"] == requests_before + 2
+
+
+def test_closing_a_client_on_the_shared_transport_keeps_the_pool_open():
+    pool = make_pool()
+    transport = pool._transport
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=pool.shared_transport("token")) as client:
+            await client.get("https://tenant.example.com/.well-known/jwks.json")
+        await pool.request("GET", "https://tenant.example.com/userinfo")
+        assert not transport.closed
+        await pool.stop()
+
+    asyncio.run(scenario())
+    assert len(transport.requests) == 2
+    assert pool.get_stats()["routes"]["token"]["requests"] == 1
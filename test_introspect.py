@@ -0,0 +1,61 @@
+"""
+Tests for batch token introspection.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from auth import introspect_tokens
+from jwks import jwks_store
+from verifier import token_verifier
+
+pytestmark = pytest.mark.usefixtures("signing_key")
+
+
+def introspect(tokens):
+    return asyncio.run(introspect_tokens(tokens))
+
+
+@pytest.fixture
+def thread_verifier(monkeypatch):
+    """Verify on a one-thread pool with room for four pending verifications."""
+    monkeypatch.setattr(token_verifier, "mode", "thread")
+    monkeypatch.setattr(token_verifier, "max_workers", 1)
+    monkeypatch.setattr(token_verifier, "max_pending", 4)
+    monkeypatch.setitem(token_verifier.stats, "rejected", 0)
+    yield token_verifier
+    token_verifier.stop()
+
+
+def test_mixed_batch_keeps_request_order(make_token):
+    valid = make_token()
+    expired = make_token(exp=int(time.time()) - 60)
+    results = introspect([expired, valid, "not-a-token", valid])
+    assert [result["active"] for result in results] == [False, True, False, True]
+    assert results[1]["claims"]["sub"] == "github|583231"
+    assert results[2]["error"] == "Malformed token"
+
+
+def test_large_batch_stays_within_the_verifier_queue(make_token, thread_verifier):
+    tokens = [make_token(sub=f"github|{n}") for n in range(20)]
+    results = introspect(tokens)
+    assert all(result["active"] for result in results)
+    assert thread_verifier.stats["rejected"] == 0
+
+
+def test_full_verifier_queue_fails_the_batch(make_token, thread_verifier, monkeypatch):
+    # Concurrent bearer requests already fill the queue
+    monkeypatch.setattr(thread_verifier, "_pending", thread_verifier.max_pending)
+    with pytest.raises(HTTPException) as excinfo:
+        introspect([make_token(), "not-a-token"])
+    assert excinfo.value.status_code == 503
+
+
+def test_missing_signing_keys_fail_the_batch(make_token, monkeypatch):
+    monkeypatch.setattr(jwks_store, "_keys", {})
+    monkeypatch.setattr(jwks_store, "_last_attempt", time.monotonic())
+    with pytest.raises(HTTPException) as excinfo:
+        introspect([make_token()])
+    assert excinfo.value.status_code == 503
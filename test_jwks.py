@@ -0,0 +1,139 @@
+"""
+Tests for the JWKS key store: parsing, refetch gating and stale keys.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from conftest import public_jwk
+from http_client import auth0_http
+from jwks import JWKSKeyStore
+
+JWKS_URL = "https://example.auth0.com/.well-known/jwks.json"
+
+
+class JWKSEndpoint:
+    """Mock JWKS endpoint serving `keys`, or failing while `fail` is set."""
+
+    def __init__(self, *kids: str):
+        self.keys = [public_jwk(kid) for kid in kids]
+        self.fail = False
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(0.01)
+        if self.fail:
+            return httpx.Response(503, request=request)
+        return httpx.Response(200, json={"keys": self.keys}, request=request)
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    endpoint = JWKSEndpoint("key-1")
+    monkeypatch.setattr(auth0_http, "_transport", httpx.MockTransport(endpoint))
+    monkeypatch.setattr(auth0_http, "_client", None)
+    yield endpoint
+    asyncio.run(auth0_http.stop())
+
+
+def make_store(min_refetch_interval: float = 60) -> JWKSKeyStore:
+    return JWKSKeyStore(JWKS_URL, ttl=3600, refresh_margin=300, min_refetch_interval=min_refetch_interval)
+
+
+def test_load_keeps_only_rsa_signing_keys():
+    store = make_store()
+    loaded = store.load({"keys": [
+        public_jwk("sig"),
+        {**public_jwk("enc"), "use": "enc"},
+        {**public_jwk("no-kid"), "kid": ""},
+        {"kty": "EC", "kid": "ec", "crv": "P-256", "x": "", "y": ""},
+        {**public_jwk("broken"), "n": "!"},
+    ]})
+    assert loaded == 1
+    assert store.get_cached_key("sig") is not None
+    assert store.get_key_data("sig")["kid"] == "sig"
+    assert store.key_data.keys() == {"sig"}
+
+
+def test_empty_document_keeps_the_current_keys():
+    store = make_store()
+    store.load({"keys": [public_jwk("key-1")]})
+    assert store.load({"keys": []}) == 0
+    assert store.has_keys
+
+
+def test_cold_start_fetches_once_for_concurrent_requests(endpoint):
+    store = make_store()
+
+    async def lookups():
+        return await asyncio.gather(*(store.get_key("key-1") for _ in range(10)))
+
+    assert all(key is not None for key in asyncio.run(lookups()))
+    assert endpoint.requests == 1
+
+
+def test_unknown_kid_refetches_once_per_interval(endpoint, monkeypatch):
+    store = make_store()
+    asyncio.run(store.refresh())
+    endpoint.keys.append(public_jwk("key-2"))
+    monkeypatch.setattr(store, "_last_attempt", time.monotonic() - 61)
+
+    async def lookups():
+        rotated = await store.get_key("key-2")
+        # A forged kid right after can't trigger another fetch
+        forged = await store.get_key("forged")
+        return rotated, forged
+
+    rotated, forged = asyncio.run(lookups())
+    assert rotated is not None
+    assert forged is None
+    assert endpoint.requests == 2
+    assert store.stats["unknown_kid"] == 2
+
+
+def test_stale_keys_are_served_and_revalidated_in_the_background(endpoint, monkeypatch):
+    store = make_store(min_refetch_interval=0)
+    asyncio.run(store.refresh())
+    monkeypatch.setattr(store, "_fetched_at", time.monotonic() - 7200)
+
+    async def lookup():
+        key = await store.get_key("key-1")
+        await store._inflight
+        return key
+
+    assert asyncio.run(lookup()) is not None
+    assert endpoint.requests == 2
+    assert store.age < 60
+
+
+def test_keys_survive_a_failed_refresh(endpoint):
+    store = make_store()
+    asyncio.run(store.refresh())
+    endpoint.fail = True
+    asyncio.run(store.refresh())
+    assert store.get_cached_key("key-1") is not None
+    assert store.stats["fetch_errors"] == 1
+
+
+class UnreachableKeyStore(JWKSKeyStore):
+    """Key store whose fetches always fail, as when Auth0 is down."""
+
+    async def _fetch(self) -> None:
+        self.stats["fetches"] += 1
+        self.stats["fetch_errors"] += 1
+        await asyncio.sleep(0.01)
+
+
+def test_cold_start_refetch_is_rate_limited():
+    async def scenario():
+        store = UnreachableKeyStore(JWKS_URL, 3600, 300, 60)
+        keys = await asyncio.gather(*(store.get_key("some-kid") for _ in range(20)))
+        keys.append(await store.get_key("some-kid"))
+        return store, keys
+
+    store, keys = asyncio.run(scenario())
+    assert keys == [None] * 21
+    assert store.stats["fetches"] == 1
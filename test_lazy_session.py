@@ -0,0 +1,122 @@
+"""
+Tests for lazy session loading and session-free excluded paths.
+"""
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from session_codec import CookieSessionMiddleware, SessionCodec
+from sessions import LazySession, MemorySessionBackend, ServerSessionMiddleware, parse_excluded_paths
+
+
+def test_parse_excluded_paths():
+    assert parse_excluded_paths(" /health, /docs,,/openapi.json ") == frozenset({"/health", "/docs", "/openapi.json"})
+    assert parse_excluded_paths("") == frozenset()
+
+
+def test_session_is_loaded_on_first_access():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {"user": {"id": "github|1"}}
+
+    session = LazySession(loader)
+    assert not session.loaded
+    assert repr(session) == "LazySession(<not loaded>)"
+    assert session["user"] == {"id": "github|1"}
+    assert session.get("user") == {"id": "github|1"}
+    assert len(calls) == 1
+    assert not session.initial_empty
+    assert not session.modified
+
+
+def test_clearing_does_not_load():
+    def loader():
+        raise AssertionError("loaded")
+
+    session = LazySession(loader)
+    session.clear()
+    assert session.cleared
+    assert not session.initial_empty
+    assert not session
+
+
+def test_session_without_cookie_starts_empty():
+    session = LazySession()
+    session["visits"] = 1
+    assert session.initial_empty
+    assert session.modified
+
+
+class CountingCodec(SessionCodec):
+    def __init__(self, secret_key: str):
+        super().__init__(secret_key)
+        self.decodes = 0
+
+    def decode_with_timestamp(self, value, max_age=None):
+        self.decodes += 1
+        return super().decode_with_timestamp(value, max_age)
+
+
+def make_app(middleware, **options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/health")
+    async def health(request: Request):
+        return {"session": "session" in request.scope}
+
+    @app.get("/anonymous")
+    async def anonymous():
+        return {}
+
+    @app.get("/visit")
+    async def visit(request: Request):
+        request.session["visits"] = request.session.get("visits", 0) + 1
+        return {"visits": request.session["visits"]}
+
+    app.add_middleware(middleware, excluded_paths=frozenset({"/health"}), **options)
+    return app
+
+
+def test_untouched_sessions_are_never_decoded():
+    codec = CountingCodec("test-secret")
+    client = TestClient(make_app(CookieSessionMiddleware, codec=codec, max_age=1000))
+    cookie = codec.encode({"visits": 1})
+
+    response = client.get("/anonymous", headers={"Cookie": f"session={cookie}"})
+    assert codec.decodes == 0
+    assert "set-cookie" not in response.headers
+
+    assert client.get("/visit", headers={"Cookie": f"session={cookie}"}).json() == {"visits": 2}
+    assert codec.decodes == 1
+
+
+def test_excluded_paths_get_no_cookie_session():
+    codec = CountingCodec("test-secret")
+    client = TestClient(make_app(CookieSessionMiddleware, codec=codec, max_age=1000))
+    response = client.get("/health", headers={"Cookie": f"session={codec.encode({'visits': 1})}"})
+    assert response.json() == {"session": False}
+    assert "set-cookie" not in response.headers
+    assert codec.decodes == 0
+
+
+class CountingBackend(MemorySessionBackend):
+    def __init__(self):
+        super().__init__(max_entries=100)
+        self.reads = 0
+
+    async def get_with_expiry(self, session_id):
+        self.reads += 1
+        return await super().get_with_expiry(session_id)
+
+
+def test_excluded_paths_never_reach_the_backend():
+    backend = CountingBackend()
+    client = TestClient(make_app(ServerSessionMiddleware, backend=backend, max_age=1000))
+    client.get("/visit")
+    reads = backend.reads
+
+    response = client.get("/health")
+    assert response.json() == {"session": False}
+    assert "set-cookie" not in response.headers
+    assert backend.reads == reads
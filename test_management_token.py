@@ -0,0 +1,159 @@
+"""
+Tests for the Management API token cache.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import management_token
+from http_client import auth0_http
+from management_token import ManagementTokenCache
+from shared_cache import SharedCache
+
+
+class FakeClock:
+    """Stands in for the time module inside management_token."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def time(self) -> float:
+        return self.now
+
+
+class TokenEndpoint:
+    """Mock /oauth/token that issues numbered tokens, optionally slowly or failing."""
+
+    def __init__(self, expires_in: int = 3600):
+        self.expires_in = expires_in
+        self.calls = 0
+        self.delay = 0.0
+        self.status_code = 200
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.status_code != 200:
+            return httpx.Response(self.status_code, request=request)
+        return httpx.Response(200, json={"access_token": f"token-{self.calls}", "expires_in": self.expires_in})
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(management_token, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def endpoint(monkeypatch):
+    endpoint = TokenEndpoint()
+    monkeypatch.setattr(auth0_http, "_transport", httpx.MockTransport(endpoint))
+    monkeypatch.setattr(auth0_http, "_client", None)
+    yield endpoint
+    asyncio.run(auth0_http.stop())
+
+
+def make_cache(cache=None, refresh_margin: float = 300) -> ManagementTokenCache:
+    return ManagementTokenCache(
+        "tenant.example.com", "client-id", "secret", refresh_margin=refresh_margin, retry_interval=30, cache=cache,
+    )
+
+
+def test_token_is_fetched_once_and_reused(clock, endpoint):
+    tokens = make_cache()
+
+    async def scenario():
+        return [await tokens.get(), await tokens.get()]
+
+    assert asyncio.run(scenario()) == ["token-1", "token-1"]
+    assert endpoint.calls == 1
+    assert tokens.stats["misses"] == 1
+    assert tokens.stats["hits"] == 1
+    assert tokens.get_stats()["expires_in"] == 3600
+
+
+def test_concurrent_callers_share_one_fetch(clock, endpoint):
+    tokens = make_cache()
+    endpoint.delay = 0.05
+
+    async def scenario():
+        return await asyncio.gather(*(tokens.get() for _ in range(10)))
+
+    assert asyncio.run(scenario()) == ["token-1"] * 10
+    assert endpoint.calls == 1
+    assert tokens.stats["coalesced"] == 9
+
+
+def test_token_is_refreshed_in_the_background_inside_the_margin(clock, endpoint):
+    tokens = make_cache()
+
+    async def scenario():
+        await tokens.get()
+        clock.now += 3600 - 299
+        # Still valid: served at once while the new token is fetched
+        current = await tokens.get()
+        await tokens._inflight
+        return current, await tokens.get()
+
+    assert asyncio.run(scenario()) == ("token-1", "token-2")
+    assert endpoint.calls == 2
+    assert tokens.stats["misses"] == 1
+
+
+def test_refresh_margin_is_at_most_half_the_lifetime(clock, endpoint):
+    endpoint.expires_in = 100
+    tokens = make_cache(refresh_margin=3600)
+    asyncio.run(tokens.get())
+    assert tokens._refresh_at == pytest.approx(clock.now + 50)
+
+
+def test_failed_refresh_keeps_the_current_token(clock, endpoint):
+    tokens = make_cache()
+
+    async def scenario():
+        await tokens.get()
+        endpoint.status_code = 503
+        clock.now += 3600 - 10
+        await tokens.refresh()
+        assert await tokens.get() == "token-1"
+        clock.now += 10
+        with pytest.raises(httpx.HTTPStatusError):
+            await tokens.get()
+
+    asyncio.run(scenario())
+    assert tokens.stats["fetch_errors"] == 2
+
+
+def test_workers_adopt_a_token_from_the_shared_cache(clock, endpoint, tmp_path):
+    cache = SharedCache(str(tmp_path), stripes=2, max_entries=100, mmap_size=0)
+    worker_a, worker_b = make_cache(cache), make_cache(cache)
+
+    async def scenario():
+        return await worker_a.get(), await worker_b.get()
+
+    try:
+        assert asyncio.run(scenario()) == ("token-1", "token-1")
+    finally:
+        cache.close()
+    assert endpoint.calls == 1
+    assert worker_b.stats["shared_hits"] == 1
+    assert worker_b._refresh_at == worker_a._refresh_at
+
+
+def test_shared_token_past_its_refresh_point_is_not_adopted(clock, endpoint, tmp_path):
+    cache = SharedCache(str(tmp_path), stripes=2, max_entries=100, mmap_size=0)
+    worker_a, worker_b = make_cache(cache), make_cache(cache)
+
+    async def scenario():
+        await worker_a.get()
+        clock.now += 3600 - 299
+        return await worker_b.get()
+
+    try:
+        assert asyncio.run(scenario()) == "token-2"
+    finally:
+        cache.close()
+    assert worker_b.stats["shared_hits"] == 0
@@ -0,0 +1,96 @@
+"""
+Tests for permission bitsets and the require() dependency.
+"""
+import asyncio
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from auth import require
+from models import User
+from permissions import PermissionRegistry, VerifiedClaims, permission_registry
+from sessions import CachedSession, Session
+
+app = FastAPI()
+
+
+@app.get("/reports")
+async def reports(current_user: User = Depends(require("read:reports"))):
+    return {"id": current_user.id}
+
+
+@app.get("/reports/export")
+async def export_reports(current_user: User = Depends(require("read:reports", "export:reports"))):
+    return {"id": current_user.id}
+
+
+client = TestClient(app)
+
+
+def test_registry_interns_each_permission_once():
+    registry = PermissionRegistry()
+    read, write = registry.intern("read:a"), registry.intern("write:a")
+    assert read != write
+    assert registry.intern("read:a") == read
+    assert registry.mask(["read:a", "write:a"]) == read | write
+    assert registry.names(read | write) == ["read:a", "write:a"]
+    assert len(registry) == 2
+
+
+def test_verified_claims_carry_permission_bits():
+    claims = VerifiedClaims({"sub": "github|1", "permissions": ["read:reports"]})
+    assert claims.permission_bits == permission_registry.mask(["read:reports"])
+    assert VerifiedClaims({"sub": "github|1"}).permission_bits == 0
+
+
+@pytest.mark.usefixtures("signing_key")
+class TestBearer:
+    def get(self, path, token):
+        return client.get(path, headers={"Authorization": f"Bearer {token}"})
+
+    def test_granted_permission_passes(self, make_token):
+        response = self.get("/reports", make_token(permissions=["read:reports"]))
+        assert response.status_code == 200
+        assert response.json() == {"id": "github|583231"}
+
+    def test_missing_permission_is_forbidden(self, make_token):
+        response = self.get("/reports", make_token(permissions=["read:other"]))
+        assert response.status_code == 403
+        assert "read:reports" in response.json()["detail"]
+
+    def test_every_listed_permission_is_required(self, make_token):
+        partial = self.get("/reports/export", make_token(permissions=["read:reports"]))
+        assert partial.status_code == 403
+        assert partial.json()["detail"] == "Missing required permissions: export:reports"
+        full = self.get("/reports/export", make_token(permissions=["read:reports", "export:reports"]))
+        assert full.status_code == 200
+
+
+def session_request(permissions) -> Request:
+    user = {"id": "github|583231", "permissions": permissions}
+    cached = CachedSession({"user": user}, expires_at=float("inf"))
+    return Request({"type": "http", "headers": [], "session": Session({"user": user}), "cached_session": cached})
+
+
+def check(request: Request, *permissions: str) -> User:
+    return asyncio.run(require(*permissions)(request, None))
+
+
+def test_session_permission_bits_are_kept_with_the_cached_user():
+    request = session_request(["read:reports"])
+    user = check(request, "read:reports")
+    cached = request.scope["cached_session"]
+    assert cached.user is user
+    assert cached.permission_bits == permission_registry.mask(["read:reports"])
+
+    # Later requests for the same session reuse the User and its bitset
+    cached.permission_bits = permission_registry.mask(["read:reports", "export:reports"])
+    assert check(request, "read:reports", "export:reports") is user
+
+
+def test_session_missing_permission_is_forbidden():
+    with pytest.raises(HTTPException) as excinfo:
+        check(session_request(["read:reports"]), "read:reports", "export:reports")
+    assert excinfo.value.status_code == 403
@@ -0,0 +1,123 @@
+"""
+Tests for the policy DSL, its compiled rules and the decision cache.
+"""
+import pytest
+from fastapi import HTTPException
+
+from models import User
+from permissions import permission_registry
+from policy import (
+    PolicyEngine, Subject, always, auth_type_is, email_verified, github_push_policy,
+    has_permission, policy_engine, resource_owner_in,
+)
+
+
+def user(**fields) -> User:
+    defaults = {"id": "google-oauth2|1", "auth_type": "google", "permissions": [], "email_verified": True}
+    return User(**{**defaults, **fields})
+
+
+def allows(condition, resource=None, **fields) -> bool:
+    subject_user = user(**fields)
+    subject = Subject(subject_user, permission_registry.mask(subject_user.permissions))
+    return condition.compile()(subject, resource)
+
+
+def test_has_permission_requires_every_permission():
+    condition = has_permission("read:a", "write:a")
+    assert allows(condition, permissions=["read:a", "write:a", "other"])
+    assert not allows(condition, permissions=["read:a"])
+
+
+def test_combinators():
+    google = auth_type_is("google")
+    verified = email_verified()
+    assert allows(google & verified)
+    assert not allows(google & verified, email_verified=False)
+    assert allows(google | verified, email_verified=False)
+    assert not allows(auth_type_is("github") | ~verified)
+    assert allows(~auth_type_is("github"))
+    assert allows(always())
+
+
+def test_resource_owner_in_matches_the_owner_case_insensitively():
+    condition = resource_owner_in("Acme")
+    assert allows(condition, "acme/widgets")
+    assert not allows(condition, "other/acme")
+    assert not allows(condition, None)
+
+
+def make_engine(**conditions) -> PolicyEngine:
+    engine = PolicyEngine(ttl=60, max_entries=100)
+    for name, condition in conditions.items():
+        engine.define(name, condition)
+    engine.compile()
+    return engine
+
+
+def test_decisions_are_cached():
+    engine = make_engine(reports=has_permission("read:reports"))
+    reader = user(permissions=["read:reports"])
+    assert engine.evaluate("reports", reader)
+    assert engine.evaluate("reports", reader)
+    assert engine.stats["cache_misses"] == 1
+    assert engine.stats["cache_hits"] == 1
+
+
+def test_cached_decision_follows_permission_changes():
+    engine = make_engine(reports=has_permission("read:reports"))
+    assert not engine.evaluate("reports", user(permissions=[]))
+    assert engine.evaluate("reports", user(permissions=["read:reports"]))
+    assert not engine.evaluate("reports", user(permissions=[]))
+    assert engine.stats["cache_misses"] == 2
+
+
+def test_cached_decision_follows_email_verification_and_resource():
+    engine = make_engine(push=email_verified() & resource_owner_in("acme"))
+    assert not engine.evaluate("push", user(email_verified=False), "acme/app")
+    assert engine.evaluate("push", user(email_verified=True), "acme/app")
+    assert not engine.evaluate("push", user(email_verified=True), "other/app")
+
+
+def test_cache_is_bounded():
+    engine = PolicyEngine(ttl=60, max_entries=3)
+    engine.define("any", always())
+    for n in range(10):
+        engine.evaluate("any", user(id=f"google-oauth2|{n}"))
+    assert engine.get_stats()["cached_decisions"] == 3
+
+
+def test_unknown_policy_raises():
+    with pytest.raises(KeyError):
+        make_engine().evaluate("missing", user())
+
+
+def test_authorize_raises_403():
+    engine = make_engine(admin=has_permission("read:admin"))
+    with pytest.raises(HTTPException) as excinfo:
+        engine.authorize("admin", user())
+    assert excinfo.value.status_code == 403
+
+
+@pytest.mark.parametrize("repo, auth_type, allowed", [
+    ("acme/app", "github", True),
+    ("Partners/app", "github", True),
+    ("other/app", "github", False),
+    ("acme/app", "google", False),
+])
+def test_github_push_respects_allowed_orgs(repo, auth_type, allowed):
+    engine = make_engine(push=github_push_policy("acme, partners"))
+    assert engine.evaluate("push", user(id=f"{auth_type}|1", auth_type=auth_type), repo) is allowed
+
+
+def test_github_push_without_allowed_orgs_allows_any_repo_for_github_logins():
+    engine = make_engine(push=github_push_policy(""))
+    assert engine.evaluate("push", user(id="github|1", auth_type="github"), "anyone/app")
+    assert not engine.evaluate("push", user(), "anyone/app")
+
+
+def test_admin_policy():
+    admin = user(permissions=["read:admin"])
+    assert policy_engine.evaluate("admin", admin)
+    assert not policy_engine.evaluate("admin", user(permissions=["read:admin"], email_verified=False))
+    assert not policy_engine.evaluate("admin", user(id="github|1", auth_type="github", permissions=["read:admin"]))
@@ -0,0 +1,127 @@
+"""
+Tests for the decoded-session cache and its use by the cookie session middleware.
+"""
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import sessions
+from session_codec import CookieSessionMiddleware, SessionCodec
+from sessions import DecodedSessionCache
+
+
+class FakeClock:
+    """Stands in for the time module inside sessions."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sessions, "time", clock)
+    return clock
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = DecodedSessionCache(max_entries=10, ttl=60)
+    cache.put("cookie", {"user": {"id": "github|1"}})
+    assert cache.get("cookie").data == {"user": {"id": "github|1"}}
+    clock.now += 60
+    assert cache.get("cookie") is None
+    assert cache.stats["hits"] == 1
+    assert cache.stats["expirations"] == 1
+
+
+def test_entries_never_outlive_the_cookie(clock):
+    cache = DecodedSessionCache(max_entries=10, ttl=60)
+    entry = cache.put("cookie", {}, expires_at=clock.now + 5, signed_at=clock.now - 100)
+    assert entry.expires_at == clock.now + 5
+    assert entry.signed_at == clock.now - 100
+    clock.now += 5
+    assert cache.get("cookie") is None
+
+
+def test_cache_evicts_least_recent(clock):
+    cache = DecodedSessionCache(max_entries=2, ttl=60)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get_stats()["evictions"] == 1
+    assert cache.get_stats()["entries"] == 2
+
+
+def test_invalidate_and_sweep(clock):
+    cache = DecodedSessionCache(max_entries=10, ttl=60)
+    cache.put("written", {})
+    cache.put("idle", {})
+    cache.invalidate("written")
+    assert cache.get("written") is None
+    assert cache.stats["invalidations"] == 1
+    clock.now += 61
+    assert cache.sweep() == 1
+    assert cache.get_stats()["entries"] == 0
+
+
+def test_cookies_are_not_kept(clock):
+    cache = DecodedSessionCache(max_entries=10, ttl=60)
+    cache.put("signed-cookie", {})
+    assert all(isinstance(key, bytes) and key != b"signed-cookie" for key in cache._entries)
+
+
+def test_copies_do_not_share_nested_values():
+    entry = DecodedSessionCache(max_entries=10, ttl=60).put("cookie", {"user": {"permissions": ["read"]}})
+    copy = entry.copy_data()
+    copy["user"]["permissions"].append("write")
+    assert entry.data == {"user": {"permissions": ["read"]}}
+
+
+codec = SessionCodec("test-secret")
+cache = DecodedSessionCache(max_entries=100, ttl=60)
+app = FastAPI()
+app.add_middleware(CookieSessionMiddleware, codec=codec, cache=cache, max_age=1000)
+
+
+@app.get("/read")
+async def read(request: Request):
+    return {"user": request.session.get("user")}
+
+
+@app.get("/rename")
+async def rename(request: Request):
+    user = request.session["user"]
+    user["name"] = "Renamed"
+    request.session["user"] = user
+    return {}
+
+
+def test_repeat_requests_skip_decoding(monkeypatch):
+    cookie = codec.encode({"user": {"id": "github|1", "name": "Ada"}})
+    client = TestClient(app)
+    assert client.get("/read", headers={"Cookie": f"session={cookie}"}).json()["user"]["id"] == "github|1"
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cookie decoded twice")
+
+    monkeypatch.setattr(codec, "decode_with_timestamp", fail)
+    assert client.get("/read", headers={"Cookie": f"session={cookie}"}).json()["user"]["name"] == "Ada"
+
+
+def test_changed_session_invalidates_its_cookie():
+    cookie = codec.encode({"user": {"id": "github|2", "name": "Ada"}})
+    client = TestClient(app)
+    client.get("/read", headers={"Cookie": f"session={cookie}"})
+    assert cache.get(cookie) is not None
+
+    response = client.get("/rename", headers={"Cookie": f"session={cookie}"})
+    assert "session=" in response.headers["set-cookie"]
+    assert cache.get(cookie) is None
+    # The old cookie still decodes to the old data, not the handler's change
+    assert client.get("/read", headers={"Cookie": f"session={cookie}"}).json()["user"]["name"] == "Ada"
@@ -0,0 +1,172 @@
+"""
+Tests for the active-session index and per-user revocation generations.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from auth import verify_session
+from auth_routes import router
+from models import User
+from session_codec import CookieSessionMiddleware, SessionCodec
+from session_index import SessionIndex, session_index
+from sessions import DecodedSessionCache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SharedCache(str(tmp_path), stripes=2, max_entries=1000, mmap_size=0)
+    yield cache
+    cache.close()
+
+
+def make_index(cache, check_interval: float = 0.0, max_sessions_per_user: int = 50) -> SessionIndex:
+    return SessionIndex(
+        cache, check_interval=check_interval, max_sessions_per_user=max_sessions_per_user,
+        index_ttl=3600, generation_ttl=3600,
+    )
+
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def login(index: SessionIndex, user_id: str = "github|1", **info) -> dict:
+    return {"id": user_id, **run(index.register(user_id, info))}
+
+
+def test_new_sessions_are_not_revoked(cache):
+    index = make_index(cache)
+    session = login(index)
+    assert session["gen"] == 0
+    assert not run(index.is_revoked(session))
+    assert not run(index.is_revoked({}))
+
+
+def test_revocation_reaches_other_workers(cache):
+    worker_a, worker_b = make_index(cache), make_index(cache)
+    session = login(worker_a)
+    assert run(worker_b.revoke_user("github|1")) == 1
+    assert run(worker_a.is_revoked(session))
+    assert run(worker_b.is_revoked(session))
+    assert worker_a.stats["revoked_rejections"] == 1
+
+
+def test_logins_after_a_revocation_stay_valid(cache):
+    index = make_index(cache)
+    old = login(index)
+    run(index.revoke_user("github|1"))
+    new = login(index)
+    assert new["gen"] == 1
+    assert run(index.is_revoked(old))
+    assert not run(index.is_revoked(new))
+
+
+def test_revocation_only_affects_that_user(cache):
+    index = make_index(cache)
+    other = login(index, "github|2")
+    run(index.revoke_user("github|1"))
+    assert not run(index.is_revoked(other))
+
+
+def test_generations_are_checked_locally_within_the_interval(cache):
+    worker_a, worker_b = make_index(cache, check_interval=60), make_index(cache)
+    session = login(worker_a)
+    run(worker_b.revoke_user("github|1"))
+    # Worker A sees the revocation once its local copy is older than check_interval
+    assert not run(worker_a.is_revoked(session))
+
+
+def test_list_and_unregister_sessions(cache):
+    index = make_index(cache, max_sessions_per_user=2)
+    first = login(index, user_agent="first")
+    second = login(index, user_agent="second")
+    third = login(index, user_agent="third")
+    listed = run(index.list_sessions("github|1"))
+    assert [session["user_agent"] for session in listed] == ["second", "third"]
+
+    run(index.unregister("github|1", third["sid"]))
+    assert [session["sid"] for session in run(index.list_sessions("github|1"))] == [second["sid"]]
+    # Sessions dropped from the index are still covered by revocation
+    run(index.revoke_user("github|1"))
+    assert run(index.is_revoked(first))
+
+
+class BrokenCache:
+    """A shared cache whose disk has gone away."""
+
+    def get(self, *args):
+        raise sqlite3.OperationalError("disk I/O error")
+
+    set = delete = get
+
+
+def test_session_checks_fail_open_when_the_cache_is_unreadable():
+    index = make_index(BrokenCache())
+    session = login(index)
+    assert session["gen"] == 0
+    assert not run(index.is_revoked(session))
+    assert index.stats["cache_errors"] > 0
+
+
+def test_session_checks_keep_the_last_known_generation(cache):
+    index = make_index(cache)
+    old = login(index)
+    run(index.revoke_user("github|1"))
+    index.cache = BrokenCache()
+    assert run(index.is_revoked(old))
+
+
+@pytest.mark.parametrize("call", ["list_sessions", "revoke_user"])
+def test_admin_calls_answer_503_when_the_cache_is_unreadable(call):
+    index = make_index(BrokenCache())
+    with pytest.raises(HTTPException) as excinfo:
+        run(getattr(index, call)("github|1"))
+    assert excinfo.value.status_code == 503
+
+
+codec = SessionCodec("test-secret")
+app = FastAPI()
+app.include_router(router)
+app.add_middleware(CookieSessionMiddleware, codec=codec, cache=DecodedSessionCache(max_entries=100, ttl=60))
+
+
+@app.get("/me")
+async def me(current_user: User = Depends(verify_session)):
+    return {"id": current_user.id}
+
+
+def session_cookie(user_id: str) -> str:
+    user = {"id": user_id, **run(session_index.register(user_id, {"ip": "127.0.0.1"}))}
+    return f"session={codec.encode({'user': user})}"
+
+
+def test_logout_all_revokes_every_session_of_the_user():
+    client = TestClient(app)
+    this_device = session_cookie("github|logout-all")
+    other_device = session_cookie("github|logout-all")
+    other_user = session_cookie("github|someone-else")
+    assert client.get("/me", headers={"Cookie": other_device}).status_code == 200
+
+    response = client.post("/logout/all", headers={"Cookie": this_device})
+    assert response.json() == {"status": "success", "revoked_sessions": 2}
+    assert "expires=Thu, 01 Jan 1970" in response.headers["set-cookie"]
+
+    # Cached sessions are rejected too
+    response = client.get("/me", headers={"Cookie": other_device})
+    assert response.status_code == 401
+    assert response.json()["detail"] == "Session has been revoked"
+    assert client.get("/me", headers={"Cookie": other_user}).status_code == 200
+    assert run(session_index.list_sessions("github|logout-all")) == []
+
+
+def test_logout_drops_the_session_from_the_index():
+    client = TestClient(app)
+    cookie = session_cookie("github|logout-one")
+    session_cookie("github|logout-one")
+    client.get("/logout", headers={"Cookie": cookie}, follow_redirects=False)
+    assert len(run(session_index.list_sessions("github|logout-one"))) == 1
@@ -0,0 +1,187 @@
+"""
+Tests for server-side sessions, dirty tracking and sliding expiry.
+"""
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from session_codec import CookieSessionMiddleware, SessionCodec
+from sessions import MemorySessionBackend, ServerSessionMiddleware, Session, SharedSessionBackend, SQLiteSessionBackend
+from shared_cache import SharedCache
+
+MAX_AGE = 1000
+
+backend = MemorySessionBackend(max_entries=100)
+app = FastAPI()
+app.add_middleware(ServerSessionMiddleware, backend=backend, max_age=MAX_AGE)
+
+
+@app.get("/visit")
+async def visit(request: Request):
+    request.session["visits"] = request.session.get("visits", 0) + 1
+    return {"visits": request.session["visits"]}
+
+
+@app.get("/logout")
+async def logout(request: Request):
+    request.session.clear()
+    return {}
+
+
+@app.get("/read")
+async def read(request: Request):
+    return {"visits": request.session.get("visits", 0)}
+
+
+def age_session(session_id: str, seconds: float) -> None:
+    data, expires_at = asyncio.run(backend.get_with_expiry(session_id))
+    asyncio.run(backend.set(session_id, data, expires_at - seconds - time.time()))
+
+
+def test_new_session_sets_cookie():
+    client = TestClient(app)
+    response = client.get("/visit")
+    assert "session=" in response.headers["set-cookie"]
+
+
+def test_fresh_session_is_not_resent():
+    client = TestClient(app)
+    client.get("/visit")
+    assert "set-cookie" not in client.get("/read").headers
+    assert "set-cookie" not in client.get("/visit").headers
+
+
+def test_modified_session_past_half_life_resends_cookie():
+    client = TestClient(app)
+    client.get("/visit")
+    age_session(client.cookies["session"], MAX_AGE * 0.75)
+    response = client.get("/visit")
+    assert f"Max-Age={MAX_AGE}" in response.headers["set-cookie"]
+    _, expires_at = asyncio.run(backend.get_with_expiry(client.cookies["session"]))
+    assert expires_at - time.time() > MAX_AGE * 0.9
+
+
+def test_unmodified_session_past_half_life_resends_cookie():
+    client = TestClient(app)
+    client.get("/visit")
+    age_session(client.cookies["session"], MAX_AGE * 0.75)
+    assert f"Max-Age={MAX_AGE}" in client.get("/read").headers["set-cookie"]
+
+
+def test_session_tracks_changes():
+    session = Session({"visits": 1, "user": {"id": "github|1"}})
+    assert not session.modified
+    session.get("visits")
+    session.setdefault("visits", 5)
+    assert not session.modified
+    session.setdefault("theme", "dark")
+    assert session.modified and not session.cleared
+
+    session = Session({"visits": 1})
+    session.pop("missing", None)
+    assert not session.modified
+    session.pop("visits")
+    assert session.modified
+
+    session = Session({"visits": 1})
+    session.clear()
+    assert session.modified and session.cleared
+
+
+codec = SessionCodec("test-secret")
+cookie_app = FastAPI()
+cookie_app.add_middleware(CookieSessionMiddleware, codec=codec, max_age=MAX_AGE)
+cookie_app.get("/visit")(visit)
+cookie_app.get("/read")(read)
+
+
+def test_fresh_cookie_session_is_not_resigned():
+    cookie = codec.encode({"visits": 1})
+    assert "set-cookie" not in TestClient(cookie_app).get("/read", headers={"Cookie": f"session={cookie}"}).headers
+    response = TestClient(cookie_app).get("/visit", headers={"Cookie": f"session={cookie}"})
+    assert f"Max-Age={MAX_AGE}" in response.headers["set-cookie"]
+
+
+def test_cookie_session_past_half_life_is_resigned(monkeypatch):
+    cookie = codec.encode({"visits": 1})
+    signed_at = time.time()
+    monkeypatch.setattr(time, "time", lambda: signed_at + MAX_AGE * 0.75)
+    response = TestClient(cookie_app).get("/read", headers={"Cookie": f"session={cookie}"})
+    assert f"Max-Age={MAX_AGE}" in response.headers["set-cookie"]
+
+
+@pytest.fixture(params=["memory", "sqlite", "shared"])
+def any_backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemorySessionBackend(max_entries=100)
+    elif request.param == "sqlite":
+        sqlite_backend = SQLiteSessionBackend(str(tmp_path / "sessions.db"))
+        yield sqlite_backend
+        asyncio.run(sqlite_backend.close())
+    else:
+        cache = SharedCache(str(tmp_path), stripes=2, max_entries=100, mmap_size=0)
+        yield SharedSessionBackend(cache)
+        cache.close()
+
+
+def test_backend_round_trip(any_backend):
+    asyncio.run(any_backend.set("sid", {"user": {"id": "github|1"}}, 60))
+    assert asyncio.run(any_backend.get("sid")) == {"user": {"id": "github|1"}}
+    data, expires_at = asyncio.run(any_backend.get_with_expiry("sid"))
+    assert 59 < expires_at - time.time() <= 60
+    assert asyncio.run(any_backend.get("unknown")) is None
+
+    asyncio.run(any_backend.delete("sid"))
+    assert asyncio.run(any_backend.get("sid")) is None
+
+
+def test_backend_drops_expired_sessions(any_backend):
+    asyncio.run(any_backend.set("sid", {"visits": 1}, -1))
+    assert asyncio.run(any_backend.get("sid")) is None
+
+
+def test_backend_sweep_reclaims_expired_sessions(any_backend, monkeypatch):
+    asyncio.run(any_backend.set("short", {}, 5))
+    asyncio.run(any_backend.set("long", {}, 60))
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 10)
+    swept = any_backend.sweep()
+    # The shared cache purges expired entries itself, outside the sweep
+    assert swept == (0 if isinstance(any_backend, SharedSessionBackend) else 1)
+    assert asyncio.run(any_backend.get("long")) == {}
+    if isinstance(any_backend, MemorySessionBackend):
+        assert list(any_backend._entries) == ["long"]
+
+
+def test_memory_backend_evicts_least_recent():
+    memory = MemorySessionBackend(max_entries=2)
+    for session_id in ("a", "b", "c"):
+        asyncio.run(memory.set(session_id, {}, 60))
+    assert asyncio.run(memory.get("a")) is None
+    assert asyncio.run(memory.get("c")) == {}
+
+
+def test_cookie_carries_only_an_opaque_id():
+    client = TestClient(app)
+    client.get("/visit")
+    session_id = client.cookies["session"]
+    assert "visits" not in session_id
+    assert asyncio.run(backend.get(session_id)) == {"visits": 1}
+
+
+def test_unknown_session_id_starts_a_new_session():
+    response = TestClient(app).get("/visit", headers={"Cookie": "session=forged-id"})
+    assert response.json() == {"visits": 1}
+    assert "session=forged-id" not in response.headers["set-cookie"]
+
+
+def test_cleared_session_is_deleted_server_side():
+    client = TestClient(app)
+    client.get("/visit")
+    session_id = client.cookies["session"]
+    response = client.get("/logout")
+    assert "expires=Thu, 01 Jan 1970" in response.headers["set-cookie"]
+    assert asyncio.run(backend.get(session_id)) is None
@@ -0,0 +1,112 @@
+"""
+Tests for the striped SQLite cache shared between workers.
+"""
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = SharedCache(str(tmp_path), stripes=4, max_entries=1000, mmap_size=0)
+    yield cache
+    cache.close()
+
+
+def test_round_trips_json_values(cache):
+    cache.set("user:1", {"name": "Ada", "roles": ["admin"]}, ttl=60)
+    assert cache.get("user:1") == {"name": "Ada", "roles": ["admin"]}
+    value, expires_at = cache.get_with_expiry("user:1")
+    assert 59 < expires_at - time.time() <= 60
+    assert cache.get("missing") is None
+    assert cache.stats["hits"] == 2
+    assert cache.stats["misses"] == 1
+
+
+def test_expired_entries_are_not_served(cache):
+    cache.set("gone", 1, ttl=-1)
+    assert cache.get("gone") is None
+
+
+def test_delete(cache):
+    cache.set("key", 1, ttl=60)
+    cache.delete("key")
+    assert cache.get("key") is None
+
+
+def test_entries_are_shared_between_instances(cache, tmp_path):
+    other_worker = SharedCache(str(tmp_path), stripes=4, max_entries=1000, mmap_size=0)
+    try:
+        cache.set("key", "from the first worker", ttl=60)
+        assert other_worker.get("key") == "from the first worker"
+    finally:
+        other_worker.close()
+
+
+def test_keys_spread_over_stripes(cache):
+    for n in range(100):
+        cache.set(f"key:{n}", n, ttl=60)
+    assert all(stripe.writes > 0 for stripe in cache._stripes)
+
+
+def test_purge_expired_returns_the_number_removed(cache):
+    for n in range(10):
+        cache.set(f"old:{n}", n, ttl=-1)
+    cache.set("live", 1, ttl=60)
+    assert cache.purge_expired() == 10
+    assert cache.purge_expired() == 0
+    assert cache.get("live") == 1
+    assert cache.stats["expirations"] == 10
+
+
+def test_trim_evicts_the_entries_closest_to_expiry(tmp_path):
+    cache = SharedCache(str(tmp_path), stripes=1, max_entries=5, mmap_size=0, trim_interval=10)
+    try:
+        for n in range(10):
+            cache.set(f"key:{n}", n, ttl=100 + n)
+        # The tenth write trims the stripe back to max_entries
+        assert cache.stats["evictions"] == 5
+        assert [cache.get(f"key:{n}") for n in range(10)] == [None] * 5 + [5, 6, 7, 8, 9]
+    finally:
+        cache.close()
+
+
+def hold_write_lock(cache: SharedCache, key: str, seconds: float) -> threading.Thread:
+    """Hold the write lock of `key`'s stripe from another connection, as another worker would."""
+    cache.set(key, "before", ttl=60)
+    other = sqlite3.connect(cache._stripe(key).path, check_same_thread=False, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    locked = threading.Event()
+
+    def release():
+        locked.set()
+        time.sleep(seconds)
+        other.execute("ROLLBACK")
+        other.close()
+
+    thread = threading.Thread(target=release)
+    thread.start()
+    locked.wait()
+    return thread
+
+
+def test_busy_stripe_is_retried(cache):
+    thread = hold_write_lock(cache, "key", 0.05)
+    cache.set("key", "after", ttl=60)
+    thread.join()
+    assert cache.get("key") == "after"
+    assert cache.stats["lock_contention"] > 0
+
+
+def test_busy_stripe_gives_up_after_the_timeout(cache, monkeypatch):
+    monkeypatch.setattr(SharedCache, "BUSY_TIMEOUT", 0.05)
+    thread = hold_write_lock(cache, "key", 0.3)
+    try:
+        with pytest.raises(sqlite3.OperationalError):
+            cache.set("key", "after", ttl=60)
+    finally:
+        thread.join()
@@ -0,0 +1,153 @@
+"""
+Tests for the hierarchical timing wheel and the expiry sweeper.
+"""
+import asyncio
+import math
+import random
+import threading
+
+import pytest
+
+from timing_wheel import ExpirySweeper, TimingWheel
+
+
+def expiry_ticks(wheel: TimingWheel, until: int, step: int = 1) -> dict:
+    """Advance the wheel `step` ticks at a time up to `until`, returning key -> tick it expired at."""
+    expired_at = {}
+    for now in range(wheel._current + step, until + 1, step):
+        for key in wheel.advance(now):
+            expired_at[key] = now
+    return expired_at
+
+
+def test_expires_at_the_deadline_tick():
+    wheel = TimingWheel(0)
+    wheel.schedule("a", 3)
+    wheel.schedule("b", 2.5)
+    assert wheel.advance(1) == []
+    assert wheel.advance(2) == []
+    assert sorted(wheel.advance(3)) == ["a", "b"]
+    assert len(wheel) == 0
+
+
+@pytest.mark.parametrize("deadline", [1, 3, 4, 5, 15, 16, 17, 63, 64, 65, 100])
+def test_deadlines_across_levels(deadline):
+    # 4 slots, 3 levels: 4, 16 and 64 ticks per level
+    wheel = TimingWheel(0, slots=4, levels=3)
+    wheel.schedule("key", deadline)
+    assert expiry_ticks(wheel, 200) == {"key": deadline}
+    assert wheel.stats["expired"] == 1
+
+
+def test_deadline_beyond_the_wheel_span_is_parked():
+    wheel = TimingWheel(0, slots=4, levels=2)
+    wheel.schedule("far", 50)
+    assert expiry_ticks(wheel, 60) == {"far": 50}
+
+
+def test_past_and_current_deadlines_expire_on_the_next_tick():
+    wheel = TimingWheel(10)
+    wheel.schedule("past", 3)
+    wheel.schedule("now", 10)
+    assert sorted(wheel.advance(11)) == ["now", "past"]
+
+
+def test_cancel():
+    wheel = TimingWheel(0, slots=4, levels=3)
+    wheel.schedule("kept", 20)
+    wheel.schedule("cancelled", 20)
+    wheel.cancel("cancelled")
+    wheel.cancel("never-scheduled")
+    assert "cancelled" not in wheel
+    assert expiry_ticks(wheel, 30) == {"kept": 20}
+    assert wheel.stats["cancelled"] == 1
+
+
+def test_rescheduling_replaces_the_deadline():
+    wheel = TimingWheel(0, slots=4, levels=3)
+    wheel.schedule("key", 5)
+    wheel.schedule("key", 40)
+    assert len(wheel) == 1
+    assert expiry_ticks(wheel, 50) == {"key": 40}
+
+
+def test_large_jump_expires_everything_due():
+    wheel = TimingWheel(0, slots=4, levels=3)
+    for n in range(1, 20):
+        wheel.schedule(n, n * 10)
+    # Far more ticks than slots or keys: the wheel is rebuilt instead of ticked
+    expired = wheel.advance(95)
+    assert sorted(expired) == list(range(1, 10))
+    assert expiry_ticks(wheel, 200) == {n: n * 10 for n in range(10, 20)}
+
+
+def test_advancing_an_empty_wheel_skips_ahead():
+    wheel = TimingWheel(0)
+    assert wheel.advance(10 ** 9) == []
+    wheel.schedule("key", 10 ** 9 + 5)
+    assert expiry_ticks(wheel, 10 ** 9 + 10) == {"key": 10 ** 9 + 5}
+
+
+def test_non_unit_ticks_round_deadlines_up():
+    wheel = TimingWheel(0, tick=0.5)
+    wheel.schedule("key", 1.2)
+    assert wheel.advance(1.4) == []
+    assert wheel.advance(1.5) == ["key"]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_schedules_never_expire_early_or_late(seed):
+    rng = random.Random(seed)
+    wheel = TimingWheel(rng.randint(0, 1000), slots=4, levels=3)
+    now = wheel._current
+    # key -> tick it is due at; deadlines already passed are due on the next tick
+    due = {}
+    for _ in range(500):
+        action = rng.random()
+        if action < 0.5:
+            key = rng.randint(0, 50)
+            deadline = now + rng.uniform(-5, 150)
+            wheel.schedule(key, deadline)
+            due[key] = max(math.ceil(deadline), now + 1)
+        elif action < 0.6 and due:
+            key = rng.choice(sorted(due))
+            wheel.cancel(key)
+            del due[key]
+        else:
+            previous, now = now, now + rng.choice([1, 1, 2, 3, 7, 20, 200])
+            expired = wheel.advance(now)
+            assert all(previous < due[key] <= now for key in expired)
+            for key in expired:
+                del due[key]
+            assert all(tick > now for tick in due.values())
+            assert len(wheel) == len(due)
+
+
+def test_sweeper_runs_registered_sweeps_and_counts_them():
+    sweeper = ExpirySweeper(interval=1)
+    sweeper.register("a", lambda: 3)
+    sweeper.register("b", lambda: 2)
+    assert asyncio.run(sweeper.sweep()) == 5
+    assert sweeper.get_stats()["reclaimed_by_cache"] == {"a": 3, "b": 2}
+
+
+def test_sweeper_isolates_failing_sweeps():
+    sweeper = ExpirySweeper(interval=1)
+    sweeper.register("broken", lambda: 1 / 0)
+    sweeper.register("fine", lambda: 1)
+    assert asyncio.run(sweeper.sweep()) == 1
+
+
+def test_sweeper_honours_per_sweep_intervals_and_blocking():
+    sweeper = ExpirySweeper(interval=1)
+    threads = []
+
+    def disk_sweep() -> int:
+        threads.append(threading.current_thread())
+        return 1
+
+    sweeper.register("disk", disk_sweep, interval=3600, blocking=True)
+    assert asyncio.run(sweeper.sweep()) == 1
+    assert asyncio.run(sweeper.sweep()) == 0
+    assert threads == [threads[0]]
+    assert threads[0] is not threading.main_thread()
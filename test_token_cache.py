@@ -0,0 +1,246 @@
+"""
+Tests for the verified-token, rejected-token and userinfo caches.
+"""
+import asyncio
+
+import pytest
+
+import token_cache
+from token_cache import RejectedTokenCache, UserInfoCache, VerifiedTokenCache
+
+
+class FakeClock:
+    """Stands in for the time module inside token_cache."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+    monotonic = time
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(token_cache, "time", clock)
+    return clock
+
+
+def test_verified_claims_are_cached_until_exp(clock):
+    cache = VerifiedTokenCache(max_entries=10, max_bytes=10_000, max_ttl=3600)
+    cache.put("token", {"sub": "github|1", "exp": clock.now + 60})
+    assert cache.get("token") == {"sub": "github|1", "exp": clock.now + 60}
+    clock.now += 60
+    assert cache.get("token") is None
+    assert cache.stats["expirations"] == 1
+
+
+def test_entries_never_outlive_max_ttl(clock):
+    cache = VerifiedTokenCache(max_entries=10, max_bytes=10_000, max_ttl=30)
+    cache.put("token", {"sub": "github|1", "exp": clock.now + 3600})
+    clock.now += 30
+    assert cache.get("token") is None
+
+
+def test_expired_tokens_are_not_cached(clock):
+    cache = VerifiedTokenCache(max_entries=10, max_bytes=10_000, max_ttl=3600)
+    cache.put("token", {"sub": "github|1", "exp": clock.now - 1})
+    assert len(cache) == 0
+
+
+def test_least_recently_used_entries_are_evicted(clock):
+    cache = VerifiedTokenCache(max_entries=2, max_bytes=10_000, max_ttl=3600)
+    cache.put("a", {"sub": "a"})
+    cache.put("b", {"sub": "b"})
+    cache.get("a")
+    cache.put("c", {"sub": "c"})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"sub": "a"}
+    assert cache.stats["evictions"] == 1
+
+
+def test_cache_is_bounded_by_bytes(clock):
+    cache = VerifiedTokenCache(max_entries=100, max_bytes=3 * (VerifiedTokenCache.ENTRY_OVERHEAD + 40), max_ttl=3600)
+    for n in range(10):
+        cache.put(f"token-{n}", {"sub": f"github|{n}", "pad": "x" * 10})
+    assert cache.get_stats()["bytes"] <= cache.max_bytes
+    assert len(cache) == 3
+    # Claims too large for the whole cache are never stored
+    cache.put("huge", {"sub": "x" * cache.max_bytes})
+    assert cache.get("huge") is None
+
+
+def test_invalidate_and_sweep(clock):
+    cache = VerifiedTokenCache(max_entries=10, max_bytes=10_000, max_ttl=3600)
+    cache.put("revoked", {"sub": "a"})
+    cache.put("short", {"sub": "b", "exp": clock.now + 5})
+    assert cache.invalidate("revoked")
+    assert not cache.invalidate("revoked")
+    clock.now += 10
+    assert cache.sweep() == 1
+    assert len(cache) == 0
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_raw_tokens_are_not_kept(clock):
+    cache = VerifiedTokenCache(max_entries=10, max_bytes=10_000, max_ttl=3600)
+    cache.put("secret-token", {"sub": "a"})
+    assert all(key != "secret-token" and isinstance(key, bytes) for key in cache._entries)
+
+
+def test_rejections_are_remembered_for_ttl(clock):
+    cache = RejectedTokenCache(max_entries=10, ttl=30)
+    cache.put("forged", "Invalid signature")
+    assert cache.get("forged") == "Invalid signature"
+    assert cache.get("other") is None
+    clock.now += 30
+    assert cache.get("forged") is None
+    assert cache.stats == {"hits": 1, "misses": 2, "rejections_recorded": 1, "evictions": 0, "expirations": 1}
+
+
+def test_rejections_are_scoped(clock):
+    cache = RejectedTokenCache(max_entries=10, ttl=30)
+    cache.put("opaque", "Not a JWT")
+    # A token that failed local verification may still be valid at /userinfo
+    assert cache.get("opaque", scope="userinfo") is None
+    cache.put("opaque", "Userinfo rejected", scope="userinfo")
+    assert cache.get("opaque") == "Not a JWT"
+    assert cache.get("opaque", scope="userinfo") == "Userinfo rejected"
+    assert cache.invalidate("opaque", scope="userinfo")
+    assert cache.get("opaque") == "Not a JWT"
+
+
+def test_rejected_cache_evicts_least_recent(clock):
+    cache = RejectedTokenCache(max_entries=2, ttl=30)
+    for token in ("a", "b", "c"):
+        cache.put(token, "bad")
+    assert len(cache) == 2
+    assert cache.get("a") is None
+    assert cache.get("c") == "bad"
+    assert cache.stats["evictions"] == 1
+    # Disabled when max_entries is 0
+    disabled = RejectedTokenCache(max_entries=0, ttl=30)
+    disabled.put("a", "bad")
+    assert len(disabled) == 0
+
+
+def test_rejected_cache_sweep(clock):
+    cache = RejectedTokenCache(max_entries=10, ttl=30)
+    cache.put("early", "bad")
+    clock.now += 20
+    cache.put("late", "bad")
+    clock.now += 15
+    assert cache.sweep() == 1
+    assert cache.get("late") == "bad"
+    clock.now += 20
+    assert cache.sweep() == 1
+    assert len(cache) == 0
+    assert cache.get_stats()["expirations"] == 2
+
+
+class UserInfoEndpoint:
+    """A fetch function that blocks until released and counts its calls."""
+
+    def __init__(self, error: Exception = None):
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return {"sub": "github|1", "call": self.calls}
+
+
+def test_concurrent_userinfo_lookups_share_one_fetch(clock):
+    cache = UserInfoCache(max_entries=10, ttl=60)
+
+    async def scenario():
+        endpoint = UserInfoEndpoint()
+        callers = [asyncio.ensure_future(cache.get_or_fetch("token", endpoint)) for _ in range(10)]
+        await asyncio.sleep(0)
+        assert cache.get_stats()["in_flight"] == 1
+        endpoint.release.set()
+        results = await asyncio.gather(*callers)
+        assert endpoint.calls == 1
+        assert await cache.get_or_fetch("token", endpoint) is results[0]
+        return results
+
+    assert asyncio.run(scenario()) == [{"sub": "github|1", "call": 1}] * 10
+    assert cache.stats == {"hits": 1, "misses": 1, "coalesced": 9, "fetch_errors": 0, "evictions": 0, "expirations": 0}
+    assert cache.get_stats()["in_flight"] == 0
+
+
+def test_cancelled_first_caller_does_not_cancel_the_fetch(clock):
+    cache = UserInfoCache(max_entries=10, ttl=60)
+
+    async def scenario():
+        endpoint = UserInfoEndpoint()
+        first = asyncio.ensure_future(cache.get_or_fetch("token", endpoint))
+        second = asyncio.ensure_future(cache.get_or_fetch("token", endpoint))
+        await asyncio.sleep(0)
+        first.cancel()
+        endpoint.release.set()
+        assert await second == {"sub": "github|1", "call": 1}
+        assert first.cancelled()
+
+        # With every caller gone, the fetch still completes and is cached
+        alone = asyncio.ensure_future(cache.get_or_fetch("other", endpoint))
+        await asyncio.sleep(0)
+        alone.cancel()
+        await asyncio.sleep(0.01)
+        assert await cache.get_or_fetch("other", endpoint) == {"sub": "github|1", "call": 2}
+        return endpoint.calls
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_userinfo_failures_are_not_cached(clock):
+    cache = UserInfoCache(max_entries=10, ttl=60)
+
+    async def scenario():
+        failing = UserInfoEndpoint(error=RuntimeError("Auth0 unavailable"))
+        failing.release.set()
+        callers = [cache.get_or_fetch("token", failing) for _ in range(3)]
+        results = await asyncio.gather(*callers, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert failing.calls == 1
+
+        working = UserInfoEndpoint()
+        working.release.set()
+        return await cache.get_or_fetch("token", working)
+
+    assert asyncio.run(scenario()) == {"sub": "github|1", "call": 1}
+    assert cache.stats["fetch_errors"] == 1
+    assert cache.stats["misses"] == 2
+
+
+def test_userinfo_is_cached_for_ttl(clock):
+    cache = UserInfoCache(max_entries=2, ttl=60)
+
+    async def lookup(token):
+        endpoint = UserInfoEndpoint()
+        endpoint.release.set()
+        return await cache.get_or_fetch(token, endpoint)
+
+    asyncio.run(lookup("a"))
+    clock.now += 59
+    asyncio.run(lookup("a"))
+    assert cache.stats["hits"] == 1
+    clock.now += 1
+    asyncio.run(lookup("a"))
+    assert cache.stats["expirations"] == 1
+    assert cache.stats["misses"] == 2
+
+    asyncio.run(lookup("b"))
+    asyncio.run(lookup("c"))
+    assert len(cache) == 2
+    assert cache.stats["evictions"] == 1
+    assert cache.invalidate("c")
+    clock.now += 60
+    assert cache.sweep() == 1
+    assert len(cache) == 0
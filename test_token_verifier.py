@@ -0,0 +1,71 @@
+"""
+Tests for running signature verification inline, on threads or on processes.
+"""
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from jose import JWTError
+
+from conftest import public_jwk
+from jwks import jwks_store
+from verifier import TokenVerifier
+
+pytestmark = pytest.mark.usefixtures("signing_key")
+
+
+def verify_with(verifier: TokenVerifier, token: str) -> dict:
+    key_data = public_jwk()
+    return asyncio.run(verifier.verify(token, "test-key", jwks_store.get_cached_key("test-key"), key_data))
+
+
+@pytest.fixture(params=["inline", "thread", "process"])
+def verifier(request):
+    verifier = TokenVerifier(request.param, max_workers=2, queue_size=4)
+    verifier.start({"test-key": public_jwk()})
+    yield verifier
+    verifier.stop()
+
+
+def test_valid_token_is_verified(verifier, make_token):
+    assert verify_with(verifier, make_token())["sub"] == "github|583231"
+
+
+def test_invalid_token_raises_jwt_error(verifier, make_token):
+    with pytest.raises(JWTError):
+        verify_with(verifier, make_token(aud="https://other-api.example.com"))
+
+
+def test_process_workers_build_keys_rotated_in_after_start(make_token):
+    verifier = TokenVerifier("process", max_workers=1, queue_size=1)
+    verifier.start({})
+    try:
+        assert verify_with(verifier, make_token())["sub"] == "github|583231"
+    finally:
+        verifier.stop()
+
+
+def test_pool_stats_track_completed_and_failed(make_token):
+    verifier = TokenVerifier("thread", max_workers=1, queue_size=1)
+    try:
+        verify_with(verifier, make_token())
+        with pytest.raises(JWTError):
+            verify_with(verifier, make_token(exp=1))
+    finally:
+        verifier.stop()
+    stats = verifier.get_stats()
+    assert (stats["submitted"], stats["completed"], stats["failed"], stats["pending"]) == (2, 1, 1, 0)
+
+
+def test_full_queue_is_rejected_with_503(make_token, monkeypatch):
+    verifier = TokenVerifier("thread", max_workers=1, queue_size=1)
+    monkeypatch.setattr(verifier, "_pending", verifier.max_pending)
+    with pytest.raises(HTTPException) as excinfo:
+        verify_with(verifier, make_token())
+    assert excinfo.value.status_code == 503
+    assert verifier.stats["rejected"] == 1
+
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        TokenVerifier("gpu", max_workers=1, queue_size=1)
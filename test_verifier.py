@@ -0,0 +1,125 @@
+"""
+Tests for local access token verification: signature plus required claims.
+"""
+import asyncio
+import time
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+
+from auth import decode_access_token, verify_bearer
+from config import settings
+from conftest import public_jwk
+from jwks import jwks_store
+from models import User
+from token_cache import rejected_token_cache
+
+pytestmark = pytest.mark.usefixtures("signing_key")
+
+app = FastAPI()
+
+
+@app.get("/me")
+async def me(user: User = Depends(verify_bearer)):
+    return user.model_dump()
+
+
+client = TestClient(app)
+
+
+def verify(token: str) -> dict:
+    return asyncio.run(decode_access_token(token))
+
+
+def test_valid_token_is_accepted(make_token):
+    assert verify(make_token())["sub"] == "github|583231"
+
+
+@pytest.mark.parametrize("claim", ["aud", "exp"])
+def test_token_without_required_claim_is_rejected(make_token, claim):
+    with pytest.raises(HTTPException) as excinfo:
+        verify(make_token(**{claim: None}))
+    assert excinfo.value.status_code == 401
+
+
+def test_token_for_another_audience_is_rejected(make_token):
+    with pytest.raises(HTTPException) as excinfo:
+        verify(make_token(aud="https://other-api.example.com"))
+    assert excinfo.value.status_code == 401
+
+
+def test_unknown_key_rejection_is_not_cached(make_token, monkeypatch):
+    # A token signed with a key rotated in after the last JWKS fetch, while the refetch gate is closed
+    token = make_token(kid="rotated-key")
+    monkeypatch.setattr(jwks_store, "_last_attempt", time.monotonic())
+    with pytest.raises(HTTPException) as excinfo:
+        verify(token)
+    assert excinfo.value.detail == "Unknown signing key"
+    assert rejected_token_cache.get(token) is None
+
+    jwks_store.load({"keys": [public_jwk("rotated-key")]})
+    assert verify(token)["sub"] == "github|583231"
+
+
+def test_invalid_token_rejection_is_cached(make_token):
+    token = make_token(aud="https://other-api.example.com")
+    with pytest.raises(HTTPException):
+        verify(token)
+    assert rejected_token_cache.get(token) is not None
+
+
+def test_bearer_dependency_builds_the_user(make_token):
+    token = make_token(permissions=["read:reports"], email="ada@example.com", email_verified=True)
+    response = client.get("/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": "github|583231",
+        "email": "ada@example.com",
+        "name": None,
+        "picture": None,
+        "auth_type": "github",
+        "permissions": ["read:reports"],
+        "email_verified": True,
+    }
+
+
+def test_bearer_dependency_requires_a_token():
+    response = client.get("/me")
+    assert response.status_code == 401
+    assert response.headers["www-authenticate"] == "Bearer"
+
+
+@pytest.mark.parametrize("overrides, detail", [
+    ({"exp": int(time.time()) - 60}, "Could not validate credentials"),
+    ({"iss": "https://someone-else.auth0.com/"}, "Could not validate credentials"),
+    ({"sub": None}, "Token has no subject"),
+    ({"kid": "unknown-key"}, "Unknown signing key"),
+])
+def test_bearer_dependency_rejects_invalid_tokens(make_token, monkeypatch, overrides, detail):
+    # Keep unknown key IDs from triggering a JWKS refetch
+    monkeypatch.setattr(jwks_store, "_last_attempt", time.monotonic())
+    response = client.get("/me", headers={"Authorization": f"Bearer {make_token(**overrides)}"})
+    assert response.status_code == 401
+    assert response.json()["detail"] == detail
+
+
+def test_token_signed_with_another_key_is_rejected(make_token):
+    other_key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    claims = jwt.get_unverified_claims(make_token())
+    forged = jwt.encode(claims, other_key.decode(), algorithm="RS256", headers={"kid": "test-key"})
+    with pytest.raises(HTTPException) as excinfo:
+        verify(forged)
+    assert excinfo.value.status_code == 401
+
+
+def test_symmetric_tokens_are_rejected():
+    token = jwt.encode({"sub": "github|1", "aud": settings.AUTH0_AUDIENCE}, "secret", algorithm="HS256")
+    with pytest.raises(HTTPException) as excinfo:
+        verify(token)
+    assert excinfo.value.detail == "Unsupported token algorithm"
@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import settings
+
+# Set up logging
+logger = logging.getLogger("timing_wheel")
+
+
+class TimingWheel:
+    """
+    Hierarchical timing wheel of expiry deadlines.
+
+    Level 0 has `slots` buckets of one `tick` each; every level above covers
+    `slots` times the span of the one below, so four levels of 64 one-second
+    slots cover about 194 days. Scheduling and cancelling are O(1), and each
+    key is moved down a level at most `levels - 1` times before it expires, so
+    reclaiming expired keys is amortized O(1) per key instead of a scan of the
+    cache. Deadlines beyond the top level wait in its farthest slot and are
+    re-scheduled when it comes round.
+
+    The wheel only tracks keys and deadlines, in whatever clock the owner uses
+    (time.time() or time.monotonic()); the owner removes the entries advance()
+    reports. Deadlines are rounded up to the next tick, so owners should keep
+    checking expiry on lookup for entries that are at most one tick overdue.
+    """
+
+    def __init__(self, start: float, tick: float = 1.0, slots: int = 64, levels: int = 4):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._current = int(start // tick)
+        self._buckets: List[List[Dict[Hashable, int]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # key -> (level, slot, deadline in ticks)
+        self._locations: Dict[Hashable, Tuple[int, int, int]] = {}
+        self.stats = {"scheduled": 0, "cancelled": 0, "expired": 0, "cascaded": 0}
+
+    def __len__(self) -> int:
+        return len(self._locations)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._locations
+
+    def schedule(self, key: Hashable, deadline: float) -> None:
+        """Schedule `key` to expire at `deadline`, replacing any earlier deadline."""
+        self._discard(key)
+        self._place(key, math.ceil(deadline / self.tick))
+        self.stats["scheduled"] += 1
+
+    def cancel(self, key: Hashable) -> None:
+        if self._discard(key):
+            self.stats["cancelled"] += 1
+
+    def advance(self, now: float) -> List[Hashable]:
+        """Move the wheel to `now` and return the keys whose deadline has passed."""
+        target = int(now // self.tick)
+        if target - self._current > max(self.slots, len(self._locations)):
+            # Far behind (e.g. the process was suspended): re-placing every key is cheaper than ticking
+            return self._jump(target)
+        expired: List[Hashable] = []
+        while self._current < target:
+            if not self._locations:
+                self._current = target
+                break
+            self._current += 1
+            # Move keys down from every level whose slot boundary was just crossed
+            for level in range(self.levels - 1, 0, -1):
+                if self._current % self._spans[level] == 0:
+                    self._cascade(level, (self._current // self._spans[level]) % self.slots)
+            bucket = self._buckets[0][self._current % self.slots]
+            if bucket:
+                self._buckets[0][self._current % self.slots] = {}
+                for key, deadline in bucket.items():
+                    if deadline > self._current:
+                        # Parked beyond the wheel's span; not due yet
+                        self._place(key, deadline)
+                    else:
+                        del self._locations[key]
+                        expired.append(key)
+        self.stats["expired"] += len(expired)
+        return expired
+
+    def _jump(self, target: int) -> List[Hashable]:
+        pending = [(key, deadline) for key, (_, _, deadline) in self._locations.items()]
+        self._buckets = [[{} for _ in range(self.slots)] for _ in range(self.levels)]
+        self._locations = {}
+        self._current = target
+        expired = []
+        for key, deadline in pending:
+            if deadline <= target:
+                expired.append(key)
+            else:
+                self._place(key, deadline)
+        self.stats["expired"] += len(expired)
+        return expired
+
+    def _place(self, key: Hashable, deadline: int, cascading: bool = False) -> None:
+        delta = deadline - self._current
+        if delta < 0 or (delta == 0 and not cascading):
+            # Already due: expire on the next tick
+            level, slot = 0, (self._current + 1) % self.slots
+        elif delta == 0:
+            # Cascaded into the slot that is about to be expired
+            level, slot = 0, self._current % self.slots
+        else:
+            # Beyond the top level, park in its farthest slot until it comes round
+            position = min(deadline, self._current + self._spans[self.levels] - 1)
+            level = 0
+            while position - self._current >= self._spans[level + 1]:
+                level += 1
+            slot = (position // self._spans[level]) % self.slots
+        self._buckets[level][slot][key] = deadline
+        self._locations[key] = (level, slot, deadline)
+
+    def _discard(self, key: Hashable) -> bool:
+        location = self._locations.pop(key, None)
+        if location is None:
+            return False
+        level, slot, _ = location
+        del self._buckets[level][slot][key]
+        return True
+
+    def _cascade(self, level: int, slot: int) -> None:
+        bucket = self._buckets[level][slot]
+        if not bucket:
+            return
+        self._buckets[level][slot] = {}
+        for key, deadline in bucket.items():
+            self._place(key, deadline, cascading=True)
+        self.stats["cascaded"] += len(bucket)
+
+    def get_stats(self) -> dict:
+        return {**self.stats, "pending": len(self._locations)}
+
+
+class ExpirySweeper:
+    """
+    Background task that advances the timing wheels of registered caches every
+    `interval` seconds, so expired entries are reclaimed even if they are never
+    looked up again.
+
+    Sweeps registered as `blocking` (on-disk stores) run in a worker thread,
+    and a sweep registered with its own `interval` runs at most that often.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._sweeps: Dict[str, Tuple[Callable[[], int], Optional[float], bool]] = {}
+        self._last_run: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"sweeps": 0, "reclaimed": 0, "sweep_time_total": 0.0, "sweep_time_max": 0.0}
+        self.reclaimed: Dict[str, int] = {}
+
+    def register(
+        self,
+        name: str,
+        sweep: Callable[[], int],
+        interval: Optional[float] = None,
+        blocking: bool = False,
+    ) -> None:
+        """Register a callable that removes expired entries and returns how many it removed."""
+        self._sweeps[name] = (sweep, interval, blocking)
+        self.reclaimed.setdefault(name, 0)
+
+    async def sweep(self) -> int:
+        started = time.perf_counter()
+        total = 0
+        for name, (sweep, interval, blocking) in self._sweeps.items():
+            now = time.monotonic()
+            if interval is not None and now - self._last_run.get(name, -math.inf) < interval:
+                continue
+            self._last_run[name] = now
+            try:
+                reclaimed = await asyncio.to_thread(sweep) if blocking else sweep()
+            except Exception as e:
+                logger.error(f"Error sweeping {name}: {str(e)}", exc_info=True)
+                continue
+            self.reclaimed[name] += reclaimed
+            total += reclaimed
+        elapsed = time.perf_counter() - started
+        self.stats["sweeps"] += 1
+        self.stats["reclaimed"] += total
+        self.stats["sweep_time_total"] += elapsed
+        self.stats["sweep_time_max"] = max(self.stats["sweep_time_max"], elapsed)
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.sweep()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self._task = None
+
+    def get_stats(self) -> dict:
+        sweeps = self.stats["sweeps"]
+        return {
+            **self.stats,
+            "sweep_time_avg": self.stats["sweep_time_total"] / sweeps if sweeps else 0.0,
+            "reclaimed_by_cache": dict(self.reclaimed),
+        }
+
+
+expiry_sweeper = ExpirySweeper(interval=settings.EXPIRY_SWEEP_INTERVAL)
@@ -0,0 +1,319 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import settings
+from timing_wheel import TimingWheel
+
+
+def token_digest(token: str) -> bytes:
+    """Digest used as the cache key, so raw tokens are never kept in memory."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+class VerifiedTokenCache:
+    """
+    LRU cache of verified access token claims, keyed by a digest of the raw token.
+
+    An entry never outlives the token's own exp claim (nor max_ttl seconds),
+    and the cache is bounded both by entry count and by an estimate of the
+    memory used by the cached claims. Expired entries are reclaimed by sweep(),
+    driven by a timing wheel, even if they are never looked up again.
+    """
+
+    # Rough per-entry overhead: digest, tuple, OrderedDict node and dict header
+    ENTRY_OVERHEAD = 200
+
+    def __init__(self, max_entries: int, max_bytes: int, max_ttl: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_ttl = max_ttl
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._wheel = TimingWheel(time.time())
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str) -> Optional[dict]:
+        """Return cached claims for a token, or None if it has to be verified."""
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        claims, expires_at, size = entry
+        if time.time() >= expires_at:
+            self._remove(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return claims
+
+    def put(self, token: str, claims: dict) -> None:
+        """Cache verified claims until the token expires."""
+        if self.max_entries <= 0:
+            return
+        expires_at = time.time() + self.max_ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        if expires_at <= time.time():
+            return
+
+        size = len(json.dumps(claims, default=str)) + self.ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+
+        key = token_digest(token)
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (claims, expires_at, size)
+        self._bytes += size
+        self._wheel.schedule(key, expires_at)
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, token: str) -> bool:
+        """Drop a token from the cache, e.g. after it has been revoked."""
+        key = token_digest(token)
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        self.stats["invalidations"] += 1
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+        self._wheel = TimingWheel(time.time())
+
+    def sweep(self) -> int:
+        """Remove entries whose expiry has passed; returns how many were removed."""
+        expired = self._wheel.advance(time.time())
+        for key in expired:
+            self._remove(key)
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def _remove(self, key: bytes) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+        self._wheel.cancel(key)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+        }
+
+
+token_cache = VerifiedTokenCache(
+    max_entries=settings.TOKEN_CACHE_MAX_ENTRIES,
+    max_bytes=settings.TOKEN_CACHE_MAX_BYTES,
+    max_ttl=settings.TOKEN_CACHE_MAX_TTL,
+)
+
+
+class RejectedTokenCache:
+    """
+    Short-lived LRU of recently rejected token digests.
+
+    Lets replayed expired, forged or revoked tokens be rejected before any
+    parsing, crypto or network work. The hit counter is a direct measure of
+    bad-token traffic. Rejections are recorded per scope ("jwt" for local
+    verification, "userinfo" for Auth0), since an opaque token that fails local
+    verification can still be valid at /userinfo. Expired entries are
+    reclaimed by sweep(), driven by a timing wheel.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._wheel = TimingWheel(time.monotonic())
+        self.stats = {"hits": 0, "misses": 0, "rejections_recorded": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, token: str, scope: str = "jwt") -> Optional[str]:
+        """Return the reason a token was recently rejected, or None."""
+        key = token_digest(token) + scope.encode()
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+
+        reason, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._entries[key]
+            self._wheel.cancel(key)
+            self.stats["expirations"] += 1
+            self.stats["misses"] += 1
+            return None
+
+        self.stats["hits"] += 1
+        return reason
+
+    def put(self, token: str, reason: str, scope: str = "jwt") -> None:
+        if self.max_entries <= 0:
+            return
+        key = token_digest(token) + scope.encode()
+        expires_at = time.monotonic() + self.ttl
+        self._entries[key] = (reason, expires_at)
+        self._entries.move_to_end(key)
+        self._wheel.schedule(key, expires_at)
+        self.stats["rejections_recorded"] += 1
+        while len(self._entries) > self.max_entries:
+            evicted, _ = self._entries.popitem(last=False)
+            self._wheel.cancel(evicted)
+            self.stats["evictions"] += 1
+
+    def invalidate(self, token: str, scope: str = "jwt") -> bool:
+        key = token_digest(token) + scope.encode()
+        self._wheel.cancel(key)
+        return self._entries.pop(key, None) is not None
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._wheel = TimingWheel(time.monotonic())
+
+    def sweep(self) -> int:
+        """Remove entries whose expiry has passed; returns how many were removed."""
+        expired = self._wheel.advance(time.monotonic())
+        for key in expired:
+            del self._entries[key]
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+rejected_token_cache = RejectedTokenCache(
+    max_entries=settings.REJECTED_TOKEN_CACHE_MAX_ENTRIES,
+    ttl=settings.REJECTED_TOKEN_CACHE_TTL,
+)
+
+
+class UserInfoCache:
+    """
+    Short-TTL LRU of Auth0 /userinfo responses, keyed by a digest of the access
+    token, with single-flight fetching.
+
+    The first caller for a token runs the fetch; callers arriving while it is in
+    flight await the same result instead of making their own round trip.
+    Successful responses are cached for `ttl` seconds; failures are not (tokens
+    Auth0 rejects go to the rejected-token cache). Cached responses are shared
+    between callers and must not be modified. Expired entries are reclaimed by
+    sweep(), driven by a timing wheel.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+        self._wheel = TimingWheel(time.monotonic())
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "fetch_errors": 0, "evictions": 0, "expirations": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get_or_fetch(self, token: str, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        """Return the cached user info for a token, or the result of one shared call to `fetch`."""
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is not None:
+            user_info, expires_at = entry
+            if time.monotonic() < expires_at:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return user_info
+            self._remove(key)
+            self.stats["expirations"] += 1
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["misses"] += 1
+            future = asyncio.ensure_future(fetch())
+            self._inflight[key] = future
+            # Settle from a callback, so the result is cached even if the first caller is cancelled
+            future.add_done_callback(lambda done: self._settle(key, done))
+        return await asyncio.shield(future)
+
+    def _settle(self, key: bytes, future: asyncio.Future) -> None:
+        self._inflight.pop(key, None)
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            self.stats["fetch_errors"] += 1
+            return
+        if self.max_entries <= 0 or self.ttl <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl
+        self._entries[key] = (future.result(), expires_at)
+        self._entries.move_to_end(key)
+        self._wheel.schedule(key, expires_at)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.stats["evictions"] += 1
+
+    def invalidate(self, token: str) -> bool:
+        key = token_digest(token)
+        if key not in self._entries:
+            return False
+        self._remove(key)
+        return True
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._wheel = TimingWheel(time.monotonic())
+
+    def sweep(self) -> int:
+        """Remove entries whose expiry has passed; returns how many were removed."""
+        expired = self._wheel.advance(time.monotonic())
+        for key in expired:
+            del self._entries[key]
+        self.stats["expirations"] += len(expired)
+        return len(expired)
+
+    def _remove(self, key: bytes) -> None:
+        del self._entries[key]
+        self._wheel.cancel(key)
+
+    def get_stats(self) -> dict:
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "in_flight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "ttl": self.ttl,
+        }
+
+
+userinfo_cache = UserInfoCache(
+    max_entries=settings.USERINFO_CACHE_MAX_ENTRIES,
+    ttl=settings.USERINFO_CACHE_TTL,
+)
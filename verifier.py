@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, status
+from jose import jwk, jwt, JWTError
+from jose.backends.base import Key
+
+from config import settings
+
+# Set up logging
+logger = logging.getLogger("verifier")
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+# Public keys constructed inside a process-pool worker, indexed by key ID
+_worker_keys: Dict[str, Key] = {}
+
+
+def _init_worker(jwks: Dict[str, dict]) -> None:
+    """Pre-load the current signing keys when a pool process starts."""
+    for kid, key_data in jwks.items():
+        _worker_keys[kid] = jwk.construct(key_data, algorithm="RS256")
+
+
+def _decode(token: str, key, audience: str, issuer: str) -> dict:
+    return jwt.decode(
+        token,
+        key,
+        algorithms=["RS256"],
+        audience=audience,
+        issuer=issuer,
+        # python-jose only checks aud and exp when the token has them
+        options={"require_aud": True, "require_exp": True},
+    )
+
+
+def _verify_in_thread(token: str, key: Key, audience: str, issuer: str) -> Tuple[dict, float]:
+    started_at = time.time()
+    return _decode(token, key, audience, issuer), started_at
+
+
+def _verify_in_process(
+    token: str, kid: str, key_data: dict, audience: str, issuer: str
+) -> Tuple[dict, float]:
+    started_at = time.time()
+    key = _worker_keys.get(kid)
+    if key is None:
+        # Key was rotated in after this worker started
+        key = _worker_keys[kid] = jwk.construct(key_data, algorithm="RS256")
+    return _decode(token, key, audience, issuer), started_at
+
+
+class TokenVerifier:
+    """
+    Runs JWT signature verification inline, on a thread pool or on a process pool.
+
+    RSA verification is CPU-bound, so running it on the event loop stalls every
+    concurrent request. The pool modes dispatch it to an executor; at most
+    max_workers + queue_size verifications are pending at once and any more are
+    rejected with a 503.
+    """
+
+    def __init__(self, mode: str, max_workers: int, queue_size: int):
+        if mode not in EXECUTOR_MODES:
+            raise ValueError(f"Unknown verifier executor mode {mode!r}, expected one of {EXECUTOR_MODES}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.max_pending = max_workers + queue_size
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+        }
+
+    def start(self, jwks: Optional[Dict[str, dict]] = None) -> None:
+        """Create the executor, pre-loading the given signing keys into pool processes."""
+        if self._executor is not None or self.mode == "inline":
+            return
+        if self.mode == "thread":
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="jwt-verify"
+            )
+        else:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(jwks or {},),
+            )
+        logger.info(f"Started {self.mode} pool with {self.max_workers} workers for token verification")
+
+    def stop(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def verify(self, token: str, kid: str, key: Key, key_data: dict) -> dict:
+        """
+        Verify a token's signature and claims, returning the claims.
+        Raises JWTError if the token is invalid.
+        """
+        audience = settings.AUTH0_AUDIENCE
+        issuer = settings.AUTH0_ISSUER
+        if self.mode == "inline":
+            return _decode(token, key, audience, issuer)
+
+        if self._pending >= self.max_pending:
+            self.stats["rejected"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many pending token verifications",
+            )
+
+        if self._executor is None:
+            self.start()
+
+        loop = asyncio.get_running_loop()
+        self._pending += 1
+        self.stats["submitted"] += 1
+        submitted_at = time.time()
+        try:
+            if self.mode == "thread":
+                claims, started_at = await loop.run_in_executor(
+                    self._executor, _verify_in_thread, token, key, audience, issuer
+                )
+            else:
+                claims, started_at = await loop.run_in_executor(
+                    self._executor, _verify_in_process, token, kid, key_data, audience, issuer
+                )
+        except JWTError:
+            self.stats["failed"] += 1
+            raise
+        finally:
+            self._pending -= 1
+
+        wait = max(started_at - submitted_at, 0.0)
+        self.stats["completed"] += 1
+        self.stats["queue_wait_total"] += wait
+        self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], wait)
+        return claims
+
+    def get_stats(self) -> dict:
+        completed = self.stats["completed"]
+        return {
+            **self.stats,
+            "mode": self.mode,
+            "pending": self._pending,
+            "max_pending": self.max_pending,
+            "queue_wait_avg": self.stats["queue_wait_total"] / completed if completed else 0.0,
+        }
+
+
+token_verifier = TokenVerifier(
+    mode=settings.VERIFY_EXECUTOR,
+    max_workers=settings.VERIFY_WORKERS,
+    queue_size=settings.VERIFY_QUEUE_SIZE,
+)